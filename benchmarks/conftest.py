@@ -0,0 +1,73 @@
+"""
+Fixtures of the endpoint benchmark suite.
+
+The suite only runs when BENCHMARK_SIZES lists the dataset sizes to seed,
+e.g. `BENCHMARK_SIZES=1000,100000 pytest benchmarks`; a plain `pytest`
+run does not collect it.
+"""
+import io
+import json
+import os
+from pathlib import Path
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from task.factories import seed_users
+
+SIZES = [int(size) for size in filter(None, os.environ.get('BENCHMARK_SIZES', '').split(','))]
+BENCHMARK_DIR = Path(__file__).resolve().parent
+BASELINE_PATH = Path(os.environ.get('BENCHMARK_BASELINE', BENCHMARK_DIR / 'baseline.json'))
+RESULTS_PATH = Path(os.environ.get('BENCHMARK_RESULTS', BENCHMARK_DIR / 'results.json'))
+
+if not SIZES:
+    collect_ignore_glob = ['test_*.py']
+
+SEEDED_TABLES = [
+    'task1_product_search', 'task1_topproduct', 'task1_product', 'task1_category',
+    'task_userprofile', 'auth_user',
+]
+
+
+@pytest.fixture(scope='session')
+def benchmark_settings():
+    from django.conf import settings
+    # Measure the endpoints themselves, not the response cache.
+    original = settings.TASK1_RESPONSE_CACHE_TIMEOUT
+    settings.TASK1_RESPONSE_CACHE_TIMEOUT = 0
+    yield settings
+    settings.TASK1_RESPONSE_CACHE_TIMEOUT = original
+
+
+@pytest.fixture(scope='session', params=SIZES, ids=lambda size: f'{size}')
+def dataset(request, django_db_setup, django_db_blocker, benchmark_settings):
+    """Seed a catalog of `size` products and as many users, replacing the previous size."""
+    size = request.param
+    with django_db_blocker.unblock():
+        with connection.cursor() as cursor:
+            for table in SEEDED_TABLES:
+                cursor.execute(f'DELETE FROM {table}')
+        call_command(
+            'generate_data', products=size, categories=max(5, size // 1000),
+            price_distribution='lognormal', stdout=io.StringIO(),
+        )
+        seed_users(size)
+    return size
+
+
+@pytest.fixture(scope='session')
+def baseline():
+    if BASELINE_PATH.exists():
+        return json.loads(BASELINE_PATH.read_text())
+    return {}
+
+
+@pytest.fixture(scope='session')
+def results():
+    """Collects every measurement; written to RESULTS_PATH at the end of the run."""
+    collected = {}
+    yield collected
+    RESULTS_PATH.write_text(json.dumps(collected, indent=2, sort_keys=True) + '\n')
+    if os.environ.get('BENCHMARK_UPDATE_BASELINE'):
+        stored = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+        BASELINE_PATH.write_text(json.dumps({**stored, **collected}, indent=2, sort_keys=True) + '\n')
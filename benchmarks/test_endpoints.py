@@ -0,0 +1,173 @@
+"""
+Latency, query count and peak memory of every ProductViewSet and
+UserViewSet endpoint, per dataset size.
+
+Each endpoint fails when it runs more queries than its budget or, once a
+baseline is stored, when its p50 latency, query count or peak memory
+regress past the baseline by more than BENCHMARK_TOLERANCE.
+"""
+import os
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from task1.models import Product
+
+User = get_user_model()
+
+REPEAT = int(os.environ.get('BENCHMARK_REPEAT', 30))
+TOLERANCE = float(os.environ.get('BENCHMARK_TOLERANCE', 1.0))
+# Latency differences below this are noise, whatever the ratio.
+LATENCY_SLACK_MS = float(os.environ.get('BENCHMARK_LATENCY_SLACK_MS', 5))
+UPDATING_BASELINE = bool(os.environ.get('BENCHMARK_UPDATE_BASELINE'))
+
+PRODUCTS = '/api/v1/task1/products/'
+USERS = '/api/v1/task/users/'
+
+
+@dataclass
+class Endpoint:
+    name: str
+    # Builds the URL from the dataset context and the iteration number.
+    url: object
+    query_budget: int
+    method: str = 'get'
+    data: object = None
+    status: int = 200
+    repeat: int = None
+
+    def request(self, client, context, iteration):
+        data = self.data(context, iteration) if self.data else None
+        response = getattr(client, self.method)(self.url(context, iteration), data, format='json')
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response
+
+
+def user_payload(context, iteration):
+    username = f'bench-{iteration}'
+    return {
+        'username': username,
+        'email': f'{username}@example.com',
+        'first_name': 'Bench',
+        'last_name': 'Writer',
+        'profile': {
+            'website': 'https://example.com',
+            'bio': 'A benchmark user profile bio of more than fifty characters.',
+        },
+    }
+
+
+ENDPOINTS = [
+    # Cached endpoints (all but detail and export) first read the catalog
+    # version, see task1/cache.py.
+    Endpoint('product-list', lambda c, i: PRODUCTS, query_budget=3),
+    Endpoint('product-list-last-page', lambda c, i: f"{PRODUCTS}?page={c['last_page']}", query_budget=3),
+    Endpoint('product-list-sparse', lambda c, i: f'{PRODUCTS}?fields=id,name,price', query_budget=3),
+    Endpoint('product-list-keyset', lambda c, i: f'{PRODUCTS}?cursor=', query_budget=2),
+    Endpoint('product-list-filtered', lambda c, i: f'{PRODUCTS}?min_price=100&max_price=500', query_budget=3),
+    Endpoint('product-detail', lambda c, i: f"{PRODUCTS}{c['product_id']}/", query_budget=1),
+    Endpoint('product-top-by-category', lambda c, i: f'{PRODUCTS}top_most_expensive_by_category/',
+             query_budget=3),
+    Endpoint('product-top-10', lambda c, i: f'{PRODUCTS}top_10_most_expensive/', query_budget=3),
+    # Picking the top-N plan reads the category totals first.
+    Endpoint('product-top-25', lambda c, i: f'{PRODUCTS}top_10_most_expensive/?n=25', query_budget=4),
+    Endpoint('product-category-counts', lambda c, i: f'{PRODUCTS}products_with_category_counts/',
+             query_budget=3),
+    Endpoint('product-search', lambda c, i: f'{PRODUCTS}search/?q=product+12*', query_budget=3),
+    Endpoint('product-export', lambda c, i: f'{PRODUCTS}export/', query_budget=1, repeat=3),
+    # The count and the page, profiles joined (see paymob/query_plan.py).
+    Endpoint('user-list', lambda c, i: USERS, query_budget=2),
+    Endpoint('user-list-sparse', lambda c, i: f'{USERS}?fields=id,username', query_budget=2),
+    Endpoint('user-detail', lambda c, i: f"{USERS}{c['user_id']}/", query_budget=1),
+    Endpoint('user-create', lambda c, i: USERS, method='post', data=user_payload, status=201,
+             query_budget=5),
+    Endpoint('user-bulk-create', lambda c, i: f'{USERS}bulk/', method='post', status=201,
+             data=lambda c, i: [user_payload(c, f'{i}-{n}') for n in range(100)], query_budget=6),
+    Endpoint('user-update', lambda c, i: f"{USERS}{c['user_id']}/", method='patch',
+             data=lambda c, i: {'first_name': f'Bench {i}'}, query_budget=4),
+    Endpoint('user-destroy', lambda c, i: f"{USERS}{c['last_user_id'] - i}/", method='delete',
+             status=204, query_budget=6),
+]
+
+
+@pytest.fixture(scope='session')
+def context(dataset, django_db_blocker):
+    with django_db_blocker.unblock():
+        return {
+            'product_id': Product.objects.order_by('id').values_list('id', flat=True).first(),
+            'last_page': -(-dataset // 10),
+            'user_id': User.objects.order_by('id').values_list('id', flat=True).first(),
+            'last_user_id': User.objects.order_by('-id').values_list('id', flat=True).first(),
+        }
+
+
+def measure(endpoint, context):
+    client = APIClient()
+    iteration = iter(range(10 ** 9))
+
+    def call():
+        response = endpoint.request(client, context, next(iteration))
+        assert response.status_code == endpoint.status, getattr(response, 'data', response)
+
+    call()  # warm-up
+
+    with CaptureQueriesContext(connection) as queries:
+        call()
+    # Read now: every request resets the connection's query log.
+    query_count = len(queries)
+
+    tracemalloc.start()
+    try:
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings = []
+    for _ in range(endpoint.repeat or REPEAT):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000)
+    percentiles = statistics.quantiles(timings, n=100, method='inclusive')
+    return {
+        'p50_ms': round(statistics.median(timings), 3),
+        'p99_ms': round(percentiles[98], 3),
+        'queries': query_count,
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def regressions(measured, stored):
+    problems = []
+    if measured['queries'] > stored['queries']:
+        problems.append(f"queries {measured['queries']} > baseline {stored['queries']}")
+    allowed_ms = max(stored['p50_ms'] * (1 + TOLERANCE), stored['p50_ms'] + LATENCY_SLACK_MS)
+    if measured['p50_ms'] > allowed_ms:
+        problems.append(f"p50 {measured['p50_ms']}ms > {allowed_ms:.3f}ms (baseline {stored['p50_ms']}ms)")
+    allowed_kib = stored['peak_kib'] * (1 + TOLERANCE)
+    if measured['peak_kib'] > allowed_kib:
+        problems.append(f"peak memory {measured['peak_kib']}KiB > {allowed_kib:.1f}KiB "
+                        f"(baseline {stored['peak_kib']}KiB)")
+    return problems
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('endpoint', ENDPOINTS, ids=lambda endpoint: endpoint.name)
+def test_endpoint(endpoint, dataset, context, baseline, results):
+    measured = measure(endpoint, context)
+    key = f'{endpoint.name}@{dataset}'
+    results[key] = measured
+
+    assert measured['queries'] <= endpoint.query_budget, (
+        f"{key} ran {measured['queries']} queries, budget {endpoint.query_budget}"
+    )
+    if key in baseline and not UPDATING_BASELINE:
+        assert not regressions(measured, baseline[key]), f'{key}: ' + '; '.join(regressions(measured, baseline[key]))
@@ -0,0 +1,83 @@
+"""
+Latency overhead of ServerTimingMiddleware, per dataset size.
+
+A few percent is below the noise of wall-clock latencies, so the overhead
+at the production sample rate is derived from two costs that can be
+measured: the extra time of an instrumented request over one that is
+not sampled, timed end to end in interleaved batches, and the cost of the
+middleware itself at that rate, timed around a view that does nothing.
+The test fails when their sum exceeds BENCHMARK_SERVER_TIMING_BUDGET
+(default 0.02, i.e. 2%) of the p50 latency.
+"""
+import os
+import statistics
+import time
+
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+from paymob.timing import ServerTimingMiddleware
+from rest_framework.test import APIClient
+
+REPEAT = int(os.environ.get('BENCHMARK_REPEAT', 30))
+BUDGET = float(os.environ.get('BENCHMARK_SERVER_TIMING_BUDGET', 0.02))
+# The rate of paymob/settings.py outside DEBUG.
+SAMPLE_RATE = float(os.environ.get('SERVER_TIMING_SAMPLE_RATE', 0.01))
+BATCH = 20
+
+PRODUCTS = '/api/v1/task1/products/'
+
+
+def batch_ms(client, url):
+    """Mean latency of BATCH requests, in milliseconds."""
+    started = time.perf_counter()
+    for _ in range(BATCH):
+        response = client.get(url)
+        assert response.status_code == 200
+    return (time.perf_counter() - started) * 1000 / BATCH
+
+
+def middleware_ms(calls=100000):
+    """Mean time the middleware adds around a view that does nothing, in milliseconds."""
+    def view(request):
+        return HttpResponse()
+
+    request = RequestFactory().get(PRODUCTS)
+    seconds = []
+    for handler in (ServerTimingMiddleware(view), view):
+        started = time.perf_counter()
+        for _ in range(calls):
+            handler(request)
+        seconds.append(time.perf_counter() - started)
+    return (seconds[0] - seconds[1]) * 1000 / calls
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('cache_timeout', [0, 300], ids=['uncached', 'cached'])
+def test_server_timing_overhead(cache_timeout, dataset, settings, results):
+    settings.TASK1_RESPONSE_CACHE_TIMEOUT = cache_timeout
+    client = APIClient()
+    client.get(PRODUCTS)  # warm-up
+
+    timings = {0: [], 1: []}
+    for _ in range(REPEAT):
+        for rate, batches in timings.items():
+            settings.SERVER_TIMING_SAMPLE_RATE = rate
+            batches.append(batch_ms(client, PRODUCTS))
+    p50_ms = statistics.median(timings[0])
+    instrumented_ms = max(statistics.median(timings[1]) - p50_ms, 0)
+
+    settings.SERVER_TIMING_SAMPLE_RATE = SAMPLE_RATE
+    overhead_ms = SAMPLE_RATE * instrumented_ms + max(middleware_ms(), 0)
+    measured = {
+        'p50_ms': round(p50_ms, 3),
+        'instrumented_ms': round(instrumented_ms, 4),
+        'overhead': round(overhead_ms / p50_ms, 4),
+    }
+    key = f"server-timing-{'cached' if cache_timeout else 'uncached'}@{dataset}"
+    results[key] = measured
+
+    assert measured['overhead'] <= BUDGET, (
+        f"{key}: sampling {SAMPLE_RATE:.0%} of the requests costs {measured['overhead']:.1%} "
+        f"of {measured['p50_ms']}ms, budget {BUDGET:.0%}"
+    )
@@ -0,0 +1,34 @@
+"""
+Run settings shared by the Locust user classes, read from the environment
+so `manage.py loadtest` (or a plain `locust` run) can set them per run.
+
+- LOCUST_THROUGHPUT: tasks per second per user. Set it for an open-loop
+  arrival rate of users x LOCUST_THROUGHPUT requests/s that does not slow
+  down when responses do (as long as a task is faster than 1/rate).
+- LOCUST_WAIT_MIN / LOCUST_WAIT_MAX: think time in seconds otherwise
+  (default 1-5s).
+- LOCUST_SEED: seeds the task choices, so two runs send the same mix.
+
+The host comes from `--host` or LOCUST_HOST.
+"""
+import os
+import random
+
+from locust import between, constant_throughput
+
+if os.environ.get('LOCUST_SEED'):
+    random.seed(int(os.environ['LOCUST_SEED']))
+
+
+def wait_time():
+    if os.environ.get('LOCUST_THROUGHPUT'):
+        return constant_throughput(float(os.environ['LOCUST_THROUGHPUT']))
+    return between(float(os.environ.get('LOCUST_WAIT_MIN', 1)), float(os.environ.get('LOCUST_WAIT_MAX', 5)))
+
+
+def expect(response, status):
+    """Mark a `catch_response=True` response failed unless it has `status`."""
+    if response.status_code == status:
+        response.success()
+    else:
+        response.failure(f'expected {status}, got {response.status_code}: {response.text[:200]}')
@@ -1,10 +1,12 @@
-from locust import HttpUser, task, between
-import json
+from locust import HttpUser, task
 import uuid
 
+from common import expect, wait_time
+
+
 class UserAPIUser(HttpUser):
-    wait_time = between(1, 5)
-    host = "http://127.0.0.1:8000"
+    # Think time or open-loop rate from the environment, see common.py
+    wait_time = wait_time()
 
     def on_start(self):
         """Run once per user when they start."""
@@ -13,7 +15,8 @@ class UserAPIUser(HttpUser):
 
     @task(2)
     def list_profiles(self):
-        self.client.get("/api/v1/task/users/")
+        with self.client.get("/api/v1/task/users/", name="user-list", catch_response=True) as response:
+            expect(response, 200)
 
     @task(2)
     def create_user(self):
@@ -29,21 +32,18 @@ class UserAPIUser(HttpUser):
                 "bio": "This is a sufficiently long bio with more than 50 characters for load testing."
             }
         }
-        response = self.client.post("/api/v1/task/users/", json=payload, name="create_user")
-        
-        if response.status_code == 201:
-            self.user_id = response.json().get("id")
-        elif response.status_code == 400:
-            print(f"Create failed: {response.status_code}, {response.text}")
-        else:
-            print(f"Unexpected response: {response.status_code}, {response.text}")
+        with self.client.post("/api/v1/task/users/", json=payload, name="user-create",
+                              catch_response=True) as response:
+            expect(response, 201)
+            if response.status_code == 201:
+                self.user_id = response.json().get("id")
 
     @task(1)
     def update_user(self):
         """Simulate PATCH /api/users/<id>/ to update a user and profile."""
         if self.user_id is None:
             return  # Skip if no user was created
-        
+
         payload = {
             "email": f"updated_{self.user_id}@example.com",
             "profile": {
@@ -51,10 +51,9 @@ class UserAPIUser(HttpUser):
                 "bio": "This is an updated bio with more than 50 characters for load testing purposes."
             }
         }
-        response = self.client.patch(f"/api/v1/task/users/{self.user_id}/", json=payload, name="update_user")
-        
-        if response.status_code != 200:
-            print(f"Update failed: {response.status_code}, {response.text}")
+        with self.client.patch(f"/api/v1/task/users/{self.user_id}/", json=payload, name="user-update",
+                               catch_response=True) as response:
+            expect(response, 200)
 
     @task(1)
     def create_invalid_user(self):
@@ -66,6 +65,6 @@ class UserAPIUser(HttpUser):
                 "bio": "Short"
             }
         }
-        response = self.client.post("/api/v1/task/users/", json=payload, name="create_invalid_user")
-        if response.status_code != 400:
-            print(f"Expected 400, got: {response.status_code}, {response.text}")
\ No newline at end of file
+        with self.client.post("/api/v1/task/users/", json=payload, name="user-create-invalid",
+                              catch_response=True) as response:
+            expect(response, 400)
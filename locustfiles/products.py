@@ -1,10 +1,12 @@
-from locust import HttpUser, task, between
-from random import choice
+from locust import HttpUser, task
+
+from common import expect, wait_time
+
 
 class ProductAPIUser(HttpUser):
-    # Wait between 1 and 5 seconds between tasks
-    wait_time = between(1, 5)
-    
+    # Think time or open-loop rate from the environment, see common.py
+    wait_time = wait_time()
+
     def on_start(self):
         """Initialize any user-specific data here"""
         pass
@@ -12,30 +14,38 @@ class ProductAPIUser(HttpUser):
     @task(3)  # Higher weight for listing products as it's more common
     def list_products(self):
         """Test the main product listing endpoint"""
-        self.client.get("/api/v1/task1/products/")
+        with self.client.get("/api/v1/task1/products/", name="product-list", catch_response=True) as response:
+            expect(response, 200)
 
     @task(2)
     def get_top_most_expensive_by_category(self):
         """Test the top most expensive products by category endpoint"""
-        self.client.get("/api/v1/task1/products/top_most_expensive_by_category/")
+        with self.client.get("/api/v1/task1/products/top_most_expensive_by_category/",
+                             name="product-top-by-category", catch_response=True) as response:
+            expect(response, 200)
 
     @task(2)
     def get_top_10_most_expensive(self):
         """Test the top 10 most expensive products endpoint"""
-        self.client.get("/api/v1/task1/products/top_10_most_expensive/")
+        with self.client.get("/api/v1/task1/products/top_10_most_expensive/",
+                             name="product-top-10", catch_response=True) as response:
+            expect(response, 200)
 
     @task(1)  # Lower weight for category counts as it's less frequently accessed
     def get_products_with_category_counts(self):
         """Test the products with category counts endpoint"""
-        self.client.get("/api/v1/task1/products/products_with_category_counts/")
+        with self.client.get("/api/v1/task1/products/products_with_category_counts/",
+                             name="product-category-counts", catch_response=True) as response:
+            expect(response, 200)
 
     @task(1)
     def test_pagination(self):
         """Test pagination by accessing different pages"""
         # First page
-        response = self.client.get("/api/v1/task1/products/")
-        if response.status_code == 200 and "next" in response.json():
+        with self.client.get("/api/v1/task1/products/", name="product-list", catch_response=True) as response:
+            expect(response, 200)
+            next_page = response.json().get("next") if response.status_code == 200 else None
+        if next_page:
             # If there's a next page, try to access it
-            next_page = response.json()["next"]
-            if next_page:
-                self.client.get(next_page) 
\ No newline at end of file
+            with self.client.get(next_page, name="product-list-next-page", catch_response=True) as response:
+                expect(response, 200)
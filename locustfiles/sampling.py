@@ -0,0 +1,49 @@
+"""
+Random draws of the browsing workload in workload.py. Kept free of Locust
+imports so they can be unit tested.
+"""
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from itertools import accumulate
+
+# (page size, weight): most clients keep the default, some ask for more.
+PAGE_SIZES = ((10, 50), (20, 20), (50, 20), (100, 10))
+
+
+@lru_cache(maxsize=8)
+def zipf_cdf(n, s):
+    # array('d'): 8 bytes per rank, shared by every user of the process.
+    return array('d', accumulate(1 / rank ** s for rank in range(1, n + 1)))
+
+
+class Zipf:
+    """
+    Draws ranks 1..n with P(rank) proportional to 1 / rank**s: rank 1 is
+    the most popular, and a long tail of ranks is drawn rarely.
+    """
+
+    def __init__(self, n, s=1.1):
+        if n < 1:
+            raise ValueError('Zipf needs at least one rank.')
+        self.n = n
+        self.cdf = zipf_cdf(n, s)
+
+    def sample(self, rng):
+        return min(bisect_left(self.cdf, rng.random() * self.cdf[-1]) + 1, self.n)
+
+
+def page_size(rng):
+    return rng.choices([size for size, _ in PAGE_SIZES], weights=[weight for _, weight in PAGE_SIZES])[0]
+
+
+def page_number(rng, count, size, deep_ratio, zipf_s=1.1):
+    """
+    A page of a `count`-row listing: usually one of the first pages
+    (Zipf-distributed), but with probability `deep_ratio` any page up to the
+    last, so OFFSET-heavy deep pages are requested too.
+    """
+    last_page = max(1, -(-count // size))
+    if rng.random() < deep_ratio:
+        return rng.randint(1, last_page)
+    return Zipf(last_page, zipf_s).sample(rng)
@@ -0,0 +1,159 @@
+"""
+Production-like traffic: popular categories and products are requested far
+more often than the long tail (Zipf), listings are read with varied page
+sizes and sometimes deep into the catalog, products are opened one by one,
+and the user endpoints get a configurable mix of reads and writes. Unlike
+products.py this reaches cold rows and large OFFSETs, so response-cache
+misses and deep-page costs show up in the results.
+
+Environment, on top of common.py:
+- LOCUST_WRITE_RATIO: share of UserAccountsUser tasks that write (default 0.1)
+- LOCUST_DEEP_PAGE_RATIO: share of listings read at any page up to the last
+  instead of the first few (default 0.2)
+- LOCUST_ZIPF_S: popularity skew of categories, products and pages (default 1.1)
+- LOCUST_CATEGORIES: categories in the catalog (default: what `loadtest`
+  seeds, max(5, products // 1000))
+
+Product, category and user ids are drawn from 1..count, as in a database
+seeded by `loadtest`.
+"""
+import os
+import random
+import uuid
+
+from locust import HttpUser, task
+
+from common import expect, wait_time
+from sampling import Zipf, page_number, page_size
+
+PRODUCTS = "/api/v1/task1/products/"
+USERS = "/api/v1/task/users/"
+
+WRITE_RATIO = float(os.environ.get("LOCUST_WRITE_RATIO", 0.1))
+DEEP_PAGE_RATIO = float(os.environ.get("LOCUST_DEEP_PAGE_RATIO", 0.2))
+ZIPF_S = float(os.environ.get("LOCUST_ZIPF_S", 1.1))
+TOP_N = (5, 10, 25)
+
+
+def total_count(client, path, name):
+    with client.get(path, params={"page_size": 1}, name=name, catch_response=True) as response:
+        expect(response, 200)
+        return response.json()["count"] if response.status_code == 200 else 0
+
+
+class ProductBrowsingUser(HttpUser):
+    wait_time = wait_time()
+
+    def on_start(self):
+        # Derived from the global generator, which LOCUST_SEED seeds.
+        self.rng = random.Random(random.random())
+        self.products = max(1, total_count(self.client, PRODUCTS, "product-count"))
+        categories = int(os.environ.get("LOCUST_CATEGORIES", max(5, self.products // 1000)))
+        self.category_popularity = Zipf(categories, ZIPF_S)
+        self.product_popularity = Zipf(self.products, ZIPF_S)
+
+    def list_page(self, params, name):
+        with self.client.get(PRODUCTS, params=params, name=name, catch_response=True) as response:
+            expect(response, 200)
+            return response.json() if response.status_code == 200 else None
+
+    @task(4)
+    def browse_catalog(self):
+        size = page_size(self.rng)
+        page = page_number(self.rng, self.products, size, DEEP_PAGE_RATIO, ZIPF_S)
+        self.list_page({"page": page, "page_size": size}, "product-list")
+
+    @task(3)
+    def browse_category(self):
+        """The first page of a category, then sometimes a deep page of it."""
+        category = self.category_popularity.sample(self.rng)
+        size = page_size(self.rng)
+        data = self.list_page({"category": category, "page_size": size}, "product-list-category")
+        if data and self.rng.random() < DEEP_PAGE_RATIO:
+            page = self.rng.randint(1, max(1, -(-data["count"] // size)))
+            self.list_page({"category": category, "page": page, "page_size": size}, "product-list-category-deep")
+
+    @task(3)
+    def view_product(self):
+        product = self.product_popularity.sample(self.rng)
+        with self.client.get(f"{PRODUCTS}{product}/", name="product-detail", catch_response=True) as response:
+            expect(response, 200)
+
+    @task(1)
+    def traverse_keyset(self):
+        """Follow `next` cursors for a few pages, mostly short walks."""
+        pages = Zipf(20, ZIPF_S).sample(self.rng)
+        data = self.list_page({"cursor": "", "page_size": page_size(self.rng)}, "product-list-keyset")
+        for _ in range(pages - 1):
+            if not data or not data.get("next"):
+                break
+            with self.client.get(data["next"], name="product-list-keyset", catch_response=True) as response:
+                expect(response, 200)
+                data = response.json() if response.status_code == 200 else None
+
+    @task(1)
+    def top_products(self):
+        params = {"n": self.rng.choice(TOP_N)}
+        if self.rng.random() < 0.5:
+            params["category"] = self.category_popularity.sample(self.rng)
+        with self.client.get(f"{PRODUCTS}top_10_most_expensive/", params=params, name="product-top-n",
+                             catch_response=True) as response:
+            expect(response, 200)
+
+
+class UserAccountsUser(HttpUser):
+    wait_time = wait_time()
+
+    def on_start(self):
+        self.rng = random.Random(random.random())
+        self.users = max(1, total_count(self.client, USERS, "user-count"))
+        self.user_popularity = Zipf(self.users, ZIPF_S)
+        self.created = []
+
+    @task
+    def use_accounts(self):
+        if self.rng.random() < WRITE_RATIO:
+            if self.created and self.rng.random() < 0.5:
+                self.update_user()
+            else:
+                self.create_user()
+        elif self.rng.random() < 0.5:
+            self.list_users()
+        else:
+            self.view_user()
+
+    def list_users(self):
+        size = page_size(self.rng)
+        page = page_number(self.rng, self.users, size, DEEP_PAGE_RATIO, ZIPF_S)
+        with self.client.get(USERS, params={"page": page, "page_size": size}, name="user-list",
+                             catch_response=True) as response:
+            expect(response, 200)
+
+    def view_user(self):
+        user = self.user_popularity.sample(self.rng)
+        with self.client.get(f"{USERS}{user}/", name="user-detail", catch_response=True) as response:
+            expect(response, 200)
+
+    def create_user(self):
+        username = f"load_{uuid.UUID(int=self.rng.getrandbits(128)).hex[:12]}"
+        payload = {
+            "username": username,
+            "email": f"{username}@example.com",
+            "first_name": "Load",
+            "last_name": "Test",
+            "profile": {
+                "website": "https://example.com",
+                "bio": "This is a sufficiently long bio with more than 50 characters for load testing.",
+            },
+        }
+        with self.client.post(USERS, json=payload, name="user-create", catch_response=True) as response:
+            expect(response, 201)
+            if response.status_code == 201:
+                self.created.append(response.json()["id"])
+
+    def update_user(self):
+        user = self.rng.choice(self.created)
+        payload = {"first_name": f"Updated {self.rng.randint(1, 10 ** 6)}"}
+        with self.client.patch(f"{USERS}{user}/", json=payload, name="user-update",
+                               catch_response=True) as response:
+            expect(response, 200)
@@ -0,0 +1,358 @@
+"""
+Prometheus metrics aggregated across worker processes.
+
+Every process writes its samples to its own memory-mapped file,
+`<METRICS_DIR>/<pid>.db`: one process per file means writers never lock
+each other, and within a process a sample update is a dictionary lookup
+and an 8-byte read-modify-write under a single lock. The `/internal/metrics`
+view reads all the files and sums them, so any worker answers for the
+whole server. Counters and histograms of exited workers keep counting;
+gauges only count live processes. Empty METRICS_DIR before starting the
+server so a restart begins from zero.
+
+Histograms store one count per bucket and are made cumulative when
+scraped, so an observation updates three values: its bucket, the sum and
+the count.
+"""
+import json
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from paymob.query_hooks import query_wrapper
+
+INITIAL_FILE_SIZE = 64 * 1024
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_used = struct.Struct('<I')
+_key_length = struct.Struct('<I')
+_value = struct.Struct('<d')
+
+
+DEFAULT_METRICS_DIR = Path(tempfile.gettempdir()) / 'paymob-metrics'
+
+
+def metrics_directory():
+    return getattr(settings, 'METRICS_DIR', DEFAULT_METRICS_DIR)
+
+
+class MmapValues:
+    """
+    Float values by key in a memory-mapped file written by one process.
+
+    Layout: the number of bytes used, then (key length, key, value) entries
+    in the order the keys were first written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(INITIAL_FILE_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        if self._used == 0:
+            _used.pack_into(self._map, 0, _used.size)
+        self._positions = {key: position for key, position, _ in self.entries(self._map)}
+
+    @property
+    def _used(self):
+        return _used.unpack_from(self._map, 0)[0]
+
+    @staticmethod
+    def entries(data):
+        """(key, value position, value) of every entry in `data`."""
+        end = _used.unpack_from(data, 0)[0]
+        offset = _used.size
+        while offset < end:
+            length = _key_length.unpack_from(data, offset)[0]
+            key_start = offset + _key_length.size
+            position = key_start + length
+            yield bytes(data[key_start:position]).decode(), position, _value.unpack_from(data, position)[0]
+            offset = position + _value.size
+
+    @classmethod
+    def read(cls, path):
+        """{key: value} of the file at `path`."""
+        data = Path(path).read_bytes()
+        if len(data) < _used.size:
+            return {}
+        return {key: value for key, _, value in cls.entries(data)}
+
+    def _allocate(self, key):
+        encoded = key.encode()
+        offset = self._used
+        end = offset + _key_length.size + len(encoded) + _value.size
+        if end > len(self._map):
+            size = max(len(self._map) * 2, end)
+            self._map.close()
+            self._file.truncate(size)
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        _key_length.pack_into(self._map, offset, len(encoded))
+        position = offset + _key_length.size + len(encoded)
+        self._map[offset + _key_length.size:position] = encoded
+        _value.pack_into(self._map, position, 0.0)
+        # Published last, so readers never see a half-written entry.
+        _used.pack_into(self._map, 0, end)
+        self._positions[key] = position
+        return position
+
+    def add(self, key, amount):
+        position = self._positions.get(key) or self._allocate(key)
+        _value.pack_into(self._map, position, _value.unpack_from(self._map, position)[0] + amount)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+@lru_cache(maxsize=4096)
+def sample_key(sample, labels):
+    return json.dumps([sample, labels])
+
+
+class MetricsRegistry:
+    """The metrics of the project and this process' file of samples."""
+
+    def __init__(self):
+        self.metrics = {}
+        self._samples = {}
+        self._lock = threading.Lock()
+        self._values = None
+        self._owner = None
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        for sample in metric.sample_names:
+            self._samples[sample] = metric
+        return metric
+
+    def _file(self):
+        # A forked worker or another METRICS_DIR (in tests) gets its own file.
+        owner = (os.getpid(), metrics_directory())
+        if self._owner != owner:
+            if self._values is not None:
+                self._values.close()
+            directory = Path(owner[1])
+            directory.mkdir(parents=True, exist_ok=True)
+            self._values = MmapValues(directory / f'{owner[0]}.db')
+            self._owner = owner
+        return self._values
+
+    def add(self, sample, labels, amount):
+        key = sample_key(sample, labels)
+        with self._lock:
+            self._file().add(key, amount)
+
+    def collect(self):
+        """{(sample, labels): value} summed over the files of every process."""
+        totals = defaultdict(float)
+        for path in sorted(Path(metrics_directory()).glob('*.db')):
+            alive = process_alive(int(path.stem))
+            for key, value in MmapValues.read(path).items():
+                sample, labels = json.loads(key)
+                metric = self._samples.get(sample)
+                if metric is None or (metric.kind == 'gauge' and not alive):
+                    continue
+                totals[sample, tuple(map(tuple, labels))] += value
+        return totals
+
+    def exposition(self):
+        """All metrics in the Prometheus text format."""
+        totals = self.collect()
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples(totals))
+        return '\n'.join(lines) + '\n'
+
+
+def process_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def escape(label_value):
+    return str(label_value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def format_sample(sample, labels, value):
+    if labels:
+        sample += '{' + ','.join(f'{name}="{escape(label_value)}"' for name, label_value in labels) + '}'
+    value = float(value)
+    return f'{sample} {int(value) if value.is_integer() else repr(value)}'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry or default_registry
+        self.registry.register(self)
+
+    @property
+    def sample_names(self):
+        return [self.name]
+
+    def labels(self, values):
+        return tuple((name, str(values[name])) for name in self.labelnames)
+
+    def samples(self, totals):
+        return [
+            format_sample(sample, labels, value)
+            for (sample, labels), value in sorted(totals.items())
+            if sample == self.name
+        ]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.registry.add(self.name, self.labels(labels), amount)
+
+
+class Gauge(Metric):
+    """A value summed over the live processes, e.g. requests in flight."""
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        self.registry.add(self.name, self.labels(labels), amount)
+
+    def dec(self, amount=1, **labels):
+        self.registry.add(self.name, self.labels(labels), -amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames, registry)
+
+    @property
+    def sample_names(self):
+        return [f'{self.name}_bucket', f'{self.name}_sum', f'{self.name}_count']
+
+    def observe(self, value, **labels):
+        labels = self.labels(labels)
+        index = bisect_left(self.buckets, value)
+        bound = self.buckets[index] if index < len(self.buckets) else math.inf
+        self.registry.add(f'{self.name}_bucket', (*labels, ('le', bound)), 1)
+        self.registry.add(f'{self.name}_sum', labels, value)
+        self.registry.add(f'{self.name}_count', labels, 1)
+
+    def samples(self, totals):
+        series = defaultdict(dict)
+        for (sample, labels), value in totals.items():
+            if sample == f'{self.name}_bucket':
+                series[labels[:-1]][labels[-1][1]] = value
+        lines = []
+        for labels in sorted(series):
+            cumulative = 0
+            for bound in (*self.buckets, math.inf):
+                cumulative += series[labels].get(bound, 0)
+                le = '+Inf' if bound == math.inf else f'{bound:g}'
+                lines.append(format_sample(f'{self.name}_bucket', (*labels, ('le', le)), cumulative))
+            lines.append(format_sample(f'{self.name}_sum', labels, totals[f'{self.name}_sum', labels]))
+            lines.append(format_sample(f'{self.name}_count', labels, totals[f'{self.name}_count', labels]))
+        return lines
+
+
+default_registry = MetricsRegistry()
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Time to serve a request, by route, method and status.',
+    ('route', 'method', 'status'),
+)
+REQUESTS_IN_FLIGHT = Gauge('http_requests_in_flight', 'Requests being served right now.')
+DB_QUERIES = Counter('db_queries_total', 'SQL queries run while serving requests.', ('route', 'method'))
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Response cache lookups by result: hit, miss or not_modified.',
+    ('cache', 'result'),
+)
+
+
+class QueryCounter:
+    """`query_wrapper()` hook counting queries."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Record the latency, status and query count of every request."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        queries = QueryCounter()
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            with query_wrapper(queries):
+                response = self.get_response(request)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+        return self.record(request, response, queries, started)
+
+    async def __acall__(self, request):
+        queries = QueryCounter()
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            with query_wrapper(queries):
+                response = await self.get_response(request)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+        return self.record(request, response, queries, started)
+
+    def record(self, request, response, queries, started):
+        duration = time.perf_counter() - started
+        # The URL pattern's name rather than the path keeps one series per route.
+        match = request.resolver_match
+        route = (match.view_name or match.route) if match else 'unmatched'
+        REQUEST_DURATION.observe(duration, route=route, method=request.method, status=response.status_code)
+        if queries.count:
+            DB_QUERIES.inc(queries.count, route=route, method=request.method)
+        return response
+
+
+def metrics_view(request):
+    """The Prometheus exposition of every metric, for the INTERNAL_IPS only."""
+    if request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS:
+        raise Http404()
+    return HttpResponse(default_registry.exposition(), content_type=CONTENT_TYPE)
@@ -0,0 +1,50 @@
+"""
+Query wrappers that follow the request across threads.
+
+`connection.execute_wrapper()` only wraps the connection of the calling
+thread, but under ASGI the async ORM runs its queries on a `sync_to_async`
+thread that has connections of its own. `query_wrapper()` registers the
+wrapper in a context variable instead, which `sync_to_async` carries to
+that thread, and a hook installed once on every connection calls the
+wrappers of the current context.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_wrappers = ContextVar('query_wrappers', default=())
+
+
+def _execute(execute, sql, params, many, context):
+    # Same nesting as the connection's own execute_wrappers.
+    for wrapper in reversed(_wrappers.get()):
+        execute = partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+
+def install(connection):
+    # First in the list: execute_wrapper() pops the last one on exit.
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _execute)
+
+
+@receiver(connection_created)
+def install_on_connect(sender, connection, **kwargs):
+    install(connection)
+
+
+@contextmanager
+def query_wrapper(wrapper):
+    """Run `wrapper` around every query of the current context, like `connection.execute_wrapper()`."""
+    # Connections of this thread opened before the hook was registered.
+    for connection in connections.all(initialized_only=True):
+        install(connection)
+    token = _wrappers.set((*_wrappers.get(), wrapper))
+    try:
+        yield wrapper
+    finally:
+        _wrappers.reset(token)
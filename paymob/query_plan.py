@@ -0,0 +1,257 @@
+"""
+Query plans derived from serializers.
+
+`QueryPlanMixin` applies to a view's queryset the plan its serializer
+needs: `select_related` for every to-one relation a field reads (nested
+serializers and dotted sources such as `category.product_count`),
+`prefetch_related` for to-many ones, with the nested serializer's own plan
+as the prefetch queryset, and `only()` the columns that are rendered. A
+field the plan cannot see through, a `SerializerMethodField`, `source='*'`
+or a model property, may read any column: the plan then leaves out
+`only()`, but still joins and prefetches the relations.
+
+Plans are computed once per serializer class and set of fields, from the
+declared fields, without a request context.
+
+Sparse fieldsets: on safe requests `?fields=id,name` keeps only the listed
+top-level fields of the response and `?exclude=price` drops some; unknown
+names are a 400. The plan is made for the kept fields only, so the columns
+and joins of the others are not queried at all.
+
+With QUERY_PLAN_STRICT (on in tests), a GET of a list or another
+`detail=False` action raises `PerRowQueries` when a statement runs more
+than once: the signature of a relation loaded row by row.
+"""
+from collections import Counter
+from contextlib import ExitStack
+from dataclasses import dataclass
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import Prefetch
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+
+class PerRowQueries(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class QueryPlan:
+    select_related: tuple = ()
+    # (lookup, related model, plan of the related queryset)
+    prefetch_related: tuple = ()
+    # None: every column.
+    only: tuple = None
+
+    def merge(self, other):
+        """A plan loading what either plan does."""
+        prefetches = dict((lookup, (model, plan)) for lookup, model, plan in self.prefetch_related)
+        for lookup, model, plan in other.prefetch_related:
+            if lookup in prefetches:
+                plan = prefetches[lookup][1].merge(plan)
+            prefetches[lookup] = (model, plan)
+        return QueryPlan(
+            select_related=tuple(dict.fromkeys(self.select_related + other.select_related)),
+            prefetch_related=tuple((lookup, model, plan) for lookup, (model, plan) in prefetches.items()),
+            only=None if self.only is None or other.only is None else tuple(dict.fromkeys(self.only + other.only)),
+        )
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*(
+                Prefetch(lookup, plan.apply(model._default_manager.all()))
+                for lookup, model, plan in self.prefetch_related
+            ))
+        if self.only is not None:
+            queryset = queryset.only(*self.only)
+        return queryset
+
+
+def _join(prefix, name):
+    return f'{prefix}__{name}' if prefix else name
+
+
+class PlanBuilder:
+    """Walks a serializer's fields along its model's relations."""
+
+    def __init__(self):
+        self.select_related = []
+        self.prefetch_related = []
+        self.only = []
+        # Lookups of the models whose rendered columns cannot be known.
+        self.full = set()
+
+    def visit(self, serializer, model, prefix='', names=None):
+        for name, field in serializer.fields.items():
+            if field.write_only or (names is not None and name not in names):
+                continue
+            if field.source == '*':
+                self.full.add(prefix)
+                continue
+            self.visit_source(field, model, prefix)
+
+    def visit_source(self, field, model, prefix):
+        attrs = field.source_attrs
+        for position, attr in enumerate(attrs):
+            last = position == len(attrs) - 1
+            try:
+                model_field = model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                self.full.add(prefix)
+                return
+            lookup = _join(prefix, attr)
+            if not model_field.is_relation:
+                self.only.append(lookup)
+                return
+            related = model_field.related_model
+            if model_field.many_to_many or model_field.one_to_many:
+                self.prefetch(field if last else None, model_field, lookup)
+                return
+            if model_field.concrete:
+                # The foreign key column itself, required to follow it.
+                self.only.append(lookup)
+                if last and not isinstance(field, BaseSerializer):
+                    # A related field renders the key only, no join needed.
+                    return
+            self.select_related.append(lookup)
+            if last:
+                if isinstance(field, BaseSerializer):
+                    self.visit(field, related, lookup)
+                else:
+                    self.full.add(lookup)
+                return
+            model, prefix = related, lookup
+
+    def prefetch(self, field, model_field, lookup):
+        related = model_field.related_model
+        if isinstance(field, ListSerializer):
+            builder = PlanBuilder()
+            builder.visit(field.child, related)
+            if model_field.one_to_many:
+                # The prefetched rows are matched on their foreign key.
+                builder.only.append(model_field.field.name)
+            plan = builder.plan()
+        else:
+            plan = QueryPlan()
+        self.prefetch_related.append((lookup, related, plan))
+
+    def plan(self):
+        # Each relation is prefetched once, loading what all its fields read.
+        return QueryPlan(
+            select_related=tuple(dict.fromkeys(self.select_related)),
+            only=None if self.full else tuple(dict.fromkeys(self.only)),
+        ).merge(QueryPlan(prefetch_related=tuple(self.prefetch_related), only=()))
+
+
+@lru_cache(maxsize=None)
+def query_plan(serializer_class, model, fields=None):
+    """
+    The plan rendering `model` instances with `serializer_class` needs, for
+    the top-level `fields` only when given (a tuple of names).
+    """
+    builder = PlanBuilder()
+    builder.visit(serializer_class(), model, names=fields)
+    return builder.plan()
+
+
+@lru_cache(maxsize=None)
+def field_names(serializer_class):
+    """The names of the fields `serializer_class` renders, in order."""
+    return tuple(name for name, field in serializer_class().fields.items() if not field.write_only)
+
+
+def parse_field_list(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class RepeatedQueries:
+    """`connection.execute_wrapper()` hook counting each statement."""
+
+    def __init__(self):
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.statements[sql] += 1
+        return execute(sql, params, many, context)
+
+    def repeated(self):
+        return {sql: count for sql, count in self.statements.items() if count > 1}
+
+
+class QueryPlanMixin:
+    """
+    Plan `get_queryset()` from the view's serializer; querysets built by
+    custom actions go through `plan_queryset()`. `?fields=` and `?exclude=`
+    trim the serializer and the plan on safe requests.
+    """
+    fields_query_param = 'fields'
+    exclude_query_param = 'exclude'
+
+    def get_queryset(self):
+        return self.plan_queryset(super().get_queryset())
+
+    def plan_queryset(self, queryset, serializer_class=None):
+        plan = query_plan(serializer_class or self.get_serializer_class(), queryset.model, self.selected_fields())
+        return plan.apply(queryset)
+
+    def selected_fields(self):
+        """The top-level fields asked for with `?fields=` / `?exclude=`, or None for all of them."""
+        if not hasattr(self, '_selected_fields'):
+            self._selected_fields = self.parse_selected_fields()
+        return self._selected_fields
+
+    def parse_selected_fields(self):
+        request = getattr(self, 'request', None)
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        fields = request.query_params.get(self.fields_query_param)
+        exclude = request.query_params.get(self.exclude_query_param)
+        if fields is None and exclude is None:
+            return None
+
+        available = field_names(self.get_serializer_class())
+        requested = parse_field_list(fields) if fields is not None else available
+        excluded = parse_field_list(exclude or '')
+        errors = {}
+        for param, names in ((self.fields_query_param, requested), (self.exclude_query_param, excluded)):
+            unknown = [name for name in names if name not in available]
+            if unknown:
+                errors[param] = [f'Unknown field(s): {", ".join(unknown)}. Choose from: {", ".join(available)}.']
+        if errors:
+            raise ValidationError(errors)
+        selected = tuple(name for name in available if name in requested and name not in excluded)
+        if not selected:
+            raise ValidationError({self.fields_query_param: ['Select at least one field.']})
+        return selected
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        selected = self.selected_fields()
+        if selected is not None:
+            target = getattr(serializer, 'child', serializer)
+            for name in [name for name in target.fields if name not in selected]:
+                target.fields.pop(name)
+        return serializer
+
+    def dispatch(self, request, *args, **kwargs):
+        if not getattr(settings, 'QUERY_PLAN_STRICT', False) or request.method not in SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+        queries = RepeatedQueries()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = super().dispatch(request, *args, **kwargs)
+        repeated = queries.repeated()
+        if repeated and getattr(self, 'detail', None) is False:
+            raise PerRowQueries(
+                f'{request.method} {request.path} ran statements once per row:\n'
+                + '\n'.join(f'{count}x {sql}' for sql, count in repeated.items())
+            )
+        return response
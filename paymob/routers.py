@@ -0,0 +1,131 @@
+"""
+Read/write routing between the primary database and its read replicas.
+
+Writes always go to `default`. Reads go to a replica only while a request
+of a view using `ReplicaReadMixin` is being served, so management
+commands, signals and everything outside those views keep reading the
+primary. A request that writes is pinned to the primary for the rest of
+the request and, through a cookie, for the next
+`DATABASE_REPLICA_PIN_SECONDS`, so clients read their own writes while
+the replicas catch up.
+"""
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_COOKIE = 'primary_pin'
+
+
+@dataclass
+class RouteState:
+    """How the database reads of the current request are routed."""
+    use_replicas: bool = False
+    pinned: bool = False
+    wrote: bool = False
+    replica: str = None
+
+
+# Set only while a ReplicaReadMixin view serves a request.
+_route = ContextVar('db_route', default=None)
+
+
+def replica_aliases():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def pin_to_primary():
+    """Read from the primary for the rest of the request and the pin window."""
+    state = _route.get()
+    if state is not None:
+        state.pinned = state.wrote = True
+
+
+class ReplicaPool:
+    """
+    Picks a replica for a request: 'round_robin' rotates through them,
+    'least_loaded' takes the one serving the fewest requests right now.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._turn = 0
+        self._in_flight = Counter()
+
+    def acquire(self, aliases, policy):
+        with self._lock:
+            if policy == 'least_loaded':
+                alias = min(aliases, key=lambda alias: self._in_flight[alias])
+            else:
+                alias = aliases[self._turn % len(aliases)]
+                self._turn += 1
+            self._in_flight[alias] += 1
+            return alias
+
+    def release(self, alias):
+        with self._lock:
+            self._in_flight[alias] -= 1
+
+    def in_flight(self, alias):
+        return self._in_flight[alias]
+
+
+pool = ReplicaPool()
+
+
+class ReadReplicaRouter:
+    """Database router sending the reads of replica-enabled requests to a replica."""
+
+    def db_for_read(self, model, **hints):
+        state = _route.get()
+        if state is None or not state.use_replicas or state.pinned:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            aliases = replica_aliases()
+            if not aliases:
+                return DEFAULT_DB_ALIAS
+            # One replica per request, so its reads see a single snapshot.
+            state.replica = pool.acquire(aliases, getattr(settings, 'DATABASE_REPLICA_POLICY', 'round_robin'))
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Serve the safe (read-only) requests of a DRF view from a read replica,
+    unless the client wrote within the pin window.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        state = RouteState(
+            use_replicas=request.method in SAFE_METHODS,
+            pinned=PIN_COOKIE in request.COOKIES,
+        )
+        token = _route.set(state)
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        finally:
+            _route.reset(token)
+            if state.replica is not None:
+                pool.release(state.replica)
+
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 5),
+                httponly=True, samesite='Lax',
+            )
+        return response
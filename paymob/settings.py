@@ -10,9 +10,14 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import atexit
 import os
 from pathlib import Path
+import shutil
 import sys
+import tempfile
+
+from paymob.sqlite import sqlite_options
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -47,6 +52,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'paymob.metrics.MetricsMiddleware',
+    'paymob.timing.ServerTimingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     # 'debug_toolbar.middleware.DebugToolbarMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,13 +91,109 @@ WSGI_APPLICATION = 'paymob.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLITE_PROFILE picks the PRAGMAs run on every new connection ('tuned' or
+# 'default', see paymob/sqlite.py). Connections are kept for DB_CONN_MAX_AGE
+# seconds and health-checked before reuse instead of reopened per request.
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'tuned')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        'OPTIONS': sqlite_options(SQLITE_PROFILE),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas, see paymob/routers.py. DATABASE_REPLICAS lists their aliases;
+# locally they can be SQLite copies of the primary given as a comma-separated
+# list of files in the DATABASE_REPLICAS environment variable.
+DATABASE_ROUTERS = ['paymob.routers.ReadReplicaRouter']
+DATABASE_REPLICAS = []
+for number, path in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica_{number}'] = {**DATABASES['default'], 'NAME': path.strip()}
+    DATABASE_REPLICAS.append(f'replica_{number}')
+# 'round_robin' or 'least_loaded'
+DATABASE_REPLICA_POLICY = os.environ.get('DATABASE_REPLICA_POLICY', 'round_robin')
+# How long a client that wrote keeps reading from the primary.
+DATABASE_REPLICA_PIN_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Product endpoint responses are cached per catalog version (see task1/cache.py).
+TASK1_RESPONSE_CACHE_ALIAS = 'default'
+TASK1_RESPONSE_CACHE_TIMEOUT = 300
+
+# Per-process budget of the pre-encoded JSON product rows (see
+# task1/fragments.py); 0 disables it.
+TASK1_FRAGMENT_CACHE_BYTES = 32 * 1024 * 1024
+
+# Top-N endpoints: the largest `?n=` accepted, the plan ('auto', 'window' or
+# 'per_category') and the cost of one per-category index lookup relative to
+# ranking one product, as measured by `manage.py benchmark_top_n`.
+TASK1_TOP_N_MAX = 100
+TASK1_TOP_N_STRATEGY = 'auto'
+TASK1_TOP_N_LOOKUP_COST = 1
+
+# POST /api/v1/task/users/bulk/: the most users accepted per request and the
+# rows per INSERT.
+TASK_BULK_CREATE_MAX_ITEMS = 10000
+TASK_BULK_CREATE_BATCH_SIZE = 1000
+
+# POST /api/v1/task/users/: 'off' saves in the request, 'async' and 'sync'
+# queue the user for a writer thread that saves signups in batches (see
+# task/write_queue.py). Delay and timeouts are in seconds.
+TASK_USER_WRITE_MODE = os.environ.get('TASK_USER_WRITE_MODE', 'off')
+TASK_WRITE_QUEUE_BATCH_SIZE = 500
+TASK_WRITE_QUEUE_MAX_DELAY = 0.002
+TASK_WRITE_QUEUE_MAX_DEPTH = 10000
+TASK_WRITE_QUEUE_SYNC_TIMEOUT = 2.0
+TASK_WRITE_QUEUE_CACHE_ALIAS = 'default'
+TASK_WRITE_QUEUE_STATUS_TIMEOUT = 3600
+
+# Bloom filter of taken usernames and emails behind
+# /api/v1/task/users/availability/ (see task/bloom.py). With TASK_BLOOM_PATH
+# the worker processes share it in a memory-mapped file; without it every
+# availability check is a query.
+TASK_BLOOM_CAPACITY = 1000000
+TASK_BLOOM_ERROR_RATE = 0.01
+TASK_BLOOM_PATH = os.environ.get('TASK_BLOOM_PATH') or None
+
+
+# Share of requests reporting SQL, serialize and render timings in a
+# Server-Timing header and a `paymob.timing` log line (see paymob/timing.py).
+# Every request in development; 1% otherwise, which keeps the overhead
+# within benchmarks/test_server_timing.py's budget.
+SERVER_TIMING_SAMPLE_RATE = float(os.environ.get('SERVER_TIMING_SAMPLE_RATE', 1.0 if DEBUG else 0.01))
+
+# Per-process sample files of the Prometheus metrics served at /internal/metrics
+# (see paymob/metrics.py); empty the directory before starting the server.
+METRICS_DIR = Path(os.environ.get('METRICS_DIR', Path(tempfile.gettempdir()) / 'paymob-metrics'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'paymob.timing': {
+            'handlers': ['console'],
+            'level': os.environ.get('SERVER_TIMING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -135,6 +238,22 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 TESTING = "test" in sys.argv or "PYTEST_VERSION" in os.environ
 
+# Raise on list responses that run a statement once per row (see
+# paymob/query_plan.py); always on in tests.
+QUERY_PLAN_STRICT = False
+
+if TESTING:
+    QUERY_PLAN_STRICT = True
+    SERVER_TIMING_SAMPLE_RATE = 1.0
+    # A directory per run, so test samples never reach a dev server's metrics.
+    METRICS_DIR = Path(tempfile.mkdtemp(prefix='paymob-metrics-'))
+    atexit.register(shutil.rmtree, METRICS_DIR, ignore_errors=True)
+    # Two separate test databases stand in for replicas; tests that route to
+    # them enable them with DATABASE_REPLICAS.
+    DATABASE_REPLICAS = []
+    for alias in ('replica_1', 'replica_2'):
+        DATABASES[alias] = {**DATABASES['default'], 'NAME': BASE_DIR / f'{alias}.sqlite3'}
+
 if not TESTING:
     INSTALLED_APPS = [
         *INSTALLED_APPS,
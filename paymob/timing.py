@@ -0,0 +1,172 @@
+"""
+Per-request timings reported in a `Server-Timing` header and a log line.
+
+`ServerTimingMiddleware` instruments a sampled share of the requests
+(`SERVER_TIMING_SAMPLE_RATE`, 0 turns it off) and measures:
+
+- sql: time and number of queries on every database alias, through
+  `query_wrapper()` (see paymob/query_hooks.py);
+- serialize: time spent turning rows or instances into response data,
+  marked with `measure('serialize')` or `TimedSerializerMixin`;
+- render: time spent rendering the response body, from DRF's
+  `process_template_response` hook to its post-render callback;
+- total: the whole request, as seen by the middleware.
+
+Browsers show the header in their network panels; the same numbers are
+logged by the `paymob.timing` logger, as `key=value` pairs in the message
+and as a `timing` dict on the record. Queries run while a streaming
+response is being consumed happen after the header is sent and are not
+counted. Requests that are not sampled pay for one random draw. Under
+ASGI the middleware runs as a coroutine, so async views are served
+without a thread.
+"""
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from paymob.query_hooks import query_wrapper
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# Set only while a sampled request is being served.
+_timings = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Milliseconds spent per metric during one request, and the query count."""
+
+    def __init__(self):
+        self.durations = {'sql': 0.0, 'serialize': 0.0, 'render': 0.0}
+        self.sql_count = 0
+
+    def add(self, metric, seconds):
+        self.durations[metric] = self.durations.get(metric, 0.0) + seconds * 1000
+
+    def __call__(self, execute, sql, params, many, context):
+        """`connection.execute_wrapper()` hook timing every query."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add('sql', time.perf_counter() - started)
+            self.sql_count += 1
+
+    def header(self, total_ms):
+        metrics = [
+            f'sql;dur={self.durations["sql"]:.2f};desc="{self.sql_count} queries"',
+            *(f'{metric};dur={duration:.2f}' for metric, duration in self.durations.items() if metric != 'sql'),
+            f'total;dur={total_ms:.2f}',
+        ]
+        return ', '.join(metrics)
+
+
+def current_timings():
+    """The timings of the request being served, or None when it is not sampled."""
+    return _timings.get()
+
+
+@contextmanager
+def measure(metric):
+    """Add the time spent in the block to `metric` of the current request."""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(metric, time.perf_counter() - started)
+
+
+class TimedSerializerMixin:
+    """Count the time spent building `.data` as 'serialize'."""
+
+    @property
+    def data(self):
+        with measure('serialize'):
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """`Meta.list_serializer_class` of timed serializers, for `many=True`."""
+
+
+class ServerTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def sample_rate(self):
+        return getattr(settings, 'SERVER_TIMING_SAMPLE_RATE', 0.01)
+
+    def sampled(self):
+        rate = self.sample_rate()
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    @contextmanager
+    def timed(self):
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        try:
+            with query_wrapper(timings):
+                yield timings
+        finally:
+            _timings.reset(token)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        with self.timed() as timings:
+            response = self.get_response(request)
+        return self.report(request, response, timings, started)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        started = time.perf_counter()
+        with self.timed() as timings:
+            response = await self.get_response(request)
+        return self.report(request, response, timings, started)
+
+    def report(self, request, response, timings, started):
+        total_ms = (time.perf_counter() - started) * 1000
+        response['Server-Timing'] = timings.header(total_ms)
+        self.log(request, response, timings, total_ms)
+        return response
+
+    def process_template_response(self, request, response):
+        timings = _timings.get()
+        if timings is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: timings.add('render', time.perf_counter() - started)
+            )
+        return response
+
+    def log(self, request, response, timings, total_ms):
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'sql_count': timings.sql_count,
+            **{f'{metric}_ms': round(duration, 2) for metric, duration in timings.durations.items()},
+        }
+        logger.info(' '.join(f'{key}={value}' for key, value in record.items()), extra={'timing': record})
@@ -17,10 +17,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
+from paymob.metrics import metrics_view
 # from debug_toolbar.toolbar import debug_toolbar_urls
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('internal/metrics', metrics_view, name='metrics'),
     path('', include('task.urls')),
     path('', include('task1.urls')),
 
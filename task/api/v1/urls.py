@@ -1,6 +1,7 @@
 # urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from task import async_views
 from task.views import UserViewSet
 
 router = DefaultRouter()
@@ -10,4 +11,6 @@ router.register(r'users', UserViewSet, basename='user')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('async/users/', async_views.user_list, name='async-user-list'),
+    path('async/users/<int:pk>/', async_views.user_detail, name='async-user-detail'),
 ]
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class TaskConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'task'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import signals  # noqa: F401
+        from .bloom import create_email_index_after_migrate
+
+        # task ships no migrations, so the index on auth_user is created here.
+        post_migrate.connect(create_email_index_after_migrate, sender=self)
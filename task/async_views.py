@@ -0,0 +1,25 @@
+"""
+Async-native user list and detail endpoints, see `task1.async_views`.
+"""
+from django.contrib.auth.models import User
+from django.shortcuts import aget_object_or_404
+
+from task1.async_views import async_api_view, json_response
+from task1.pagination import AsyncDefaultPagination
+from .serializers import UserSerializer
+
+# The profile is joined so serializing a page never queries per user.
+users = User.objects.select_related('profile').order_by('id')
+
+
+@async_api_view
+async def user_list(request):
+    paginator = AsyncDefaultPagination()
+    page = await paginator.apaginate_queryset(users, request)
+    return json_response(paginator.get_paginated_data(UserSerializer(page, many=True).data))
+
+
+@async_api_view
+async def user_detail(request, pk):
+    user = await aget_object_or_404(users, pk=pk)
+    return json_response(UserSerializer(user).data)
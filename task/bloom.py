@@ -0,0 +1,313 @@
+"""
+Bloom filter of taken usernames and emails.
+
+Answers "is this username or email free?" without a query for most values
+that are: a value the filter does not contain was never added, so it is
+free (a definite negative). A value it contains is probably taken and is
+confirmed with an indexed query, since a fraction of free values, the
+false-positive rate, also match. Each value sets `hashes` of `bits` bits,
+chosen from TASK_BLOOM_CAPACITY and TASK_BLOOM_ERROR_RATE; the
+`rebuild_user_bloom` command reports the estimated and measured rates.
+
+The filter is built from the user table on first use and kept current by
+a post_save signal and the bulk-create paths, which send no signals. Values
+are never removed: an old username stays probably taken, which the query
+corrects. With TASK_BLOOM_PATH the processes share one memory-mapped
+file and see each other's adds. Without it a process could only hold its
+own copy, which misses users created by other processes, so a miss is
+not definite and every value is looked up with the query instead. Either
+way the answer is advisory: signups still validate uniqueness.
+
+Emails are compared case-insensitively, on an index of lower(email) that
+post_migrate creates on auth_user.
+"""
+import hashlib
+import math
+import mmap
+import os
+import random
+import string
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Without flock, processes sharing a file may lose each other's bits.
+    fcntl = None
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models.functions import Lower
+from paymob.metrics import Counter
+
+User = get_user_model()
+
+MAGIC = b'PMBLOOM1'
+# Magic, number of bits, number of hashes, number of values added.
+_header = struct.Struct('<8sQQQ')
+_hashes = struct.Struct('<QQ')
+
+FIELDS = ('username', 'email')
+EMAIL_INDEX = 'task_auth_user_email_lower'
+
+AVAILABILITY_CHECKS = Counter(
+    'user_availability_checks_total',
+    'Availability checks by field and result: free (filter only), false_positive, taken, '
+    'or unfiltered (free, queried without a shared filter).',
+    ('field', 'result'),
+)
+
+
+def optimal_parameters(capacity, error_rate):
+    """(bits, hashes) holding `capacity` values at `error_rate` false positives."""
+    if capacity < 1 or not 0 < error_rate < 1:
+        raise ValueError('A Bloom filter needs a positive capacity and an error rate between 0 and 1.')
+    bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+    return bits, max(1, round(bits / capacity * math.log(2)))
+
+
+class BloomFilter:
+    """
+    `bits` bits in a header-prefixed buffer, a bytearray or a shared mmap.
+
+    A value's `hashes` positions come from one 128-bit BLAKE2b digest split
+    in two (double hashing), so adding or testing a value hashes it once.
+    """
+
+    def __init__(self, bits, hashes, buffer=None, file=None):
+        self.bits = bits
+        self.hashes = hashes
+        self.file = file
+        self._lock = threading.Lock()
+        if buffer is None:
+            buffer = bytearray(self.size(bits))
+            _header.pack_into(buffer, 0, MAGIC, bits, hashes, 0)
+        self._buffer = buffer
+
+    @staticmethod
+    def size(bits):
+        return _header.size + -(-bits // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity, error_rate):
+        return cls(*optimal_parameters(capacity, error_rate))
+
+    @classmethod
+    def open(cls, path):
+        """Map the filter file at `path`; adds are written to it and seen by other processes."""
+        file = open(path, 'r+b')
+        buffer = mmap.mmap(file.fileno(), 0)
+        magic, bits, hashes, _ = _header.unpack_from(buffer, 0)
+        if magic != MAGIC or len(buffer) != cls.size(bits):
+            buffer.close()
+            file.close()
+            raise ValueError(f'{path} is not a Bloom filter file.')
+        return cls(bits, hashes, buffer, file)
+
+    def save(self, path):
+        """Write the filter to `path` atomically."""
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as temporary:
+            temporary.write(self._buffer)
+        os.replace(temporary.name, path)
+
+    def close(self):
+        if self.file is not None:
+            self._buffer.close()
+            self.file.close()
+
+    def __len__(self):
+        """The number of values added, repeated ones included."""
+        return _header.unpack_from(self._buffer, 0)[3]
+
+    def positions(self, value):
+        first, second = _hashes.unpack(hashlib.blake2b(value.encode(), digest_size=16).digest())
+        second |= 1
+        return [(first + index * second) % self.bits for index in range(self.hashes)]
+
+    def __contains__(self, value):
+        buffer, offset = self._buffer, _header.size
+        return all(
+            buffer[offset + (position >> 3)] & (1 << (position & 7)) for position in self.positions(value)
+        )
+
+    def add(self, *values):
+        positions = [self.positions(value) for value in values]
+        buffer, offset = self._buffer, _header.size
+        with self._locked():
+            for value_positions in positions:
+                for position in value_positions:
+                    buffer[offset + (position >> 3)] |= 1 << (position & 7)
+            _header.pack_into(buffer, 0, MAGIC, self.bits, self.hashes, len(self) + len(values))
+
+    @contextmanager
+    def _locked(self):
+        # Setting a bit is a read-modify-write of its byte: serialize writers,
+        # of this process with the lock and of the others with flock.
+        with self._lock:
+            if self.file is None or fcntl is None:
+                yield
+                return
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self.file, fcntl.LOCK_UN)
+
+    def estimated_false_positive_rate(self):
+        return (1 - math.exp(-self.hashes * len(self) / self.bits)) ** self.hashes
+
+    def measured_false_positive_rate(self, samples=10000, seed=0):
+        """The share of `samples` random values, never added, that the filter contains."""
+        rng = random.Random(seed)
+        alphabet = string.ascii_letters + string.digits
+        # A prefix no username or email key has keeps the samples out of the set.
+        hits = sum(f'probe\0{"".join(rng.choices(alphabet, k=16))}' in self for _ in range(samples))
+        return hits / samples
+
+
+def key(field, value):
+    return f'{field}:{value.lower() if field == "email" else value}'
+
+
+def user_keys(users):
+    """The filter keys of `users`, model instances or (username, email) pairs."""
+    keys = []
+    for user in users:
+        username, email = (user.username, user.email) if isinstance(user, User) else user
+        keys.append(key('username', username))
+        if email:
+            keys.append(key('email', email))
+    return keys
+
+
+def filter_path():
+    return getattr(settings, 'TASK_BLOOM_PATH', None)
+
+
+def build_filter(using=None):
+    """A filter of every username and email in the user table."""
+    capacity = getattr(settings, 'TASK_BLOOM_CAPACITY', 1000000)
+    users = User.objects.using(using) if using else User.objects.all()
+    # Twice the current users, so the rate holds while the table grows.
+    bloom = BloomFilter.for_capacity(
+        max(capacity, 2 * users.count()), getattr(settings, 'TASK_BLOOM_ERROR_RATE', 0.01),
+    )
+    batch = []
+    for row in users.values_list('username', 'email').iterator(chunk_size=10000):
+        batch.append(row)
+        if len(batch) == 10000:
+            bloom.add(*user_keys(batch))
+            batch = []
+    if batch:
+        bloom.add(*user_keys(batch))
+    return bloom
+
+
+_filter = None
+_filter_inode = None
+_filter_lock = threading.Lock()
+
+
+def loaded_filter():
+    """The filter of this process if it was loaded, else None: nothing to keep current."""
+    if _filter is not None and filter_path() and _inode(filter_path()) != _filter_inode:
+        return get_filter()
+    return _filter
+
+
+def _inode(path):
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+def get_filter():
+    """
+    The filter of this process: TASK_BLOOM_PATH mapped, built first if it
+    does not exist, or built in memory. A file replaced by a rebuild is
+    mapped again.
+    """
+    global _filter, _filter_inode
+    path = filter_path()
+    if _filter is not None and (not path or _inode(path) == _filter_inode):
+        return _filter
+    with _filter_lock:
+        inode = _inode(path) if path else None
+        if _filter is not None and (not path or inode == _filter_inode):
+            return _filter
+        if path and inode is None:
+            build_filter().save(path)
+            inode = _inode(path)
+        previous, _filter = _filter, BloomFilter.open(path) if path else build_filter()
+        _filter_inode = inode
+    if previous is not None:
+        previous.close()
+    return _filter
+
+
+def reset_filter():
+    """Forget the filter of this process; the next `get_filter()` loads it again."""
+    global _filter, _filter_inode
+    with _filter_lock:
+        previous, _filter, _filter_inode = _filter, None, None
+    if previous is not None:
+        previous.close()
+
+
+def rebuild_filter(using=None):
+    """Build the filter from the user table, replacing TASK_BLOOM_PATH if set, and return it."""
+    bloom = build_filter(using)
+    if filter_path():
+        bloom.save(filter_path())
+    reset_filter()
+    return bloom
+
+
+def remember_users(users):
+    """Add users, or (username, email) pairs, to the filter if this process loaded it."""
+    bloom = loaded_filter()
+    if bloom is not None:
+        bloom.add(*user_keys(users))
+
+
+def taken_lookup(field, value, using=None):
+    """The users holding `value`, found on the username or lower(email) index."""
+    users = User.objects.using(using) if using else User.objects.all()
+    if field == 'email':
+        return users.annotate(email_lower=Lower('email')).filter(email_lower=value.lower())
+    return users.filter(username=value)
+
+
+def check_availability(values, using=None):
+    """
+    {field: available} for the `values` given by field ('username',
+    'email'): False only when a query confirmed the value is taken. The
+    filter only answers without a query when it is shared (TASK_BLOOM_PATH).
+    """
+    bloom = get_filter() if filter_path() else None
+    availability = {}
+    for field, value in values.items():
+        if bloom is not None and key(field, value) not in bloom:
+            availability[field] = True
+            AVAILABILITY_CHECKS.inc(field=field, result='free')
+            continue
+        taken = taken_lookup(field, value, using).exists()
+        availability[field] = not taken
+        free = 'false_positive' if bloom is not None else 'unfiltered'
+        AVAILABILITY_CHECKS.inc(field=field, result='taken' if taken else free)
+    return availability
+
+
+def create_email_index(using='default'):
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {EMAIL_INDEX} ON auth_user (lower(email))')
+
+
+def create_email_index_after_migrate(sender, using='default', **kwargs):
+    create_email_index(using)
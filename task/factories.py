@@ -0,0 +1,42 @@
+import factory
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from task.models import UserProfile
+
+User = get_user_model()
+
+class UserFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = User
+        skip_postgeneration_save = True
+
+    username = factory.Sequence(lambda n: f"user{n}")
+    email = factory.LazyAttribute(lambda user: f"{user.username}@example.com")
+    first_name = factory.Faker('first_name')
+    last_name = factory.Faker('last_name')
+    # Unusable, so building thousands of users skips password hashing.
+    password = factory.LazyFunction(lambda: make_password(None))
+    profile = factory.RelatedFactory('task.factories.UserProfileFactory', factory_related_name='user')
+
+class UserProfileFactory(factory.django.DjangoModelFactory):
+    class Meta:
+        model = UserProfile
+
+    user = factory.SubFactory(UserFactory, profile=None)
+    website = factory.LazyAttribute(lambda profile: f"https://{profile.user.username}.example.com")
+    bio = factory.Faker('text', max_nb_chars=200)
+
+
+def seed_users(count, batch_size=10000):
+    """Insert `count` users with profiles, built by the factories in bulk_create batches."""
+    for start in range(0, count, batch_size):
+        users = User.objects.bulk_create(
+            UserFactory.build_batch(
+                min(batch_size, count - start),
+                first_name='Seeded', last_name='User', profile=None,
+            )
+        )
+        UserProfile.objects.bulk_create(
+            UserProfileFactory.build(user=user, bio='A seeded user profile bio of more than fifty characters.')
+            for user in users
+        )
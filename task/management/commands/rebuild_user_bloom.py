@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from task.bloom import filter_path, rebuild_filter
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds the Bloom filter of taken usernames and emails from the user table '
+            'and reports its false-positive rate')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=None,
+                            help='Database alias to read the users from (default: the router\'s choice)')
+        parser.add_argument('--samples', type=int, default=100000,
+                            help='Random values never added, probed to measure the false-positive rate')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        bloom = rebuild_filter(options['database'])
+        elapsed = time.perf_counter() - started
+
+        where = filter_path() or 'memory (set TASK_BLOOM_PATH to share it)'
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt user Bloom filter in {where}: {len(bloom)} values, {bloom.bits} bits '
+            f'({bloom.bits / 8 / 1024:.0f} KiB), {bloom.hashes} hashes, {elapsed:.2f}s'
+        ))
+        self.stdout.write(f'False-positive rate: estimated {bloom.estimated_false_positive_rate():.4%}')
+        if options['samples'] > 0:
+            measured = bloom.measured_false_positive_rate(options['samples'])
+            self.stdout.write(f'False-positive rate: measured {measured:.4%} over {options["samples"]} probes')
+        bloom.close()
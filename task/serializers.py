@@ -1,9 +1,13 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
 from .models import UserProfile
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from .bloom import remember_users
 from .utils import CoreUtils
+from paymob.timing import TimedListSerializer, TimedSerializerMixin
 User = get_user_model()
 class UserProfileSerializer(serializers.ModelSerializer):
     
@@ -16,11 +20,133 @@ class UserProfileSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Bio must be at least 50 characters long")
         return value
 
-class UserSerializer(serializers.ModelSerializer):
+class Rejected:
+    """Stands in for an item of a bulk payload that failed validation."""
+
+    def __init__(self, errors):
+        self.errors = errors
+
+
+class UserListSerializer(TimedListSerializer):
+    """
+    Creates many users with their profiles at once.
+
+    Items are validated one by one except for username uniqueness, which is
+    checked for the whole payload with one query per batch. Invalid items do
+    not stop the valid ones: they are left out of `validated_data` and their
+    errors are kept in `item_errors` by position. `save()` inserts the users
+    and then the profiles with `bulk_create`, in one transaction.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('allow_empty', False)
+        kwargs.setdefault('max_length', getattr(settings, 'TASK_BULK_CREATE_MAX_ITEMS', 10000))
+        super().__init__(*args, **kwargs)
+        username = self.child.fields['username']
+        username.validators = [
+            validator for validator in username.validators if not isinstance(validator, UniqueValidator)
+        ]
+
+    @staticmethod
+    def batch_size():
+        return getattr(settings, 'TASK_BULK_CREATE_BATCH_SIZE', 1000)
+
+    def run_child_validation(self, data):
+        try:
+            return super().run_child_validation(data)
+        except serializers.ValidationError as exc:
+            return Rejected(exc.detail)
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        self.item_count = len(items)
+        self.item_errors = {
+            index: item.errors for index, item in enumerate(items) if isinstance(item, Rejected)
+        }
+        valid = [(index, item) for index, item in enumerate(items) if not isinstance(item, Rejected)]
+        valid = self.check_unique_usernames(valid)
+        self.valid_indexes = [index for index, _ in valid]
+        return [item for _, item in valid]
+
+    def use_validated_data(self, items):
+        """
+        Take `items`, each already validated by the child serializer, as the
+        payload, rechecking only username uniqueness: between them and
+        against users saved since they were validated.
+        """
+        self.item_count = len(items)
+        self.item_errors = {}
+        valid = self.check_unique_usernames([(index, dict(item)) for index, item in enumerate(items)])
+        self.valid_indexes = [index for index, _ in valid]
+        self._validated_data = [item for _, item in valid]
+        self._errors = []
+
+    def check_unique_usernames(self, items):
+        """Reject items whose username is taken, in the database or earlier in the payload."""
+        for _, item in items:
+            item['username'] = User.normalize_username(item['username'])
+        usernames = [item['username'] for _, item in items]
+        taken = set()
+        for start in range(0, len(usernames), self.batch_size()):
+            taken.update(
+                User.objects.filter(username__in=usernames[start:start + self.batch_size()])
+                .values_list('username', flat=True)
+            )
+
+        message = User._meta.get_field('username').error_messages['unique']
+        unique = []
+        for index, item in items:
+            if item['username'] in taken:
+                self.item_errors[index] = {'username': [serializers.ErrorDetail(message, code='unique')]}
+            else:
+                taken.add(item['username'])
+                unique.append((index, item))
+        return unique
+
+    def create(self, validated_data):
+        users, profiles = [], []
+        for attrs in validated_data:
+            attrs = dict(attrs)
+            profile_data = attrs.pop('profile')
+            user = User(**attrs)
+            # What create_user() does, without a save per user.
+            user.email = User.objects.normalize_email(user.email)
+            user.set_unusable_password()
+            users.append(user)
+            profiles.append(UserProfile(user=user, **profile_data))
+
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users, batch_size=self.batch_size())
+                UserProfile.objects.bulk_create(profiles, batch_size=self.batch_size())
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {'non_field_errors': ['A username was taken while the batch was saved; retry the request.']},
+                code='conflict',
+            )
+        for user, profile in zip(users, profiles):
+            user.profile = profile
+        # bulk_create sends no post_save.
+        remember_users(users)
+        return users
+
+    def results(self):
+        """One result per item of the payload, in order: the created user or the errors."""
+        created = dict(zip(self.valid_indexes, self.instance or []))
+        return [
+            {'index': index, 'status': 201, 'data': self.child.to_representation(created[index])}
+            if index in created else
+            {'index': index, 'status': 400, 'errors': self.item_errors[index]}
+            for index in range(self.item_count)
+        ]
+
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     profile = UserProfileSerializer()
 
     class Meta:
         model = User
+        list_serializer_class = UserListSerializer
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'profile']
         extra_kwargs = {
             'email': {'required': True},
@@ -39,21 +165,21 @@ class UserSerializer(serializers.ModelSerializer):
         profile_data = validated_data.pop('profile', None)
         with transaction.atomic():
             if profile_data:
-                CoreUtils.serializer_save(
-                    UserProfileSerializer,
-                    instance=instance.profile,
-                    data=profile_data,
-                    partial=True
+                try:
+                    profile = instance.profile
+                except UserProfile.DoesNotExist:
+                    profile = None
+                # The profile is a one-item collection: updated when it exists, created otherwise.
+                to_create, to_update = CoreUtils.organize_create_update_data(
+                    {**profile_data, 'id': profile.pk} if profile else dict(profile_data)
+                )
+                created, _ = CoreUtils.bulk_upsert(
+                    UserProfileSerializer, [profile] if profile else [], to_create, to_update, user=instance,
                 )
+                if created:
+                    instance.profile = created[0]
                 # profile_serializer = UserProfileSerializer(instance.profile, data=profile_data, partial=True)
                 # profile_serializer.is_valid(raise_exception=True)
                 # profile_serializer.save()
         # Update user fields
         return super().update(instance, validated_data)
-
-
-
-
-
-
-    
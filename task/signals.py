@@ -0,0 +1,13 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .bloom import remember_users
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def remember_user_in_bloom_filter(sender, instance, raw=False, **kwargs):
+    if not raw:
+        remember_users([instance])
@@ -0,0 +1,45 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APIClient
+from task.models import UserProfile
+
+User = get_user_model()
+
+
+@pytest.fixture
+def users():
+    users = []
+    for i in range(12):
+        user = User.objects.create_user(
+            username=f'user{i}', email=f'user{i}@example.com', first_name='Test', last_name=f'User {i}'
+        )
+        UserProfile.objects.create(user=user, website='https://example.com', bio='x' * 60)
+        users.append(user)
+    return users
+
+
+@pytest.mark.django_db
+class TestAsyncUserViews:
+
+    def test_list_matches_sync_endpoint(self, client, users):
+        expected = APIClient().get(reverse('task:user-list'), {'page': 2}).json()
+        response = client.get(reverse('task:async-user-list'), {'page': 2})
+        assert response.status_code == 200
+        data = response.json()
+        assert data['count'] == expected['count'] == 12
+        assert data['results'] == expected['results']
+
+    def test_list_does_not_query_per_user(self, client, users, django_assert_num_queries):
+        with django_assert_num_queries(2):
+            client.get(reverse('task:async-user-list'), {'page_size': 12})
+
+    def test_detail(self, client, users):
+        response = client.get(reverse('task:async-user-detail', args=[users[0].pk]))
+        assert response.status_code == 200
+        assert response.json()['profile']['website'] == 'https://example.com'
+
+    def test_missing_user_is_404(self, client, db):
+        response = client.get(reverse('task:async-user-detail', args=[999]))
+        assert response.status_code == 404
+        assert response.json() == {'detail': 'No User matches the given query.'}
@@ -0,0 +1,145 @@
+from io import StringIO
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from task import bloom
+from task.bloom import BloomFilter, optimal_parameters
+
+User = get_user_model()
+
+BIO = 'A bio that is long enough to pass the fifty character validation rule.'
+
+
+@pytest.fixture(autouse=True)
+def fresh_filter(settings, tmp_path):
+    settings.TASK_BLOOM_CAPACITY = 1000
+    settings.TASK_BLOOM_PATH = str(tmp_path / 'users.bloom')
+    bloom.reset_filter()
+    yield
+    bloom.reset_filter()
+
+
+def availability(api_client, **params):
+    return api_client.get(reverse('task:user-availability'), params)
+
+
+class TestBloomFilter:
+
+    def test_added_values_are_always_found(self):
+        values = [f'user{i}' for i in range(2000)]
+        bloom_filter = BloomFilter.for_capacity(2000, 0.01)
+        bloom_filter.add(*values)
+
+        assert all(value in bloom_filter for value in values)
+        assert len(bloom_filter) == 2000
+
+    def test_false_positive_rate_matches_the_target(self):
+        bloom_filter = BloomFilter.for_capacity(5000, 0.01)
+        bloom_filter.add(*(f'user{i}' for i in range(5000)))
+
+        assert bloom_filter.estimated_false_positive_rate() == pytest.approx(0.01, rel=0.1)
+        assert 0.005 < bloom_filter.measured_false_positive_rate(20000) < 0.015
+
+    def test_optimal_parameters(self):
+        # 9.59 bits and 7 hashes per value for 1%.
+        assert optimal_parameters(1000, 0.01) == (9586, 7)
+        with pytest.raises(ValueError):
+            optimal_parameters(0, 0.01)
+
+    def test_files_share_adds_between_processes(self, tmp_path):
+        path = tmp_path / 'users.bloom'
+        BloomFilter.for_capacity(100, 0.01).save(path)
+        writer, reader = BloomFilter.open(path), BloomFilter.open(path)
+
+        writer.add('shared')
+
+        assert 'shared' in reader
+        assert len(reader) == 1
+        writer.close()
+        reader.close()
+
+    def test_rejects_files_that_are_not_filters(self, tmp_path):
+        path = tmp_path / 'other.bin'
+        path.write_bytes(b'\0' * 64)
+        with pytest.raises(ValueError):
+            BloomFilter.open(path)
+
+
+@pytest.mark.django_db
+class TestAvailability:
+
+    def test_free_values_need_no_query(self, api_client, django_assert_num_queries):
+        User.objects.create_user(username='taken', email='taken@example.com')
+        bloom.get_filter()
+
+        with django_assert_num_queries(0):
+            response = availability(api_client, username='free', email='free@example.com')
+
+        assert response.status_code == 200
+        assert response.data == {
+            'username': {'value': 'free', 'available': True},
+            'email': {'value': 'free@example.com', 'available': True},
+        }
+
+    def test_taken_values_are_confirmed(self, api_client, django_assert_num_queries):
+        User.objects.create_user(username='taken', email='Taken@Example.com')
+        bloom.get_filter()
+
+        with django_assert_num_queries(2):
+            response = availability(api_client, username='taken', email='TAKEN@example.COM')
+
+        assert response.data['username']['available'] is False
+        assert response.data['email']['available'] is False
+
+    def test_false_positives_are_corrected_by_the_query(self, api_client):
+        bloom.get_filter().add(bloom.key('username', 'ghost'))
+        assert availability(api_client, username='ghost').data['username']['available'] is True
+
+    def test_users_created_after_loading_are_added(self, api_client):
+        bloom.get_filter()
+        User.objects.create_user(username='signal', email='signal@example.com')
+        api_client.post(reverse('task:user-bulk'), [{
+            'username': 'bulk', 'email': 'bulk@example.com', 'first_name': 'Bulk', 'last_name': 'User',
+            'profile': {'website': 'https://example.com', 'bio': BIO},
+        }], format='json')
+
+        for username in ('signal', 'bulk'):
+            assert bloom.key('username', username) in bloom.get_filter()
+            assert availability(api_client, username=username).data['username']['available'] is False
+
+    def test_without_a_shared_filter_every_value_is_queried(self, api_client, settings,
+                                                              django_assert_num_queries):
+        settings.TASK_BLOOM_PATH = None
+        bloom.get_filter()
+        # As if created by another worker process.
+        User.objects.bulk_create([User(username='elsewhere', email='elsewhere@example.com')])
+
+        with django_assert_num_queries(2):
+            response = availability(api_client, username='elsewhere', email='free@example.com')
+
+        assert response.data['username']['available'] is False
+        assert response.data['email']['available'] is True
+
+    def test_needs_a_value(self, api_client):
+        assert availability(api_client).status_code == 400
+
+    def test_lookups_use_an_index(self):
+        assert bloom.EMAIL_INDEX in bloom.taken_lookup('email', 'Taken@Example.com').explain()
+        assert 'USING INDEX' in bloom.taken_lookup('username', 'taken').explain()
+
+
+@pytest.mark.django_db
+def test_rebuild_replaces_the_shared_file():
+    loaded = bloom.get_filter()
+    User.objects.bulk_create([User(username='unsignalled', email='quiet@example.com')])
+    assert bloom.key('username', 'unsignalled') not in loaded
+
+    out = StringIO()
+    call_command('rebuild_user_bloom', samples=1000, stdout=out)
+
+    assert bloom.key('username', 'unsignalled') in bloom.get_filter()
+    assert bloom.get_filter() is not loaded
+    assert '2 values' in out.getvalue()
+    assert 'measured' in out.getvalue()
@@ -0,0 +1,96 @@
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework.exceptions import ValidationError
+from task.models import UserProfile
+from task.serializers import UserProfileSerializer, UserSerializer
+from task.utils import CoreUtils
+
+User = get_user_model()
+
+BIO = 'A bio that is long enough to pass the fifty character validation rule.'
+
+
+def make_profiles(count):
+    users = User.objects.bulk_create(User(username=f'upsert{i}') for i in range(count))
+    return UserProfile.objects.bulk_create(
+        UserProfile(user=user, website='https://example.com', bio=BIO) for user in users
+    )
+
+
+def upsert(profiles, items, **kwargs):
+    to_create, to_update = CoreUtils.organize_create_update_data(items)
+    return CoreUtils.bulk_upsert(UserProfileSerializer, profiles, to_create, to_update, **kwargs)
+
+
+@pytest.mark.django_db
+class TestBulkUpsert:
+
+    @pytest.mark.parametrize('count', [1, 20])
+    def test_query_count_does_not_grow_with_the_items(self, count, django_assert_num_queries):
+        profiles = make_profiles(count)
+        items = [{'id': profile.pk, 'website': f'https://{profile.pk}.example.com'} for profile in profiles]
+
+        # The transaction's savepoint, one UPDATE and its release.
+        with django_assert_num_queries(3):
+            _, updated = upsert(profiles, items)
+
+        assert len(updated) == count
+        assert sorted(UserProfile.objects.values_list('website', flat=True)) == sorted(
+            item['website'] for item in items
+        )
+
+    def test_updates_only_changed_items_and_fields(self, django_assert_num_queries):
+        first, second = make_profiles(2)
+        items = [
+            {'id': first.pk, 'website': 'https://example.com', 'bio': BIO + ' More.'},
+            {'id': second.pk, 'website': 'https://example.com', 'bio': BIO},
+        ]
+
+        with django_assert_num_queries(3) as captured:
+            _, updated = upsert([first, second], items)
+
+        assert updated == [first]
+        update = captured.captured_queries[1]['sql']
+        assert '"bio"' in update and '"website"' not in update
+        first.refresh_from_db()
+        assert first.bio == BIO + ' More.'
+
+    def test_nothing_changed_runs_no_query(self, django_assert_num_queries):
+        profiles = make_profiles(2)
+        with django_assert_num_queries(0):
+            created, updated = upsert(profiles, [{'id': profile.pk, 'bio': BIO} for profile in profiles])
+        assert created == updated == []
+
+    def test_ignores_items_matching_no_instance(self):
+        (profile,) = make_profiles(1)
+        _, updated = upsert([profile], [{'id': profile.pk + 100, 'bio': BIO + ' Elsewhere.'}])
+        assert updated == []
+        assert not UserProfile.objects.filter(bio__endswith='Elsewhere.').exists()
+
+    def test_creates_new_items_with_the_save_kwargs(self):
+        (profile,) = make_profiles(1)
+        user = User.objects.create(username='newcomer')
+
+        created, updated = upsert([profile], [{'website': 'https://new.example.com', 'bio': BIO}], user=user)
+
+        assert updated == []
+        assert [item.user for item in created] == [user]
+        assert UserProfile.objects.get(user=user).website == 'https://new.example.com'
+
+    def test_invalid_items_save_nothing(self):
+        (profile,) = make_profiles(1)
+        with pytest.raises(ValidationError):
+            upsert([profile], [{'id': profile.pk, 'website': 'https://changed.example.com'}, {'bio': 'Too short'}])
+        profile.refresh_from_db()
+        assert profile.website == 'https://example.com'
+
+
+@pytest.mark.django_db
+def test_user_update_creates_a_missing_profile():
+    user = User.objects.create(username='noprofile', email='noprofile@example.com')
+    serializer = UserSerializer(user, data={'profile': {'website': 'https://example.com', 'bio': BIO}}, partial=True)
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+
+    assert UserProfile.objects.get(user=user).bio == BIO
+    assert serializer.data['profile']['bio'] == BIO
@@ -0,0 +1,109 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from task.models import UserProfile
+
+User = get_user_model()
+
+BIO = 'A bio that is long enough to pass the fifty character validation rule.'
+
+
+@pytest.fixture
+def url():
+    return reverse('task:user-bulk')
+
+
+def payload(username, **overrides):
+    return {
+        'username': username,
+        'email': f'{username}@EXAMPLE.com',
+        'first_name': 'Bulk',
+        'last_name': 'User',
+        'profile': {'website': 'https://example.com', 'bio': BIO},
+        **overrides,
+    }
+
+
+@pytest.mark.django_db
+class TestBulkCreateUsers:
+
+    def test_creates_every_user_with_its_profile(self, api_client, url):
+        response = api_client.post(url, [payload(f'bulk{i}') for i in range(3)], format='json')
+
+        assert response.status_code == 201
+        assert response.data['created'] == 3
+        assert response.data['failed'] == 0
+        assert [result['status'] for result in response.data['results']] == [201, 201, 201]
+        first = response.data['results'][0]['data']
+        assert first['username'] == 'bulk0'
+        assert first['email'] == 'bulk0@example.com'
+        assert first['profile'] == {'website': 'https://example.com', 'bio': BIO}
+
+        user = User.objects.get(pk=first['id'])
+        assert not user.has_usable_password()
+        assert user.profile.bio == BIO
+        assert UserProfile.objects.count() == 3
+
+    def test_query_count_does_not_grow_with_the_payload(self, api_client, url, settings,
+                                                        django_assert_max_num_queries):
+        settings.TASK_BULK_CREATE_BATCH_SIZE = 100
+        # Uniqueness check, users, profiles and the transaction's savepoint.
+        with django_assert_max_num_queries(6):
+            response = api_client.post(url, [payload(f'many{i}') for i in range(100)], format='json')
+
+        assert response.status_code == 201
+        assert User.objects.filter(username__startswith='many').count() == 100
+
+    def test_batches_larger_payloads(self, api_client, url, settings):
+        settings.TASK_BULK_CREATE_BATCH_SIZE = 2
+        response = api_client.post(url, [payload(f'batched{i}') for i in range(5)], format='json')
+
+        assert response.status_code == 201
+        assert sorted(User.objects.values_list('profile__user__username', flat=True)) == [
+            f'batched{i}' for i in range(5)
+        ]
+
+    def test_reports_invalid_items_and_creates_the_rest(self, api_client, url):
+        User.objects.create_user(username='taken', email='taken@example.com')
+        items = [
+            payload('fine'),
+            payload('short', profile={'website': 'https://example.com', 'bio': 'Too short'}),
+            payload('taken'),
+            payload('fine'),
+            payload('second'),
+        ]
+
+        response = api_client.post(url, items, format='json')
+
+        assert response.status_code == 207
+        assert response.data['created'] == 2
+        assert response.data['failed'] == 3
+        results = response.data['results']
+        assert [result['status'] for result in results] == [201, 400, 400, 400, 201]
+        assert [result['index'] for result in results] == [0, 1, 2, 3, 4]
+        assert 'bio' in results[1]['errors']['profile']
+        assert results[2]['errors']['username'] == ['A user with that username already exists.']
+        assert results[3]['errors']['username'] == ['A user with that username already exists.']
+        assert set(User.objects.values_list('username', flat=True)) == {'taken', 'fine', 'second'}
+
+    def test_nothing_valid_is_a_bad_request(self, api_client, url):
+        response = api_client.post(url, [payload('nomail', email='not an email')], format='json')
+
+        assert response.status_code == 400
+        assert response.data['created'] == 0
+        assert 'email' in response.data['results'][0]['errors']
+        assert not User.objects.exists()
+
+    @pytest.mark.parametrize('body', [{}, [], 'users'])
+    def test_rejects_payloads_that_are_not_a_list_of_users(self, api_client, url, body):
+        response = api_client.post(url, body, format='json')
+        assert response.status_code == 400
+        assert 'non_field_errors' in response.data
+
+    def test_rejects_payloads_over_the_limit(self, api_client, url, settings):
+        settings.TASK_BULK_CREATE_MAX_ITEMS = 2
+        response = api_client.post(url, [payload(f'over{i}') for i in range(3)], format='json')
+
+        assert response.status_code == 400
+        assert not User.objects.exists()
+
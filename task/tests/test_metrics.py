@@ -0,0 +1,138 @@
+import multiprocessing
+
+import pytest
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.core.cache import caches
+from django.test import AsyncClient
+from django.urls import reverse
+from paymob.metrics import (
+    INITIAL_FILE_SIZE, Counter, Gauge, Histogram, MetricsMiddleware, MetricsRegistry, MmapValues,
+)
+from task.factories import UserFactory
+
+
+@pytest.fixture(autouse=True)
+def metrics_dir(settings, tmp_path):
+    settings.METRICS_DIR = tmp_path
+    for cache in caches.all():
+        cache.clear()
+    return tmp_path
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+def scrape(client, **extra):
+    response = client.get(reverse('metrics'), **extra)
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+    return response.content.decode().splitlines()
+
+
+def value(lines, sample):
+    [line] = [line for line in lines if line.startswith(sample + ' ')]
+    return float(line.rsplit(' ', 1)[1])
+
+
+@pytest.mark.django_db
+class TestMetricsEndpoint:
+
+    def test_records_latency_queries_and_cache_per_route(self, api_client):
+        UserFactory.create_batch(2)
+        api_client.get(reverse('product-list'))
+        api_client.get(reverse('product-list'))
+        api_client.get(reverse('task:user-list'))
+
+        lines = scrape(api_client)
+
+        route = 'route="product-list",method="GET",status="200"'
+        assert value(lines, f'http_request_duration_seconds_count{{{route}}}') == 2
+        assert value(lines, f'http_request_duration_seconds_bucket{{{route},le="+Inf"}}') == 2
+        assert value(lines, f'http_request_duration_seconds_sum{{{route}}}') > 0
+        # The count and the page, profiles joined.
+        assert value(lines, 'db_queries_total{route="task:user-list",method="GET"}') == 2
+        assert value(lines, 'cache_requests_total{cache="task1_response",result="miss"}') == 1
+        assert value(lines, 'cache_requests_total{cache="task1_response",result="hit"}') == 1
+        # Only the scrape itself is being served.
+        assert value(lines, 'http_requests_in_flight') == 1
+        assert '# TYPE http_request_duration_seconds histogram' in lines
+
+    def test_asgi_requests_are_recorded(self, api_client):
+        response = async_to_sync(AsyncClient().get)(reverse('async-product-list'))
+        assert response.status_code == 200
+
+        lines = scrape(api_client)
+        route = 'route="async-product-list",method="GET",status="200"'
+        assert value(lines, f'http_request_duration_seconds_count{{{route}}}') == 1
+        assert value(lines, 'db_queries_total{route="async-product-list",method="GET"}') == 2
+        assert iscoroutinefunction(MetricsMiddleware(AsyncClient().get))
+
+    def test_is_hidden_from_other_addresses(self, api_client):
+        response = api_client.get(reverse('metrics'), REMOTE_ADDR='10.1.2.3')
+        assert response.status_code == 404
+
+
+class TestRegistry:
+
+    def test_histogram_buckets_are_cumulative(self, registry):
+        histogram = Histogram('latency_seconds', 'Latency.', ('route',), buckets=(0.1, 1), registry=registry)
+        for seconds in (0.05, 0.5, 0.7, 3):
+            histogram.observe(seconds, route='a')
+
+        lines = histogram.samples(registry.collect())
+
+        assert lines == [
+            'latency_seconds_bucket{route="a",le="0.1"} 1',
+            'latency_seconds_bucket{route="a",le="1"} 3',
+            'latency_seconds_bucket{route="a",le="+Inf"} 4',
+            'latency_seconds_sum{route="a"} 4.25',
+            'latency_seconds_count{route="a"} 4',
+        ]
+
+    def test_label_values_are_escaped(self, registry):
+        counter = Counter('things_total', 'Things.', ('name',), registry=registry)
+        counter.inc(name='say "hi"\\\n')
+
+        assert counter.samples(registry.collect()) == ['things_total{name="say \\"hi\\"\\\\\\n"} 1']
+
+    def test_aggregates_across_processes(self, registry, metrics_dir):
+        counter = Counter('jobs_total', 'Jobs.', registry=registry)
+        gauge = Gauge('busy', 'Busy workers.', registry=registry)
+        counter.inc(2)
+        gauge.inc()
+
+        def worker():
+            counter.inc(3)
+            gauge.inc()
+
+        process = multiprocessing.get_context('fork').Process(target=worker)
+        process.start()
+        process.join()
+
+        assert len(list(metrics_dir.glob('*.db'))) == 2
+        totals = registry.collect()
+        assert totals['jobs_total', ()] == 5
+        # The worker has exited: its gauge no longer counts.
+        assert totals['busy', ()] == 1
+
+
+def test_mmap_file_grows_and_reopens(tmp_path):
+    path = tmp_path / 'values.db'
+    values = MmapValues(path)
+    keys = [f'sample-{i:05}' for i in range(INITIAL_FILE_SIZE // 16)]
+    for i, key in enumerate(keys):
+        values.add(key, i)
+    values.add(keys[0], 0.5)
+    values.close()
+
+    assert path.stat().st_size > INITIAL_FILE_SIZE
+    stored = MmapValues.read(path)
+    assert len(stored) == len(keys)
+    assert stored[keys[0]] == 0.5
+    assert stored[keys[-1]] == len(keys) - 1
+
+    reopened = MmapValues(path)
+    reopened.add(keys[-1], 1)
+    assert MmapValues.read(path)[keys[-1]] == len(keys)
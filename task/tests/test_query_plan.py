@@ -0,0 +1,147 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import serializers
+from rest_framework.test import APIClient, APIRequestFactory
+from paymob.query_plan import PerRowQueries, QueryPlan, query_plan
+from task.factories import UserFactory
+from task.serializers import UserSerializer
+from task.views import UserViewSet
+from task1.models import Category, Product
+from task1.serializers import ProductSerializer
+
+User = get_user_model()
+
+
+class CategoryProductSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name']
+
+
+class CategoryWithProductsSerializer(serializers.ModelSerializer):
+    products = CategoryProductSerializer(many=True)
+    product_ids = serializers.PrimaryKeyRelatedField(source='products', many=True, read_only=True)
+
+    class Meta:
+        model = Category
+        fields = ['name', 'products', 'product_ids']
+
+
+class UserBioSerializer(serializers.ModelSerializer):
+    bio = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ['id', 'bio']
+
+    def get_bio(self, user):
+        return user.profile.bio
+
+
+def test_nested_serializers_are_joined_and_narrowed():
+    assert query_plan(UserSerializer, User) == QueryPlan(
+        select_related=('profile',),
+        only=('id', 'username', 'email', 'first_name', 'last_name', 'profile__website', 'profile__bio'),
+    )
+    plan = query_plan(ProductSerializer, Product)
+    assert plan.select_related == ('category',)
+    # `category.product_count` is a dotted source through the same join.
+    assert 'category__product_count' in plan.only
+    assert 'category' in plan.only
+
+
+def test_to_many_relations_are_prefetched_with_their_own_plan():
+    plan = query_plan(CategoryWithProductsSerializer, Category)
+
+    assert plan.only == ('name',)
+    # Both fields read `products`: one prefetch, loading what both need.
+    [(lookup, model, products_plan)] = plan.prefetch_related
+    assert (lookup, model) == ('products', Product)
+    assert products_plan.only is None
+
+
+def test_fields_the_plan_cannot_see_through_load_every_column():
+    assert query_plan(UserBioSerializer, User) == QueryPlan()
+
+
+@pytest.mark.django_db
+class TestPlannedViewSets:
+
+    @pytest.mark.parametrize('users', [1, 10])
+    def test_user_list_runs_the_same_queries_for_any_page(self, users, django_assert_num_queries):
+        UserFactory.create_batch(users)
+        with django_assert_num_queries(2):
+            response = APIClient().get(reverse('task:user-list'))
+        assert len(response.data['results']) == users
+        assert response.data['results'][0]['profile']['bio']
+
+    def test_sparse_fieldsets_skip_the_profile_join(self, django_assert_num_queries):
+        UserFactory.create_batch(3)
+        with django_assert_num_queries(2) as captured:
+            response = APIClient().get(reverse('task:user-list'), {'fields': 'id,username'})
+
+        assert [list(user) for user in response.data['results']] == [['id', 'username']] * 3
+        page = captured.captured_queries[-1]['sql']
+        assert 'task_userprofile' not in page and '"email"' not in page
+
+    def test_unknown_fields_are_rejected(self):
+        response = APIClient().get(reverse('task:user-list'), {'fields': 'id,password'})
+        assert response.status_code == 400
+        assert 'password' in str(response.data['fields'])
+
+    def test_writes_ignore_sparse_fieldsets(self):
+        user = UserFactory()
+        response = APIClient().patch(
+            f"{reverse('task:user-detail', args=[user.pk])}?fields=id", {'last_name': 'Full'}, format='json',
+        )
+        assert response.data['last_name'] == 'Full'
+
+    def test_partial_updates_save_the_planned_user(self):
+        user = UserFactory()
+        password = user.password
+        response = APIClient().patch(
+            reverse('task:user-detail', args=[user.pk]), {'first_name': 'Planned'}, format='json',
+        )
+
+        assert response.status_code == 200
+        user.refresh_from_db()
+        assert user.first_name == 'Planned'
+        assert user.password == password
+
+    def test_prefetched_rows_keep_their_foreign_key(self):
+        class ProductsSerializer(serializers.ModelSerializer):
+            products = CategoryProductSerializer(many=True)
+
+            class Meta:
+                model = Category
+                fields = ['products']
+
+        [(_, _, products_plan)] = query_plan(ProductsSerializer, Category).prefetch_related
+        # The foreign key matches prefetched products to their category.
+        assert products_plan.only == ('id', 'name', 'category')
+
+    def test_prefetch_plans_load_each_relation_once(self, django_assert_num_queries):
+        category = Category.objects.create(name='Books', description='Paper')
+        Product.objects.bulk_create(Product(name=f'Book {i}', category=category, price=i) for i in range(5))
+        Category.objects.create(name='Empty', description='None')
+
+        queryset = query_plan(CategoryWithProductsSerializer, Category).apply(Category.objects.order_by('name'))
+        # The categories, then the products of all of them.
+        with django_assert_num_queries(2):
+            data = CategoryWithProductsSerializer(queryset, many=True).data
+
+        assert [len(category['products']) for category in data] == [5, 0]
+        assert sorted(data[0]['product_ids']) == sorted(Product.objects.values_list('id', flat=True))
+
+    def test_strict_mode_rejects_per_row_queries(self, settings):
+        settings.QUERY_PLAN_STRICT = True
+        UserFactory.create_batch(2)
+        view = UserViewSet.as_view({'get': 'list'}, serializer_class=UserBioSerializer, detail=False)
+
+        with pytest.raises(PerRowQueries, match='task_userprofile'):
+            view(APIRequestFactory().get('/users/'))
+
+        settings.QUERY_PLAN_STRICT = False
+        assert view(APIRequestFactory().get('/users/')).status_code == 200
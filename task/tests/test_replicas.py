@@ -0,0 +1,94 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from paymob.routers import PIN_COOKIE, ReadReplicaRouter, ReplicaPool, pool
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+DATABASES = ['default', 'replica_1', 'replica_2']
+
+
+@pytest.fixture
+def replicas(settings):
+    """Give every database a differently named user so responses show where they were read."""
+    settings.DATABASE_REPLICAS = ['replica_1', 'replica_2']
+    for alias in DATABASES:
+        User.objects.db_manager(alias).create_user(username=f'on-{alias}', email=f'{alias}@example.com')
+    return settings
+
+
+def served_by(response):
+    assert response.status_code == 200, response.data
+    return response.data['results'][0]['username'].removeprefix('on-')
+
+
+def profile_data(username):
+    return {
+        'username': username,
+        'email': f'{username}@example.com',
+        'first_name': 'Read',
+        'last_name': 'Writes',
+        'profile': {
+            'website': 'https://example.com',
+            'bio': 'A bio that is long enough to pass the fifty character validation rule.',
+        },
+    }
+
+
+@pytest.mark.django_db(databases=DATABASES)
+class TestReplicaRouting:
+
+    def test_reads_rotate_through_the_replicas(self, api_client, replicas):
+        url = reverse('task:user-list')
+        served = {served_by(api_client.get(url)) for _ in range(4)}
+        assert served == {'replica_1', 'replica_2'}
+
+    def test_without_replicas_reads_use_the_primary(self, api_client, replicas):
+        replicas.DATABASE_REPLICAS = []
+        assert served_by(api_client.get(reverse('task:user-list'))) == 'default'
+
+    def test_reads_outside_replica_views_use_the_primary(self, replicas):
+        assert list(User.objects.values_list('username', flat=True)) == ['on-default']
+
+    def test_client_reads_its_own_writes_from_the_primary(self, api_client, replicas):
+        response = api_client.post(reverse('task:user-list'), profile_data('fresh'), format='json')
+        assert response.status_code == 201
+        assert PIN_COOKIE in response.cookies
+        assert not User.objects.using('replica_1').filter(username='fresh').exists()
+
+        detail = api_client.get(reverse('task:user-detail', args=[response.data['id']]))
+        assert detail.status_code == 200
+        assert detail.data['username'] == 'fresh'
+
+        # Other clients keep reading from the replicas.
+        assert served_by(APIClient().get(reverse('task:user-list'))) != 'default'
+
+    def test_failed_writes_do_not_pin(self, api_client, replicas):
+        response = api_client.post(reverse('task:user-list'), {'username': ''}, format='json')
+        assert response.status_code == 400
+        assert PIN_COOKIE not in response.cookies
+
+    def test_in_flight_counts_are_released(self, api_client, replicas):
+        api_client.get(reverse('task:user-list'))
+        assert pool.in_flight('replica_1') == pool.in_flight('replica_2') == 0
+
+
+class TestReplicaPool:
+
+    def test_round_robin(self):
+        replica_pool = ReplicaPool()
+        picks = [replica_pool.acquire(['a', 'b', 'c'], 'round_robin') for _ in range(4)]
+        assert picks == ['a', 'b', 'c', 'a']
+
+    def test_least_loaded(self):
+        replica_pool = ReplicaPool()
+        assert replica_pool.acquire(['a', 'b'], 'least_loaded') == 'a'
+        assert replica_pool.acquire(['a', 'b'], 'least_loaded') == 'b'
+        replica_pool.release('a')
+        assert replica_pool.acquire(['a', 'b'], 'least_loaded') == 'a'
+        assert replica_pool.acquire(['a', 'b'], 'least_loaded') == 'a'
+        assert replica_pool.in_flight('a') == 2
+
+    def test_writes_always_go_to_the_primary(self):
+        assert ReadReplicaRouter().db_for_write(User) == 'default'
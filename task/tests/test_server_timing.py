@@ -0,0 +1,118 @@
+import logging
+import re
+
+import pytest
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import AsyncClient
+from django.urls import reverse
+from paymob.timing import RequestTimings, ServerTimingMiddleware, current_timings, measure
+from task.factories import UserFactory
+from task1.cache import catalog_state
+from task1.models import Category, Product
+
+User = get_user_model()
+
+METRIC = re.compile(r'(\w+);dur=([\d.]+)(?:;desc="(\d+) queries")?')
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+    yield
+
+
+def server_timing(response):
+    """{metric: (milliseconds, query count or None)} of the Server-Timing header."""
+    return {
+        name: (float(duration), int(count) if count else None)
+        for name, duration, count in METRIC.findall(response['Server-Timing'])
+    }
+
+
+@pytest.mark.django_db
+class TestServerTiming:
+
+    def test_product_list_reports_every_metric(self, api_client):
+        category = Category.objects.create(name='Books')
+        Product.objects.create(name='Novel', category=category, price=10)
+
+        response = api_client.get(reverse('product-list'))
+
+        assert response.status_code == 200
+        metrics = server_timing(response)
+        assert set(metrics) == {'sql', 'serialize', 'render', 'total'}
+        # The catalog version, the page and its count.
+        assert metrics['sql'][1] == 3
+        assert all(duration > 0 for duration, _ in metrics.values())
+        assert metrics['total'][0] >= metrics['sql'][0] + metrics['render'][0]
+
+    def test_serializer_time_is_measured_for_model_viewsets(self, api_client):
+        UserFactory.create_batch(3)
+
+        metrics = server_timing(api_client.get(reverse('task:user-list')))
+
+        assert metrics['serialize'][0] > 0
+        # One count and one page, profiles joined.
+        assert metrics['sql'][1] == 2
+
+    def test_async_views_are_measured(self, api_client):
+        metrics = server_timing(api_client.get(reverse('async-product-list')))
+
+        assert metrics['sql'][1] == 2
+        assert metrics['render'][0] > 0
+
+    def test_asgi_requests_stay_async(self):
+        response = async_to_sync(AsyncClient().get)(reverse('async-product-list'))
+
+        assert response.status_code == 200
+        assert server_timing(response)['sql'][1] == 2
+        assert iscoroutinefunction(ServerTimingMiddleware(AsyncClient().get))
+
+    def test_unsampled_requests_are_not_instrumented(self, api_client, settings):
+        settings.SERVER_TIMING_SAMPLE_RATE = 0
+
+        response = api_client.get(reverse('product-list'))
+
+        assert response.status_code == 200
+        assert 'Server-Timing' not in response
+
+    def test_sample_rate_applies_per_request(self, api_client, settings, monkeypatch):
+        settings.SERVER_TIMING_SAMPLE_RATE = 0.25
+        draws = iter([0.1, 0.9])
+        monkeypatch.setattr('paymob.timing.random.random', lambda: next(draws))
+
+        assert 'Server-Timing' in api_client.get(reverse('product-list'))
+        assert 'Server-Timing' not in api_client.get(reverse('product-list'))
+
+    def test_logs_a_structured_line(self, api_client, caplog):
+        catalog_state()
+        with caplog.at_level(logging.INFO, logger='paymob.timing'):
+            api_client.get(reverse('product-list'))
+
+        [record] = caplog.records
+        assert record.timing['path'] == reverse('product-list')
+        assert record.timing['status'] == 200
+        # The catalog version and the count: an empty catalog skips the page query.
+        assert record.timing['sql_count'] == 2
+        assert record.getMessage().startswith('method=GET path=/api/v1/task1/products/ status=200 ')
+
+
+def test_measure_outside_a_sampled_request_is_a_no_op():
+    assert current_timings() is None
+    with measure('serialize'):
+        pass
+    assert current_timings() is None
+
+
+def test_request_timings_header():
+    timings = RequestTimings()
+    timings.add('sql', 0.0015)
+    timings.sql_count = 3
+    timings.add('serialize', 0.0005)
+
+    assert timings.header(total_ms=4) == (
+        'sql;dur=1.50;desc="3 queries", serialize;dur=0.50, render;dur=0.00, total;dur=4.00'
+    )
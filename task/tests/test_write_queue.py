@@ -0,0 +1,208 @@
+import threading
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from paymob.routers import PIN_COOKIE
+from task import write_queue
+from task.models import UserProfile
+from task.serializers import UserListSerializer, UserSerializer
+from task.write_queue import QueueFull, WriteQueue, save_users
+
+User = get_user_model()
+
+BIO = 'A bio that is long enough to pass the fifty character validation rule.'
+
+
+def payload(username):
+    return {
+        'username': username,
+        'email': f'{username}@example.com',
+        'first_name': 'Queued',
+        'last_name': 'User',
+        'profile': {'website': 'https://example.com', 'bio': BIO},
+    }
+
+
+def validated(username):
+    serializer = UserSerializer(data=payload(username))
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+class BlockingFlush:
+    """Records batches; the first one waits for `release`."""
+
+    def __init__(self):
+        self.batches = []
+        self.flushing = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, items):
+        self.flushing.set()
+        self.release.wait(5)
+        self.batches.append(list(items))
+        return [{'status': 201, 'data': item} for item in items]
+
+
+@pytest.fixture
+def shared_queue(settings):
+    settings.TASK_WRITE_QUEUE_MAX_DELAY = 0
+    write_queue.shutdown()
+    yield write_queue.get_queue
+    write_queue.shutdown(timeout=5)
+
+
+class TestWriteQueue:
+
+    def test_coalesces_what_is_queued_while_a_batch_is_saved(self):
+        flush = BlockingFlush()
+        queue = WriteQueue(flush, batch_size=4, max_delay=0)
+        first = queue.submit('a')
+        assert flush.flushing.wait(5)
+        tickets = [queue.submit(item) for item in 'bcdefg']
+        flush.release.set()
+        queue.join()
+
+        assert flush.batches == [['a'], ['b', 'c', 'd', 'e'], ['f', 'g']]
+        assert first.wait(0) and first.result == {'status': 201, 'data': 'a'}
+        assert [ticket.status()['state'] for ticket in tickets] == ['created'] * 6
+        stats = queue.stats()
+        assert stats['batches'] == 3
+        assert stats['items'] == stats['created'] == 7
+        assert stats['largest_batch'] == 4
+        assert stats['depth'] == 0
+        queue.close(5)
+
+    def test_rejects_payloads_beyond_the_maximum_depth(self):
+        flush = BlockingFlush()
+        queue = WriteQueue(flush, max_delay=0, max_depth=2)
+        queue.submit('a')
+        assert flush.flushing.wait(5)
+        queue.submit('b')
+        queue.submit('c')
+        with pytest.raises(QueueFull):
+            queue.submit('d')
+
+        assert queue.stats()['rejected'] == 1
+        flush.release.set()
+        queue.close(5)
+        assert queue.stats()['created'] == 3
+
+    def test_a_failing_flush_fails_its_batch_and_keeps_the_thread(self):
+        calls = []
+
+        def flush(items):
+            calls.append(items)
+            if len(calls) == 1:
+                raise RuntimeError('database is locked')
+            return [{'status': 201, 'data': item} for item in items]
+
+        queue = WriteQueue(flush, max_delay=0)
+        failed = queue.submit('a')
+        queue.join()
+        saved = queue.submit('b')
+        queue.join()
+
+        assert failed.result['status'] == 503
+        assert failed.status()['state'] == 'failed'
+        assert saved.status() == {'ticket': saved.id, 'state': 'created', 'user': 'b'}
+        queue.close(5)
+
+
+@pytest.mark.django_db
+class TestSaveUsers:
+
+    def test_saves_a_batch_in_constant_queries(self, django_assert_max_num_queries):
+        items = [validated(f'queued{i}') for i in range(50)]
+        # Uniqueness check, users, profiles and the transaction's savepoint.
+        with django_assert_max_num_queries(6):
+            results = save_users(items)
+
+        assert [result['status'] for result in results] == [201] * 50
+        assert results[0]['data']['profile']['bio'] == BIO
+        assert UserProfile.objects.count() == 50
+
+    def test_rechecks_usernames_when_saving(self):
+        items = [validated('twice'), validated('twice'), validated('later')]
+        User.objects.create_user(username='later')
+
+        results = save_users(items)
+
+        assert [result['status'] for result in results] == [201, 400, 400]
+        assert 'username' in results[1]['errors']
+        assert User.objects.filter(username='twice').count() == 1
+
+    def test_a_conflict_fails_only_its_payload(self, monkeypatch):
+        # As if `taken` were created by another writer right after the recheck.
+        User.objects.create_user(username='taken')
+        monkeypatch.setattr(UserListSerializer, 'check_unique_usernames', lambda self, items: items)
+        items = [validated(f'queued{i}') for i in range(5)]
+        items.insert(3, {**items[0], 'username': 'taken'})
+
+        results = save_users(items)
+
+        assert [result['status'] for result in results] == [201, 201, 201, 409, 201, 201]
+        assert [result['index'] for result in results] == list(range(6))
+        assert User.objects.filter(username__startswith='queued').count() == 5
+
+
+@pytest.mark.django_db(transaction=True)
+class TestQueuedCreate:
+    """The writer thread commits on its own connection, outside the test's transaction."""
+
+    def test_async_answers_202_with_a_status_url(self, api_client, settings, shared_queue):
+        settings.TASK_USER_WRITE_MODE = 'async'
+        response = api_client.post(reverse('task:user-list'), payload('later'), format='json')
+
+        assert response.status_code == 202
+        assert response.data['state'] in ('queued', 'created')
+        assert response['Location'] == response.data['status_url']
+
+        shared_queue().join()
+        status = api_client.get(response['Location'])
+        assert status.status_code == 200
+        assert status.data['state'] == 'created'
+        assert status.data['user']['username'] == 'later'
+        assert User.objects.get(username='later').profile.bio == BIO
+
+    def test_sync_answers_once_the_user_is_saved(self, api_client, settings, shared_queue):
+        settings.TASK_USER_WRITE_MODE = 'sync'
+        response = api_client.post(reverse('task:user-list'), payload('waited'), format='json')
+
+        assert response.status_code == 201
+        assert response.data['id'] == User.objects.get(username='waited').pk
+        assert shared_queue().stats()['batches'] == 1
+
+    @pytest.mark.parametrize('mode', ['off', 'sync', 'async'])
+    def test_signups_pin_the_client_to_the_primary(self, api_client, settings, shared_queue, mode):
+        settings.TASK_USER_WRITE_MODE = mode
+        response = api_client.post(reverse('task:user-list'), payload(f'pinned_{mode}'), format='json')
+
+        assert response.status_code in (201, 202)
+        assert PIN_COOKIE in response.cookies
+        shared_queue().join()
+
+    def test_invalid_payloads_are_rejected_before_queueing(self, api_client, settings, shared_queue):
+        settings.TASK_USER_WRITE_MODE = 'async'
+        response = api_client.post(reverse('task:user-list'), {**payload('bad'), 'email': 'nope'}, format='json')
+
+        assert response.status_code == 400
+        assert shared_queue().stats()['items'] == 0
+
+    def test_a_full_queue_answers_503(self, api_client, settings, shared_queue, monkeypatch):
+        settings.TASK_USER_WRITE_MODE = 'async'
+
+        def full(item):
+            raise QueueFull()
+
+        monkeypatch.setattr(shared_queue(), 'submit', full)
+        response = api_client.post(reverse('task:user-list'), payload('full'), format='json')
+
+        assert response.status_code == 503
+        assert response['Retry-After'] == '1'
+        assert PIN_COOKIE not in response.cookies
+
+    def test_unknown_tickets_are_not_found(self, api_client):
+        response = api_client.get(reverse('task:user-queued', kwargs={'ticket': '0' * 32}))
+        assert response.status_code == 404
@@ -1,6 +1,7 @@
 import os
 import random
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 from django.utils.crypto import get_random_string
 from django.utils.translation import gettext_lazy as _
@@ -50,3 +51,69 @@ class CoreUtils:
                     **kwargs
                 )
 
+    @classmethod
+    def validate_many(cls, serializer_class: type, items, **kwargs):
+        """Validate `items` in one `many=True` pass and return their validated data."""
+        if not items:
+            return []
+        serializer = serializer_class(data=list(items), many=True, **kwargs)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    @classmethod
+    def changed_fields(cls, instance, data):
+        """The fields of `data` whose value differs from `instance`'s."""
+        changed = []
+        for name, value in data.items():
+            field = instance._meta.get_field(name)
+            if field.is_relation and field.concrete:
+                # Compare the ids, without fetching the current related object.
+                current, value = getattr(instance, field.attname), getattr(value, 'pk', value)
+            else:
+                current = getattr(instance, name)
+            if current != value:
+                changed.append(name)
+        return changed
+
+    @classmethod
+    def bulk_upsert(cls, serializer_class: type, instance_items, to_create, to_update, batch_size=None,
+                    **save_kwargs):
+        """
+        Save the output of `organize_create_update_data` in a constant number
+        of queries, however many items there are.
+
+        The items of `to_update` are validated in one partial `many=True`
+        pass and those of `to_create` in another. Updates are applied to the
+        matching `instance_items` with one `bulk_update` of the fields that
+        actually changed, creates with `bulk_create`; `save_kwargs` are set
+        on every created instance, like `serializer.save(**kwargs)`. Items of
+        `to_update` matching no instance are ignored, as in
+        `update_existing_items`. Model `save()` and signals are bypassed.
+
+        Returns the (created, updated) instances.
+        """
+        keys = list(to_update)
+        validated_updates = cls.validate_many(serializer_class, [to_update[key] for key in keys], partial=True)
+        validated_creates = cls.validate_many(serializer_class, to_create)
+        model = serializer_class.Meta.model
+
+        instances = {str(instance.pk): instance for instance in instance_items}
+        updated, fields = [], set()
+        for key, data in zip(keys, validated_updates):
+            instance = instances.get(key)
+            changed = cls.changed_fields(instance, data) if instance is not None else []
+            for name in changed:
+                setattr(instance, name, data[name])
+            if changed:
+                updated.append(instance)
+                fields.update(changed)
+        created = [model(**data, **save_kwargs) for data in validated_creates]
+        if not (updated or created):
+            return created, updated
+
+        with transaction.atomic():
+            if updated:
+                model.objects.bulk_update(updated, sorted(fields), batch_size=batch_size)
+            if created:
+                created = model.objects.bulk_create(created, batch_size=batch_size)
+        return created, updated
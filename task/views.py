@@ -1,14 +1,114 @@
+from django.conf import settings
 from django.shortcuts import render
 from django.contrib.auth.models import User
 from task.serializers import  UserSerializer ,UserProfileSerializer
 
-from rest_framework import viewsets
+from paymob.query_plan import QueryPlanMixin
+from paymob.routers import ReplicaReadMixin, pin_to_primary
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from . import bloom, write_queue
 from .models import UserProfile
 from .serializers import UserProfileSerializer
 
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(QueryPlanMixin, ReplicaReadMixin, viewsets.ModelViewSet):
+    # The profile join and the rendered columns come from QueryPlanMixin.
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
+    def create(self, request, *args, **kwargs):
+        """
+        Create a user, or queue it for the writer thread when
+        TASK_USER_WRITE_MODE is 'async' or 'sync' (see task/write_queue.py).
+        """
+        mode = write_queue.write_mode()
+        if mode == 'off':
+            return super().create(request, *args, **kwargs)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            ticket = write_queue.get_queue().submit(serializer.validated_data)
+        except write_queue.QueueFull:
+            return Response(
+                {'detail': 'Too many signups are waiting to be saved; retry shortly.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'},
+            )
+
+        timeout = getattr(settings, 'TASK_WRITE_QUEUE_SYNC_TIMEOUT', 2.0)
+        if mode == 'sync' and ticket.wait(timeout):
+            if ticket.result['status'] != status.HTTP_201_CREATED:
+                return Response(ticket.result['errors'], status=ticket.result['status'])
+            # Saved by the writer thread, which the router does not see.
+            pin_to_primary()
+            return Response(ticket.result['data'], status=status.HTTP_201_CREATED)
+
+        # Read-your-writes for a signup that may land after this response.
+        pin_to_primary()
+
+        url = reverse('task:user-queued', kwargs={'ticket': ticket.id}, request=request)
+        return Response(
+            {**ticket.status(), 'status_url': url}, status=status.HTTP_202_ACCEPTED, headers={'Location': url},
+        )
+
+    @action(detail=False, methods=['get'])
+    def availability(self, request):
+        """
+        Whether `?username=` and `?email=` are free, from the Bloom filter of
+        taken values (see task/bloom.py): values it does not contain are
+        free without a query, the others are confirmed with one. Without a
+        shared filter every value is queried.
+        """
+        values = {field: request.query_params[field] for field in bloom.FIELDS if request.query_params.get(field)}
+        if not values:
+            return Response(
+                {'detail': 'Give a username, an email or both.'}, status=status.HTTP_400_BAD_REQUEST,
+            )
+        availability = bloom.check_availability(values)
+        return Response({
+            field: {'value': value, 'available': availability[field]} for field, value in values.items()
+        })
+
+    @action(detail=False, methods=['get'], url_path=r'queued/(?P<ticket>[0-9a-f]{32})')
+    def queued(self, request, ticket):
+        """
+        The status of a user queued by `create`: 'queued', 'created' with
+        the user, or 'failed' with the errors. 404 once it has expired.
+        """
+        record = write_queue.get_status(ticket)
+        if record is None:
+            return Response({'detail': 'Unknown or expired ticket.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(record)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create many users with their profiles from a list of `create`
+        payloads (at most `TASK_BULK_CREATE_MAX_ITEMS`).
+
+        Users and profiles are inserted with batched `bulk_create` in one
+        transaction. Every item gets a result in payload order, the created
+        user or its validation errors: the response is 201 when all items
+        were created, 207 when only some were and 400 when none was.
+        """
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        if serializer.validated_data:
+            serializer.save()
+        results = serializer.results()
+
+        created = len(serializer.valid_indexes)
+        if not serializer.item_errors:
+            response_status = status.HTTP_201_CREATED
+        elif created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response(
+            {'created': created, 'failed': len(serializer.item_errors), 'results': results},
+            status=response_status,
+        )
@@ -0,0 +1,305 @@
+"""
+Write-coalescing queue for user creation.
+
+With TASK_USER_WRITE_MODE = 'async' or 'sync', `POST /users/` validates the
+payload in the request as usual, then hands it to an in-process queue
+instead of saving it. One writer thread per process takes whatever is
+queued, up to TASK_WRITE_QUEUE_BATCH_SIZE payloads, waiting at most
+TASK_WRITE_QUEUE_MAX_DELAY seconds for more, and saves them with the batched
+`bulk_create` of the bulk endpoint: one transaction for many signups, rather
+than one per request competing for SQLite's write lock (group commit).
+
+- 'async' answers 202 at once, with the URL of the item's status.
+- 'sync' waits for the batch to commit and answers like 'off' would, 201 or
+  400, unless it takes longer than TASK_WRITE_QUEUE_SYNC_TIMEOUT seconds:
+  then it answers 202 as well, so latency stays bounded.
+- 'off' (the default) saves in the request.
+
+Usernames are checked again when the batch is saved, so two queued signups
+for the same username cannot both succeed. When TASK_WRITE_QUEUE_MAX_DEPTH
+payloads are waiting, new ones get a 503 with Retry-After.
+
+Statuses are kept in the TASK_WRITE_QUEUE_CACHE_ALIAS cache for
+TASK_WRITE_QUEUE_STATUS_TIMEOUT seconds; with several worker processes it
+must be a cache they share. Payloads still queued when a process exits are
+saved on exit, but lost if it is killed: 'async' trades that durability for
+latency.
+
+Depth, batch sizes, flush durations and items by result are exported as
+Prometheus metrics (`user_write_queue_*`), and `get_queue().stats()` gives
+the same figures for the current process.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections
+from paymob.metrics import Counter, Gauge, Histogram
+from rest_framework import serializers, status
+from task.serializers import UserSerializer
+
+logger = logging.getLogger(__name__)
+
+MODES = ('off', 'async', 'sync')
+STATUS_KEY_PREFIX = 'task:write-queue'
+QUEUED, CREATED, FAILED = 'queued', 'created', 'failed'
+
+QUEUE_DEPTH = Gauge('user_write_queue_depth', 'User payloads waiting for the writer thread.')
+QUEUE_ITEMS = Counter(
+    'user_write_queue_items_total', 'User payloads by result: created, failed or rejected (queue full).',
+    ('result',),
+)
+BATCH_SIZE = Histogram(
+    'user_write_queue_batch_size', 'User payloads saved per transaction.',
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+FLUSH_DURATION = Histogram('user_write_queue_flush_seconds', 'Time to save one batch of user payloads.')
+
+
+class QueueFull(Exception):
+    pass
+
+
+def write_mode():
+    mode = getattr(settings, 'TASK_USER_WRITE_MODE', 'off')
+    if mode not in MODES:
+        raise ValueError(f'TASK_USER_WRITE_MODE must be one of {", ".join(MODES)}, not {mode!r}.')
+    return mode
+
+
+def get_status_cache():
+    return caches[getattr(settings, 'TASK_WRITE_QUEUE_CACHE_ALIAS', 'default')]
+
+
+def status_key(ticket_id):
+    return f'{STATUS_KEY_PREFIX}:{ticket_id}'
+
+
+def get_status(ticket_id):
+    """The status of a queued payload, or None when unknown or expired."""
+    return get_status_cache().get(status_key(ticket_id))
+
+
+def save_users(items):
+    """
+    Save validated `UserSerializer` payloads in one transaction and return
+    one result per item, as the bulk endpoint does: `status` 201 with the
+    user's `data`, or an error status with `errors`.
+
+    A username taken by a writer outside the queue after the recheck fails
+    the whole transaction; the batch is then saved again in halves, so only
+    the conflicting payloads fail.
+    """
+    serializer = UserSerializer(many=True)
+    serializer.use_validated_data(items)
+    try:
+        if serializer.validated_data:
+            serializer.save()
+    except serializers.ValidationError as exc:
+        if len(items) == 1:
+            return [{'index': 0, 'status': status.HTTP_409_CONFLICT, 'errors': exc.detail}]
+        middle = len(items) // 2
+        second = [{**result, 'index': result['index'] + middle} for result in save_users(items[middle:])]
+        return save_users(items[:middle]) + second
+    return serializer.results()
+
+
+class Ticket:
+    """A queued payload; `wait()` until it has a `result`."""
+
+    def __init__(self, item):
+        self.id = uuid.uuid4().hex
+        self.item = item
+        self.result = None
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def resolve(self, result):
+        self.result = result
+        self._done.set()
+
+    def status(self):
+        if self.result is None:
+            return {'ticket': self.id, 'state': QUEUED}
+        if self.result['status'] == status.HTTP_201_CREATED:
+            return {'ticket': self.id, 'state': CREATED, 'user': self.result['data']}
+        return {'ticket': self.id, 'state': FAILED, 'errors': self.result['errors']}
+
+
+class WriteQueue:
+    """
+    Payloads saved by one writer thread, `batch_size` at a time.
+
+    `flush(items)` saves a batch and returns one result per item; it runs on
+    the writer thread only. The thread starts with the first `submit()`.
+    """
+
+    def __init__(self, flush=save_users, batch_size=500, max_delay=0.002, max_depth=10000):
+        self.flush = flush
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_depth = max_depth
+        self._queue = queue.Queue(maxsize=max_depth)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self._stats = {
+            'batches': 0, 'created': 0, 'failed': 0, 'rejected': 0, 'largest_batch': 0, 'flush_seconds': 0.0,
+        }
+        self._started = time.monotonic()
+
+    def submit(self, item):
+        """Queue `item` and return its Ticket; raise QueueFull when `max_depth` are waiting."""
+        ticket = Ticket(item)
+        self._start()
+        get_status_cache().set(status_key(ticket.id), ticket.status(), self.status_timeout())
+        QUEUE_DEPTH.inc()
+        try:
+            self._queue.put_nowait(ticket)
+        except queue.Full:
+            QUEUE_DEPTH.dec()
+            get_status_cache().delete(status_key(ticket.id))
+            self._count('rejected')
+            raise QueueFull(f'{self.max_depth} user payloads are already waiting.') from None
+        return ticket
+
+    @staticmethod
+    def status_timeout():
+        return getattr(settings, 'TASK_WRITE_QUEUE_STATUS_TIMEOUT', 3600)
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None and not self._stopping:
+                self._thread = threading.Thread(target=self._run, name='user-write-queue', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            ticket = self._queue.get()
+            if ticket is None:
+                self._queue.task_done()
+                return
+            batch = [ticket]
+            deadline = time.monotonic() + self.max_delay
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    ticket = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if ticket is None:
+                    stop = True
+                    break
+                batch.append(ticket)
+            self._save(batch)
+            if stop:
+                self._queue.task_done()
+                return
+
+    def _save(self, batch):
+        started = time.perf_counter()
+        # The thread keeps its connection between batches; drop it if broken.
+        close_old_connections()
+        try:
+            results = self.flush([ticket.item for ticket in batch])
+        except Exception:
+            logger.exception('Saving %d queued user payloads failed.', len(batch))
+            error = {'non_field_errors': ['The user could not be saved; retry the request.']}
+            results = [{'status': status.HTTP_503_SERVICE_UNAVAILABLE, 'errors': error} for _ in batch]
+        elapsed = time.perf_counter() - started
+
+        for ticket, result in zip(batch, results):
+            ticket.resolve(result)
+        try:
+            get_status_cache().set_many(
+                {status_key(ticket.id): ticket.status() for ticket in batch}, self.status_timeout(),
+            )
+        except Exception:
+            logger.exception('Storing the status of %d queued user payloads failed.', len(batch))
+
+        created = sum(result['status'] == status.HTTP_201_CREATED for result in results)
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], len(batch))
+            self._stats['flush_seconds'] += elapsed
+        self._count('created', created)
+        self._count('failed', len(batch) - created)
+        QUEUE_DEPTH.dec(len(batch))
+        BATCH_SIZE.observe(len(batch))
+        FLUSH_DURATION.observe(elapsed)
+        for _ in batch:
+            self._queue.task_done()
+
+    def _count(self, result, amount=1):
+        if amount:
+            with self._lock:
+                self._stats[result] += amount
+            QUEUE_ITEMS.inc(amount, result=result)
+
+    def join(self):
+        """Block until every payload queued so far has been saved."""
+        self._queue.join()
+
+    def close(self, timeout=None):
+        """Save what is queued, then stop the writer thread."""
+        with self._lock:
+            self._stopping = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        saved = stats['created'] + stats['failed']
+        stats.update(
+            depth=self._queue.qsize(),
+            max_depth=self.max_depth,
+            items=saved,
+            mean_batch_size=saved / stats['batches'] if stats['batches'] else 0,
+            items_per_second=saved / (time.monotonic() - self._started),
+        )
+        return stats
+
+
+_queue = None
+_queue_pid = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    """The WriteQueue of this process, configured from the settings when first used."""
+    global _queue, _queue_pid
+    # A forked worker gets its own queue: the parent's writer thread is not copied.
+    if _queue is None or _queue_pid != os.getpid():
+        with _queue_lock:
+            if _queue is None or _queue_pid != os.getpid():
+                _queue = WriteQueue(
+                    batch_size=getattr(settings, 'TASK_WRITE_QUEUE_BATCH_SIZE', 500),
+                    max_delay=getattr(settings, 'TASK_WRITE_QUEUE_MAX_DELAY', 0.002),
+                    max_depth=getattr(settings, 'TASK_WRITE_QUEUE_MAX_DEPTH', 10000),
+                )
+                _queue_pid = os.getpid()
+    return _queue
+
+
+@atexit.register
+def shutdown(timeout=None):
+    """Save what is queued and stop the writer thread; the next `get_queue()` starts afresh."""
+    global _queue
+    with _queue_lock:
+        write_queue, _queue = _queue, None
+    if write_queue is not None and _queue_pid == os.getpid():
+        write_queue.close(timeout)
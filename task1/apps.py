@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class Task1Config(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'task1'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import signals  # noqa: F401
+        from .search import create_search_index_after_migrate
+
+        # task1 ships no migrations, so the FTS5 table is created here.
+        post_migrate.connect(create_search_index_after_migrate, sender=self)
@@ -0,0 +1,96 @@
+"""
+Async-native versions of the product read endpoints.
+
+These are plain Django async views rather than DRF viewsets, so under ASGI
+a request waiting on the database does not hold a thread-pool slot for
+the whole request: rows are read with the async ORM (`acount`, `aget`,
+async iteration) and the page and the count are awaited together. The
+response bodies are the same as the ones of `ProductViewSet`.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.shortcuts import aget_object_or_404
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.renderers import JSONRenderer
+
+from paymob.timing import measure
+
+from .filters import ProductFilterBackend, get_top_n
+from .models import Product
+from .pagination import AsyncDefaultPagination
+from .serializers import ProductRowFormatter, ProductSerializer
+
+row_formatter = ProductRowFormatter()
+
+
+def json_response(data, status=200):
+    with measure('render'):
+        content = JSONRenderer().render(data)
+    return HttpResponse(content, status=status, content_type='application/json')
+
+
+def async_api_view(view):
+    """
+    Allow only GET/HEAD and turn DRF exceptions and Http404 into the same
+    JSON error responses the DRF views return.
+    """
+    @require_safe
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except Http404 as exc:
+            error = NotFound(*exc.args)
+        except APIException as exc:
+            error = exc
+        detail = error.detail if isinstance(error.detail, (list, dict)) else {'detail': error.detail}
+        return json_response(detail, status=error.status_code)
+
+    return wrapper
+
+
+async def paginated_rows(request, queryset):
+    """Paginate `queryset` through the values_list() fast path."""
+    paginator = AsyncDefaultPagination()
+    page = await paginator.apaginate_queryset(row_formatter.values_list(queryset), request)
+    return json_response(paginator.get_paginated_data(row_formatter.format(page)))
+
+
+@async_api_view
+async def product_list(request):
+    filters = ProductFilterBackend().get_filters(request)
+    products = Product.objects.select_related('category').filter(**filters).order_by('id')
+    return await paginated_rows(request, products)
+
+
+@async_api_view
+async def product_detail(request, pk):
+    product = await aget_object_or_404(Product.objects.select_related('category'), pk=pk)
+    return json_response(ProductSerializer(product).data)
+
+
+@async_api_view
+async def top_most_expensive_by_category(request):
+    filters = ProductFilterBackend().get_filters(request)
+    # Picking the top-N plan may read the category totals.
+    top = await sync_to_async(Product.objects.top_per_category)(n=get_top_n(request), **filters)
+    products = top.select_related('category')
+    return await paginated_rows(request, products)
+
+
+@async_api_view
+async def top_10_most_expensive(request):
+    filters = ProductFilterBackend().get_filters(request)
+    top = await sync_to_async(Product.objects.top_per_category)(n=get_top_n(request), **filters)
+    products = top.select_related('category').order_by('category_id', '-price', 'id')
+    return await paginated_rows(request, products)
+
+
+@async_api_view
+async def products_with_category_counts(request):
+    filters = ProductFilterBackend().get_filters(request)
+    products = Product.objects.select_related('category').filter(**filters)
+    return await paginated_rows(request, products)
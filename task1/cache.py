@@ -0,0 +1,126 @@
+"""
+Versioned response cache for the product catalog endpoints.
+
+Every cached response is stored under the current catalog version, a
+counter that any Product or Category write bumps, so a write invalidates
+all cached pages at once without having to find them. The same version
+feeds the ETag, which lets clients revalidate with a 304 and no body.
+
+The version is the `CatalogVersion` row, bumped on the primary in the
+write's own transaction: every worker process and management command
+shares it whatever the cache backend, and it becomes visible together
+with the rows it versions. It is read from the database the request
+reads its rows from, so a read replica that is behind serves and caches
+its rows under the version they belong to, never under a newer one.
+Reading it costs one primary-key lookup per request.
+"""
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from paymob.metrics import CACHE_REQUESTS
+from rest_framework.response import Response
+
+RESPONSE_KEY_PREFIX = 'task1:response'
+
+
+def get_cache():
+    return caches[getattr(settings, 'TASK1_RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def get_cache_timeout():
+    return getattr(settings, 'TASK1_RESPONSE_CACHE_TIMEOUT', 300)
+
+
+def catalog_state():
+    """
+    Return the (version, last-modified timestamp) of the catalog, as seen by
+    the database the current request reads from (see paymob/routers.py).
+    """
+    from .models import CatalogVersion
+
+    state = (
+        CatalogVersion.objects.filter(pk=CatalogVersion.SINGLETON_ID)
+        .values_list('version', 'modified').first()
+    )
+    if state is None:
+        versions = CatalogVersion.objects.using(DEFAULT_DB_ALIAS)
+        # Start from the clock rather than 1, so a version never comes back
+        # and matches responses cached before the row was (re)created.
+        now = time.time_ns()
+        row, _ = versions.get_or_create(
+            pk=CatalogVersion.SINGLETON_ID, defaults={'version': now, 'modified': now // 10 ** 9},
+        )
+        state = (row.version, row.modified)
+    return state
+
+
+def invalidate_catalog():
+    """
+    Bump the catalog version. Call it after the write, or in its
+    transaction: readers then never see the new rows under the old version.
+    """
+    from .models import CatalogVersion
+
+    bumped = CatalogVersion.objects.using(DEFAULT_DB_ALIAS).filter(pk=CatalogVersion.SINGLETON_ID).update(
+        version=F('version') + 1, modified=int(time.time()),
+    )
+    if not bumped:
+        catalog_state()
+
+
+def response_cache_key(request):
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    url = request.build_absolute_uri(request.path)
+    digest = hashlib.md5(f'{url}?{query}'.encode()).hexdigest()
+    return f'{RESPONSE_KEY_PREFIX}:{digest}'
+
+
+def cache_catalog_response(view_method):
+    """
+    Cache the data of a successful catalog response per URL and catalog
+    version, emit ETag/Last-Modified and answer conditional GETs with 304.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        version, modified = catalog_state()
+        key = response_cache_key(request)
+        etag = '"%s"' % hashlib.md5(
+            f'{key}:{version}:{request.accepted_renderer.format}'.encode()
+        ).hexdigest()
+
+        validators = HttpResponse()
+        validators['ETag'] = etag
+        validators['Last-Modified'] = http_date(modified)
+        patch_vary_headers(validators, ['Accept'])
+        conditional = get_conditional_response(
+            request, etag=etag, last_modified=modified, response=validators
+        )
+        if conditional is not validators:
+            CACHE_REQUESTS.inc(cache='task1_response', result='not_modified')
+            return conditional
+
+        cache = get_cache()
+        data = cache.get(key, version=version)
+        CACHE_REQUESTS.inc(cache='task1_response', result='miss' if data is None else 'hit')
+        if data is None:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            cache.set(key, response.data, get_cache_timeout(), version=version)
+        else:
+            response = Response(data)
+
+        for header in ('ETag', 'Last-Modified', 'Vary'):
+            response[header] = validators[header]
+        return response
+
+    return wrapper
@@ -0,0 +1,97 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+from .search import match_expression
+
+
+class ProductFilterSerializer(serializers.Serializer):
+    """Validates the product filter query parameters."""
+    category = serializers.IntegerField(required=False, min_value=1)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        min_price, max_price = attrs.get('min_price'), attrs.get('max_price')
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise serializers.ValidationError({'min_price': 'Must not be greater than max_price.'})
+        after, before = attrs.get('created_after'), attrs.get('created_before')
+        if after is not None and before is not None and after > before:
+            raise serializers.ValidationError({'created_after': 'Must not be later than created_before.'})
+        return attrs
+
+
+class TopNSerializer(serializers.Serializer):
+    """Validates `n`, the number of products per category of the top-N endpoints."""
+    n = serializers.IntegerField(required=False, min_value=1)
+
+    def validate_n(self, value):
+        maximum = getattr(settings, 'TASK1_TOP_N_MAX', 100)
+        if value > maximum:
+            raise serializers.ValidationError(f'Ensure this value is less than or equal to {maximum}.')
+        return value
+
+
+class ProductSearchSerializer(serializers.Serializer):
+    """Validates `q` and turns it into an FTS5 match expression."""
+    q = serializers.CharField(max_length=200)
+
+    def validate_q(self, value):
+        expression = match_expression(value)
+        if expression is None:
+            raise serializers.ValidationError('Enter at least one word to search for.')
+        return expression
+
+
+def get_top_n(request):
+    """The validated `n` query parameter, None when absent."""
+    serializer = TopNSerializer(data=getattr(request, 'query_params', request.GET))
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data.get('n')
+
+
+class ProductFilterBackend(BaseFilterBackend):
+    """
+    Filters products by `category` id, a `min_price`/`max_price` range and a
+    `created_after`/`created_before` range (both bounds inclusive).
+
+    Invalid values are rejected with a 400 instead of being ignored, so a
+    typo never silently returns the whole catalog.
+    """
+    lookups = {
+        'category': 'category_id',
+        'min_price': 'price__gte',
+        'max_price': 'price__lte',
+        'created_after': 'created_at__gte',
+        'created_before': 'created_at__lte',
+    }
+    # Without statistics SQLite estimates a one-sided range as barely
+    # selective and prefers scanning the table in ORDER BY order over
+    # searching the range's index, so open ranges are closed with the
+    # extremes of the column.
+    range_limits = [
+        ('price__gte', 'price__lte', Decimal('-99999999.99'), Decimal('99999999.99')),
+        ('created_at__gte', 'created_at__lte',
+         datetime.min.replace(tzinfo=timezone.utc), datetime.max.replace(tzinfo=timezone.utc)),
+    ]
+
+    def get_filters(self, request):
+        # Plain Django requests (the async views) have no query_params.
+        query = getattr(request, 'query_params', request.GET)
+        serializer = ProductFilterSerializer(data=query)
+        serializer.is_valid(raise_exception=True)
+        filters = {self.lookups[name]: value for name, value in serializer.validated_data.items()}
+        for lower, upper, minimum, maximum in self.range_limits:
+            if lower in filters or upper in filters:
+                filters.setdefault(lower, minimum)
+                filters.setdefault(upper, maximum)
+        return filters
+
+    def filter_queryset(self, request, queryset, view):
+        filters = self.get_filters(request)
+        return queryset.filter(**filters) if filters else queryset
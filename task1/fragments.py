@@ -0,0 +1,183 @@
+"""
+Pre-encoded JSON fragments of product rows.
+
+A catalog page is mostly the same products rendered again and again. The
+fragment cache keeps the JSON bytes of each rendered row, so a page is
+assembled by joining cached fragments instead of formatting and encoding
+every row (see `FragmentJSONRenderer`).
+
+A fragment is stored under the product's primary key, the rendered fields
+and the active timezone, together with the row it was encoded from: the
+row is the fragment's version. A lookup only hits when the row just read
+from the database is equal to the stored one, so a renamed product or
+category, a moved product or a new category count is re-encoded even when
+the write happened in another process. Product and Category saves and
+deletes also evict their fragments from this process right away (see
+task1/signals.py), freeing their memory.
+
+Every process has its own cache, bounded by TASK1_FRAGMENT_CACHE_BYTES
+(approximately: fragment bytes plus a fixed overhead per entry); the least
+recently used fragments are evicted first. 0 disables it.
+"""
+import json
+import threading
+from collections import OrderedDict, defaultdict
+from collections.abc import Sequence
+
+from django.conf import settings
+from paymob.metrics import CACHE_REQUESTS
+
+# Rough cost of an entry besides its bytes: key, stored row and links.
+ENTRY_OVERHEAD = 256
+
+# Same encoding options as rest_framework's JSONRenderer.
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), allow_nan=False).encode
+
+
+def encode_json(data):
+    # JSONRenderer escapes the two separators that are invalid in JavaScript.
+    return _encode(data).replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode('utf-8')
+
+
+class EncodedRows(Sequence):
+    """
+    Rows as JSON fragments: renders as their concatenation, and reads like
+    a list of dicts, decoding a row only when it is accessed.
+    """
+
+    def __init__(self, fragments):
+        self.fragments = fragments
+
+    def __len__(self):
+        return len(self.fragments)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [json.loads(fragment) for fragment in self.fragments[index]]
+        return json.loads(self.fragments[index])
+
+    def __eq__(self, other):
+        if isinstance(other, EncodedRows):
+            return self.fragments == other.fragments
+        return isinstance(other, (list, tuple)) and list(self) == list(other)
+
+    def __repr__(self):
+        return f'EncodedRows({list(self)!r})'
+
+    def render(self):
+        return b'[' + b','.join(self.fragments) + b']'
+
+
+class FragmentCache:
+    """
+    An LRU of (row, fragment) by key, bounded by `max_bytes`, indexed by
+    the product and category ids of its entries so evicting them on a
+    write costs only the entries removed.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        # ('product' | 'category', id) -> keys of the entries holding it.
+        self._tagged = defaultdict(set)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def tags(key, row):
+        """The ids an entry is evicted by: its product's and its category's."""
+        return (('product', key[-1]), ('category', getattr(row, 'category_id', None)))
+
+    def get_many(self, keyed_rows):
+        """The fragments of the (key, row) pairs whose stored row is `row`, None for the others."""
+        fragments = []
+        with self._lock:
+            for key, row in keyed_rows:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == row:
+                    self._entries.move_to_end(key)
+                    fragments.append(entry[1])
+                else:
+                    fragments.append(None)
+            hits = sum(fragment is not None for fragment in fragments)
+            self.stats['hits'] += hits
+            self.stats['misses'] += len(fragments) - hits
+        if hits:
+            CACHE_REQUESTS.inc(hits, cache='task1_fragment', result='hit')
+        if len(fragments) - hits:
+            CACHE_REQUESTS.inc(len(fragments) - hits, cache='task1_fragment', result='miss')
+        return fragments
+
+    def set_many(self, entries):
+        """Store (key, row, fragment) entries, evicting the least recently used over the budget."""
+        with self._lock:
+            for key, row, fragment in entries:
+                cost = len(fragment) + ENTRY_OVERHEAD
+                if cost > self.max_bytes:
+                    continue
+                self._pop(key)
+                self._entries[key] = (row, fragment)
+                for tag in self.tags(key, row):
+                    self._tagged[tag].add(key)
+                self.size += cost
+            while self.size > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        row, fragment = entry
+        self.size -= len(fragment) + ENTRY_OVERHEAD
+        for tag in self.tags(key, row):
+            keys = self._tagged[tag]
+            keys.discard(key)
+            if not keys:
+                del self._tagged[tag]
+
+    def discard(self, tags):
+        """Evict the entries holding any of these ('product' | 'category', id) tags."""
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tagged.get(tag, ())):
+                    self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tagged.clear()
+            self.size = 0
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_fragment_cache():
+    """The fragment cache of this process, or None when TASK1_FRAGMENT_CACHE_BYTES is 0."""
+    global _cache
+    max_bytes = getattr(settings, 'TASK1_FRAGMENT_CACHE_BYTES', 32 * 1024 * 1024)
+    if not max_bytes:
+        return None
+    if _cache is None or _cache.max_bytes != max_bytes:
+        with _cache_lock:
+            if _cache is None or _cache.max_bytes != max_bytes:
+                _cache = FragmentCache(max_bytes)
+    return _cache
+
+
+def discard_products(product_ids):
+    """Evict the fragments of these products."""
+    if _cache is not None:
+        _cache.discard(('product', product_id) for product_id in product_ids)
+
+
+def discard_categories(category_ids):
+    """Evict the fragments of the products of these categories."""
+    if _cache is not None:
+        _cache.discard(('category', category_id) for category_id in category_ids)
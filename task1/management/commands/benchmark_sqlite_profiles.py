@@ -0,0 +1,131 @@
+import random
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+from django.db.models import QuerySet
+from paymob.sqlite import SQLITE_PROFILES, sqlite_options
+from task1.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = ('Compares read and write throughput of the SQLite PRAGMA profiles under concurrent '
+            'readers and writers, with persistent and per-request connections')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', choices=sorted(SQLITE_PROFILES),
+                            default=['default', 'tuned'])
+        parser.add_argument('--products', type=int, default=20000,
+                            help='Rows in the benchmark catalog (default: 20000)')
+        parser.add_argument('--readers', type=int, default=4, help='Reader threads (default: 4)')
+        parser.add_argument('--writers', type=int, default=2, help='Writer threads (default: 2)')
+        parser.add_argument('--seconds', type=float, default=3,
+                            help='Duration of every run (default: 3)')
+
+    def handle(self, *args, **options):
+        if options['products'] < 1 or options['readers'] < 0 or options['writers'] < 0:
+            raise CommandError('--products must be positive, --readers and --writers not negative.')
+
+        self.stdout.write(
+            f"{options['readers']} readers, {options['writers']} writers, "
+            f"{options['products']} products, {options['seconds']:g}s per run"
+        )
+        self.stdout.write(f"{'profile':<10} {'connections':<12} {'reads/s':>9} {'writes/s':>9} {'locked':>7}")
+        with tempfile.TemporaryDirectory() as directory:
+            for profile in options['profiles']:
+                alias = self.create_database(profile, Path(directory) / f'{profile}.sqlite3', options)
+                try:
+                    for persistent in (True, False):
+                        reads, writes, locked = self.run(alias, persistent, options)
+                        self.stdout.write(
+                            f"{profile:<10} {'persistent' if persistent else 'per request':<12} "
+                            f"{reads:>9,.0f} {writes:>9,.0f} {locked:>7}"
+                        )
+                finally:
+                    connections[alias].close()
+                    del connections[alias]
+                    del connections.settings[alias]
+
+    def create_database(self, profile, path, options):
+        """Register a database alias on a new file using `profile` and fill it."""
+        alias = f'benchmark_{profile}'
+        connections.settings[alias] = {
+            **connections['default'].settings_dict,
+            'NAME': str(path),
+            'OPTIONS': sqlite_options(profile),
+        }
+        with connections[alias].schema_editor() as editor:
+            editor.create_model(Category)
+            editor.create_model(Product)
+        # Plain QuerySets: the read models live in the default database.
+        category = QuerySet(model=Category, using=alias).create(name='Benchmark')
+        rng = random.Random(0)
+        QuerySet(model=Product, using=alias).bulk_create(
+            (
+                Product(
+                    name=f'Product {i}',
+                    category_id=category.pk,
+                    price=Decimal(rng.randrange(100, 999999)) / 100,
+                )
+                for i in range(options['products'])
+            ),
+            batch_size=5000,
+        )
+        return alias
+
+    def run(self, alias, persistent, options):
+        deadline = time.perf_counter() + options['seconds']
+        counts = {'reads': 0, 'writes': 0, 'locked': 0}
+        lock = threading.Lock()
+
+        def worker(operation, counter, seed):
+            rng = random.Random(seed)
+            done = locked = 0
+            try:
+                while time.perf_counter() < deadline:
+                    try:
+                        operation(rng)
+                        done += 1
+                    except OperationalError:
+                        locked += 1
+                    if not persistent:
+                        connections[alias].close()
+            finally:
+                connections[alias].close()
+                with lock:
+                    counts[counter] += done
+                    counts['locked'] += locked
+
+        def read(rng):
+            # A list page deep in the catalog, like the Locust product users.
+            offset = rng.randrange(options['products'])
+            list(
+                QuerySet(model=Product, using=alias).order_by('-price', 'id')
+                .values_list('id', 'name', 'price')[offset:offset + 10]
+            )
+
+        def write(rng):
+            with transaction.atomic(using=alias):
+                products = QuerySet(model=Product, using=alias)
+                products.filter(pk=rng.randrange(1, options['products'] + 1)).update(
+                    price=Decimal(rng.randrange(100, 999999)) / 100
+                )
+
+        threads = [
+            threading.Thread(target=worker, args=(read, 'reads', i)) for i in range(options['readers'])
+        ] + [
+            threading.Thread(target=worker, args=(write, 'writes', -i - 1)) for i in range(options['writers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return (
+            counts['reads'] / options['seconds'],
+            counts['writes'] / options['seconds'],
+            counts['locked'],
+        )
@@ -0,0 +1,76 @@
+import io
+import statistics
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from task1.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = ('Times the window and per-category top-N strategies over catalogs with a growing '
+            'number of categories and reports where one overtakes the other')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000,
+                            help='Products in every generated catalog (default: 100000)')
+        parser.add_argument('--categories', type=int, nargs='+',
+                            default=[10, 100, 1000, 2500, 5000, 10000],
+                            help='Category counts to benchmark (default: 10 100 1000 2500 5000 10000)')
+        parser.add_argument('--n', type=int, default=10,
+                            help='Products per category (default: 10)')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Timed runs per strategy, the median is reported (default: 5)')
+
+    def handle(self, *args, **options):
+        if options['n'] < 1 or options['repeat'] < 1:
+            raise CommandError('--n and --repeat must be positive.')
+        if Category.objects.exists() or Product.objects.exists():
+            # Generating catalogs over real data would fire the delete and
+            # save signals of every row and hold the write lock meanwhile.
+            raise CommandError(
+                'The database already holds a catalog; run this against an empty one, '
+                'e.g. SQLITE_PATH=/tmp/top_n.sqlite3 after migrate --run-syncdb.'
+            )
+
+        self.stdout.write(f"{options['products']} products, n={options['n']}")
+        self.stdout.write(f"{'categories':>10} {'window ms':>10} {'per-cat ms':>10}  {'faster':<12} {'auto picks':<12}")
+        crossover = None
+        for categories in sorted(options['categories']):
+            window, per_category, chosen = self.measure(categories, options)
+            faster = 'per_category' if per_category < window else 'window'
+            if faster == 'window' and crossover is None:
+                crossover = categories
+            self.stdout.write(
+                f'{categories:>10} {window * 1000:>10.2f} {per_category * 1000:>10.2f}  {faster:<12} {chosen:<12}'
+            )
+
+        if crossover is None:
+            self.stdout.write(self.style.SUCCESS('per_category was faster at every size'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"window is faster from about {crossover} categories "
+                f"({options['products'] // crossover} products per category)"
+            ))
+
+    def measure(self, categories, options):
+        """Time both strategies on a generated catalog that is rolled back afterwards."""
+        with transaction.atomic():
+            call_command('generate_data', categories=categories, products=options['products'],
+                         stdout=io.StringIO())
+            timings = [
+                self.median_seconds(strategy, options) for strategy in ('window', 'per_category')
+            ]
+            chosen = Product.objects.all().top_n_strategy(options['n'], {})
+            transaction.set_rollback(True)
+        return (*timings, chosen)
+
+    def median_seconds(self, strategy, options):
+        queryset = Product.objects.top_per_category(n=options['n'], strategy=strategy).values_list('pk')
+        timings = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            list(queryset.all())
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
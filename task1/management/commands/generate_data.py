@@ -1,13 +1,153 @@
-from django.core.management.base import BaseCommand
-from task1.factories import CategoryFactory, ProductFactory
+import math
+import multiprocessing
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.models import Max, QuerySet
+from task1.cache import invalidate_catalog
+from task1.models import Category, Product, TopProduct
+
+PRICE_DISTRIBUTIONS = ('uniform', 'lognormal', 'pareto')
+
+
+def price_sampler(rng, distribution, min_price, max_price):
+    """Return a zero-argument callable drawing prices in [min_price, max_price]."""
+    if distribution == 'uniform':
+        draw = lambda: rng.uniform(min_price, max_price)
+    elif distribution == 'lognormal':
+        # Centred on the geometric midpoint, ~99.7% of draws inside the range.
+        mu = math.log(math.sqrt(min_price * max_price))
+        sigma = math.log(max_price / min_price) / 6
+        draw = lambda: rng.lognormvariate(mu, sigma)
+    else:
+        # alpha=1.16 gives the classic 80/20 split: few expensive products.
+        draw = lambda: min_price * rng.paretovariate(1.16)
+    return lambda: Decimal('%.2f' % min(max(draw(), min_price), max_price))
+
+
+def tune_connection_for_bulk_load():
+    """
+    Skip the fsync on every commit and wait for the write lock instead of
+    failing when several workers insert at once. A crashed load is simply
+    rerun, so durability is not worth its cost here. SQLite only allows it
+    outside a transaction.
+    """
+    if connection.vendor == 'sqlite' and not connection.in_atomic_block:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous = OFF')
+            cursor.execute('PRAGMA busy_timeout = 600000')
+
+
+def insert_products(first_id, first_ordinal, count, category_ids, options):
+    """
+    Insert `count` products with ids first_id.. in bulk_create batches.
+
+    Every batch is seeded from (seed, ordinal of its first row), so the
+    generated rows do not depend on how the range is split across workers.
+    """
+    batch_size = options['batch_size']
+    inserted = 0
+    while inserted < count:
+        size = min(batch_size, count - inserted)
+        ordinal = first_ordinal + inserted
+        rng = random.Random(f"{options['seed']}:{ordinal}")
+        next_price = price_sampler(
+            rng, options['price_distribution'], options['min_price'], options['max_price']
+        )
+        products = [
+            Product(
+                id=first_id + inserted + i,
+                name=f"Product {ordinal + i}",
+                category_id=rng.choice(category_ids),
+                price=next_price(),
+            )
+            for i in range(size)
+        ]
+        # A plain QuerySet skips the per-batch read model upkeep of
+        # ProductQuerySet; the read models are rebuilt once at the end.
+        with transaction.atomic():
+            QuerySet(model=Product).bulk_create(products)
+        inserted += size
+    return inserted
+
+
+def _insert_products_in_worker(args):
+    tune_connection_for_bulk_load()
+    try:
+        return insert_products(*args)
+    finally:
+        connections.close_all()
+
 
 class Command(BaseCommand):
     help = 'Generates test data'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=5,
+                            help='Number of categories to create (default: 5)')
+        parser.add_argument('--products', type=int, default=100,
+                            help='Number of products to create (default: 100)')
+        parser.add_argument('--price-distribution', choices=PRICE_DISTRIBUTIONS, default='uniform',
+                            help='Distribution of product prices (default: uniform)')
+        parser.add_argument('--min-price', type=float, default=1.0)
+        parser.add_argument('--max-price', type=float, default=9999.99)
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed for reproducible catalogs (default: 0)')
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Products per bulk_create transaction (default: 10000)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes inserting disjoint id ranges (default: 1). '
+                                 'SQLite serializes writers, so this mostly helps on server databases.')
+
     def handle(self, *args, **options):
-        # Create 5 categories with 20 products each
-        for _ in range(5):
-            category = CategoryFactory()
-            ProductFactory.create_batch(20, category=category)
-        
-        self.stdout.write(self.style.SUCCESS('Successfully generated test data'))
\ No newline at end of file
+        if options['categories'] < 1 or options['products'] < 0:
+            raise CommandError('--categories must be positive and --products not negative.')
+        if not 0 < options['min_price'] <= options['max_price']:
+            raise CommandError('Prices must satisfy 0 < --min-price <= --max-price.')
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--batch-size and --workers must be positive.')
+
+        tune_connection_for_bulk_load()
+        started = time.perf_counter()
+        categories = Category.objects.bulk_create(
+            Category(name=f"Category {i}", description=f"Generated category {i}")
+            for i in range(options['categories'])
+        )
+        category_ids = [category.pk for category in categories]
+
+        total = options['products']
+        first_id = (Product.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        workers = min(options['workers'], max(total, 1))
+        # Worker ranges are whole batches, so batch seeds never depend on --workers.
+        batches = math.ceil(total / options['batch_size'])
+        share = math.ceil(batches / workers) * options['batch_size'] if total else 0
+        ranges = [
+            (first_id + start, start, min(share, total - start), category_ids, options)
+            for start in range(0, total, share or 1)
+        ]
+
+        if workers > 1:
+            # Children must open their own connections.
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with context.Pool(workers) as pool:
+                inserted = sum(pool.map(_insert_products_in_worker, ranges))
+        else:
+            inserted = sum(insert_products(*args) for args in ranges)
+        insert_seconds = time.perf_counter() - started
+
+        Category.objects.reconcile_product_counts()
+        TopProduct.objects.rebuild()
+        invalidate_catalog()
+        total_seconds = time.perf_counter() - started
+
+        rate = inserted / insert_seconds if insert_seconds else 0
+        self.stdout.write(
+            f'Inserted {len(categories)} categories and {inserted} products '
+            f'in {insert_seconds:.2f}s ({rate:,.0f} rows/s); '
+            f'read models rebuilt, {total_seconds:.2f}s total'
+        )
+        self.stdout.write(self.style.SUCCESS('Successfully generated test data'))
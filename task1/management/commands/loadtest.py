@@ -0,0 +1,257 @@
+import csv
+import importlib.util
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import factory.random
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from task.factories import seed_users
+from task1.models import Product
+
+LOCUSTFILES = ['locustfiles/locustfile.py', 'locustfiles/products.py']
+DEFAULT_SLO_FILE = 'locustfiles/slo.json'
+DEFAULT_SERVER = '{python} manage.py runserver 127.0.0.1:{port} --noreload'
+READY_PATH = '/api/v1/task1/products/'
+
+# SLO keys checked against the columns of Locust's *_stats.csv.
+PERCENTILES = {
+    'p50_ms': '50%',
+    'p90_ms': '90%',
+    'p95_ms': '95%',
+    'p99_ms': '99%',
+}
+
+
+def read_locust_stats(path):
+    """
+    {request name: stats} from a Locust `*_stats.csv`, with the totals
+    under 'Aggregated'. Percentiles are in milliseconds.
+    """
+    stats = {}
+    with open(path, newline='') as file:
+        for row in csv.DictReader(file):
+            requests = int(row['Request Count'])
+            stats[row['Name']] = {
+                'requests': requests,
+                'failures': int(row['Failure Count']),
+                'failure_ratio': int(row['Failure Count']) / requests if requests else 0.0,
+                'rps': float(row['Requests/s']),
+                **{
+                    key: float(row[column]) if row[column] not in ('', 'N/A') else None
+                    for key, column in PERCENTILES.items()
+                },
+            }
+    return stats
+
+
+def slo_violations(stats, slos):
+    """
+    Messages for every SLO of `slos` that `stats` misses. `slos` has an
+    'aggregate' target for the whole run and per-request-name targets
+    under 'endpoints'; a target is a percentile (`p95_ms`...),
+    `max_failure_ratio` or `min_rps`.
+    """
+    targets = [('Aggregated', slos.get('aggregate', {}))] + list(slos.get('endpoints', {}).items())
+    violations = []
+    for name, target in targets:
+        measured = stats.get(name)
+        if not measured or not measured['requests']:
+            violations.append(f'{name}: no requests were made')
+            continue
+        for key, limit in target.items():
+            if key in PERCENTILES:
+                if measured[key] is not None and measured[key] > limit:
+                    violations.append(f'{name}: {key} {measured[key]:g} > {limit:g}')
+            elif key == 'max_failure_ratio':
+                if measured['failure_ratio'] > limit:
+                    violations.append(f"{name}: failure ratio {measured['failure_ratio']:.2%} > {limit:.2%}")
+            elif key == 'min_rps':
+                if measured['rps'] < limit:
+                    violations.append(f"{name}: {measured['rps']:.1f} requests/s < {limit:g}")
+            else:
+                raise CommandError(f'Unknown SLO {key!r} for {name}.')
+    return violations
+
+
+class Command(BaseCommand):
+    help = ('Seeds a dataset, starts the app and runs both Locust user classes headless, '
+            'then fails when the SLOs are missed')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000,
+                            help='Products to seed (default: 10000)')
+        parser.add_argument('--categories', type=int,
+                            help='Categories to seed (default: one per 1000 products, at least 5)')
+        parser.add_argument('--accounts', type=int,
+                            help='Users with profiles to seed (default: as many as products)')
+        parser.add_argument('--no-seed', action='store_true',
+                            help='Run against the data already in the database')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed of the dataset and of the Locust task choices (default: 0)')
+        parser.add_argument('--users', type=int, default=50,
+                            help='Concurrent Locust users (default: 50)')
+        parser.add_argument('--spawn-rate', type=float, default=10,
+                            help='Locust users started per second (default: 10)')
+        parser.add_argument('--run-time', default='1m',
+                            help='How long to run, e.g. 30s or 5m (default: 1m)')
+        parser.add_argument('--throughput', type=float,
+                            help='Open-loop rate: tasks per second per user. '
+                                 'Default: 1-5s think time between tasks')
+        parser.add_argument('--host',
+                            help='Load-test this running server instead of starting one')
+        parser.add_argument('--port', type=int, default=8765,
+                            help='Port of the started server (default: 8765)')
+        parser.add_argument('--server', default=DEFAULT_SERVER,
+                            help='Command starting the server, with {python} and {port} '
+                                 f'placeholders (default: "{DEFAULT_SERVER}")')
+        parser.add_argument('--startup-timeout', type=float, default=30,
+                            help='Seconds to wait for the server to answer (default: 30)')
+        parser.add_argument('--locustfile', nargs='+', default=LOCUSTFILES,
+                            help='Locust files to run, e.g. locustfiles/workload.py '
+                                 f'(default: {" ".join(LOCUSTFILES)})')
+        parser.add_argument('--slo', default=DEFAULT_SLO_FILE,
+                            help=f'JSON file of the SLOs (default: {DEFAULT_SLO_FILE})')
+        parser.add_argument('--output-dir', default='loadtest-results',
+                            help='Where Locust writes its CSV files (default: loadtest-results)')
+
+    def handle(self, *args, **options):
+        if options['products'] < 1 or options['users'] < 1 or options['spawn_rate'] <= 0:
+            raise CommandError('--products, --users and --spawn-rate must be positive.')
+        if options['throughput'] is not None and options['throughput'] <= 0:
+            raise CommandError('--throughput must be positive.')
+        slo_path = Path(settings.BASE_DIR) / options['slo']
+        if not slo_path.exists():
+            raise CommandError(f'SLO file {slo_path} does not exist.')
+        slos = json.loads(slo_path.read_text())
+        locust = self.locust_command()
+
+        if not options['no_seed']:
+            self.seed(options)
+        connections.close_all()
+
+        host = options['host']
+        server = None
+        if host is None:
+            host = f"http://127.0.0.1:{options['port']}"
+            server = self.start_server(host, options)
+        try:
+            stats_path = self.run_locust(locust, host, options)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+
+        stats = read_locust_stats(stats_path)
+        self.report(stats)
+        violations = slo_violations(stats, slos)
+        if violations:
+            raise CommandError('SLOs missed:\n  ' + '\n  '.join(violations))
+        self.stdout.write(self.style.SUCCESS(f'All SLOs of {options["slo"]} met'))
+
+    def locust_command(self):
+        if shutil.which('locust'):
+            return ['locust']
+        if importlib.util.find_spec('locust'):
+            return [sys.executable, '-m', 'locust']
+        raise CommandError('Locust is not installed: pip install locust')
+
+    def seed(self, options):
+        """Seed an empty database; a reproducible dataset needs one."""
+        # The apps ship no migrations: their tables come from --run-syncdb.
+        call_command('migrate', run_syncdb=True, interactive=False, verbosity=0)
+        if Product.objects.exists() or get_user_model().objects.exists():
+            raise CommandError(
+                'The database already has data. Point SQLITE_PATH at a new file, or pass --no-seed.'
+            )
+        products = options['products']
+        accounts = products if options['accounts'] is None else options['accounts']
+        started = time.perf_counter()
+        call_command(
+            'generate_data', products=products,
+            categories=options['categories'] or max(5, products // 1000),
+            price_distribution='lognormal', seed=options['seed'], stdout=self.stdout,
+        )
+        factory.random.reseed_random(options['seed'])
+        seed_users(accounts)
+        self.stdout.write(f'Seeded {products} products and {accounts} users in {time.perf_counter() - started:.1f}s')
+
+    def start_server(self, host, options):
+        command = options['server'].format(python=shlex.quote(sys.executable), port=options['port'])
+        log = tempfile.TemporaryFile()
+        server = subprocess.Popen(
+            shlex.split(command), cwd=settings.BASE_DIR, stdout=log, stderr=subprocess.STDOUT,
+            # The per-request log lines would only slow the server down.
+            env={**os.environ, 'SERVER_TIMING_LOG_LEVEL': 'WARNING'},
+        )
+        deadline = time.monotonic() + options['startup_timeout']
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                log.seek(0)
+                raise CommandError(f'The server exited with {server.returncode}:\n{log.read().decode()}')
+            try:
+                with urllib.request.urlopen(host + READY_PATH, timeout=2):
+                    self.stdout.write(f'Server ready at {host}')
+                    return server
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f"The server did not answer within {options['startup_timeout']:g}s.")
+
+    def run_locust(self, locust, host, options):
+        output_dir = Path(options['output_dir'])
+        output_dir.mkdir(parents=True, exist_ok=True)
+        prefix = output_dir / 'loadtest'
+        # Never check the SLOs against the statistics of an earlier run.
+        for stale in output_dir.glob(f'{prefix.name}_*.csv'):
+            stale.unlink()
+        env = {**os.environ, 'LOCUST_SEED': str(options['seed'])}
+        if options['throughput'] is not None:
+            env['LOCUST_THROUGHPUT'] = str(options['throughput'])
+        if options['categories'] is not None:
+            # The workload model draws category ids from 1..LOCUST_CATEGORIES.
+            env['LOCUST_CATEGORIES'] = str(options['categories'])
+        command = [
+            *locust,
+            '-f', ','.join(str(Path(settings.BASE_DIR) / path) for path in options['locustfile']),
+            '--headless', '--only-summary',
+            '--users', str(options['users']),
+            '--spawn-rate', str(options['spawn_rate']),
+            '--run-time', options['run_time'],
+            '--host', host,
+            '--csv', str(prefix),
+            # Failed requests are for the SLOs to judge; any other exit code
+            # means Locust itself failed.
+            '--exit-code-on-error', '0',
+        ]
+        self.stdout.write(' '.join(command))
+        returncode = subprocess.run(command, env=env, check=False).returncode
+        if returncode != 0:
+            raise CommandError(f'Locust exited with {returncode}.')
+        stats_path = Path(f'{prefix}_stats.csv')
+        if not stats_path.exists():
+            raise CommandError(f'Locust wrote no statistics to {stats_path}.')
+        return stats_path
+
+    def report(self, stats):
+        self.stdout.write(
+            f"{'name':<28} {'requests':>9} {'fail %':>7} {'req/s':>8} "
+            + ' '.join(f'{key:>8}' for key in PERCENTILES)
+        )
+        for name, row in stats.items():
+            self.stdout.write(
+                f"{name:<28} {row['requests']:>9} {row['failure_ratio']:>7.2%} {row['rps']:>8.1f} "
+                + ' '.join(f"{row[key] if row[key] is not None else '-':>8}" for key in PERCENTILES)
+            )
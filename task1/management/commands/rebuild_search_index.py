@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from task1.search import is_supported, rebuild_search_index
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text product search index from the product table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default',
+                            help='Database alias to rebuild the index on (default: default)')
+
+    def handle(self, *args, **options):
+        if not is_supported(options['database']):
+            raise CommandError('Full-text search needs an SQLite database with FTS5.')
+        entries = rebuild_search_index(options['database'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt search index: {entries} products'))
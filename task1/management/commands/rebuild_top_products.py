@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from task1.models import TopProduct
+
+class Command(BaseCommand):
+    help = 'Rebuilds the top-N-per-category read model from the product table'
+
+    def handle(self, *args, **options):
+        entries = TopProduct.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt top products: {entries} entries'))
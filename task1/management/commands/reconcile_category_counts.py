@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from task1.models import Category
+
+class Command(BaseCommand):
+    help = 'Repairs Category.product_count values that drifted from the product table'
+
+    def handle(self, *args, **options):
+        repaired = Category.objects.reconcile_product_counts()
+        if repaired:
+            ids = ', '.join(str(pk) for pk in repaired)
+            self.stdout.write(self.style.WARNING(f'Repaired {len(repaired)} categories: {ids}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All category product counts are correct'))
@@ -1,28 +1,343 @@
-from django.db import models
+from collections import Counter
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, RowNumber
+
+from .cache import invalidate_catalog
+
+
+class CategoryQuerySet(models.QuerySet):
+
+    def adjust_product_counts(self, deltas):
+        """Apply {category_id: delta} to the denormalized product counters."""
+        for category_id, delta in deltas.items():
+            if delta:
+                self.filter(pk=category_id).update(product_count=F('product_count') + delta)
+
+    def reconcile_product_counts(self):
+        """
+        Recount products for every category whose counter drifted and return
+        the ids that were repaired.
+        """
+        actual = Coalesce(
+            Subquery(
+                Product.objects.filter(category=OuterRef('pk'))
+                .order_by()
+                .values('category')
+                .annotate(total=Count('id'))
+                .values('total')
+            ),
+            0,
+        )
+        with transaction.atomic(using=self.db):
+            drifted = list(
+                self.annotate(actual=actual)
+                .exclude(product_count=F('actual'))
+                .values_list('pk', flat=True)
+            )
+            if drifted:
+                self.filter(pk__in=drifted).update(product_count=actual)
+                invalidate_catalog()
+        return drifted
+
+
 class Category(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
+    # Denormalized number of products, maintained on every Product write.
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CategoryQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # The counter only changes through F() updates; never write back a
+        # value that went stale while this instance was held in memory.
+        if self._state.adding or kwargs.get('force_insert'):
+            return super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+        kwargs['update_fields'] = [name for name in update_fields if name != 'product_count']
+        super().save(*args, **kwargs)
+
+
+def ranked(queryset, n, order_by):
+    """Keep the first `n` rows of every category of `queryset` by `order_by`."""
+    return queryset.annotate(
+        row_number=Window(expression=RowNumber(), partition_by=[F('category')], order_by=order_by)
+    ).filter(row_number__lte=n)
+
+
+# Product fields that decide a product's place in the top-N read model.
+RANKING_FIELDS = frozenset({'price', 'category', 'category_id'})
+
+
+class ProductQuerySet(models.QuerySet):
+
+    def top_per_category(self, n=None, strategy=None, **filters):
+        """
+        The `n` (default DEPTH) most expensive products of every category
+        among the products matching `filters`.
+
+        With up to DEPTH products and at most a category filter, membership
+        is read from the precomputed TopProduct table. Otherwise the ranking
+        is computed by `strategy`, picked by `top_n_strategy()` if not given:
+        'window' ranks every matching product with ROW_NUMBER(), which costs
+        O(products); 'per_category' runs one LIMIT n lookup per category on
+        the (category, -price) index, which costs O(categories x n).
+        """
+        n = n or TopProduct.DEPTH
+        if strategy is None and n <= TopProduct.DEPTH and set(filters) <= {'category_id'}:
+            entries = TopProduct.objects.filter(**filters)
+            if n < TopProduct.DEPTH:
+                entries = ranked(entries, n, order_by=[F('price').desc(), F('product_id').asc()])
+            return self.filter(pk__in=entries.values('product_id'))
+
+        strategy = strategy or self.top_n_strategy(n, filters)
+        if strategy == 'per_category':
+            return self.filter(pk__in=self._top_ids_per_category(n, filters))
+        matching = ranked(Product.objects.filter(**filters), n, order_by=[F('price').desc(), F('id').asc()])
+        return self.filter(pk__in=matching.values('pk'))
+
+    def top_n_strategy(self, n, filters):
+        """
+        Pick the cheaper top-N plan: 'per_category' when the index lookups
+        it needs cost less than scanning the matching products. A filter on
+        created_at is not served by the (category, -price) index, so it
+        always uses 'window', which the created_at index keeps small.
+        """
+        strategy = getattr(settings, 'TASK1_TOP_N_STRATEGY', 'auto')
+        if strategy != 'auto':
+            return strategy
+        if any(lookup.startswith('created_at') for lookup in filters):
+            return 'window'
+        categories = Category.objects.all()
+        if 'category_id' in filters:
+            categories = categories.filter(pk=filters['category_id'])
+        totals = categories.aggregate(categories=Count('pk'), products=Sum('product_count'))
+        lookup_cost = totals['categories'] * n * getattr(settings, 'TASK1_TOP_N_LOOKUP_COST', 1)
+        return 'per_category' if lookup_cost < (totals['products'] or 0) else 'window'
+
+    def _top_ids_per_category(self, n, filters):
+        """
+        SQL selecting the ids of the top `n` products of every category with
+        a correlated LIMIT subquery, so SQLite walks the category table and
+        reads n entries of the (category, -price) index for each.
+        """
+        filters = dict(filters)
+        category_id = filters.pop('category_id', None)
+        category_table = Category._meta.db_table
+        top = (
+            Product.objects.filter(category_id=RawSQL('per_category.id', ()), **filters)
+            .order_by('-price', 'id')
+            .values('pk')[:n]
+        )
+        top_sql, params = top.query.sql_with_params()
+        sql = f'SELECT per_category_top.id FROM {category_table} AS per_category ' \
+              f'JOIN {Product._meta.db_table} AS per_category_top ON per_category_top.id IN ({top_sql})'
+        if category_id is not None:
+            sql += ' WHERE per_category.id = %s'
+            params = (*params, category_id)
+        return RawSQL(sql, params)
+
+    def bulk_create(self, objs, batch_size=None, ignore_conflicts=False, update_conflicts=False,
+                    update_fields=None, unique_fields=None):
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(
+                objs, batch_size=batch_size, ignore_conflicts=ignore_conflicts,
+                update_conflicts=update_conflicts, update_fields=update_fields,
+                unique_fields=unique_fields,
+            )
+            invalidate_catalog()
+            category_ids = {obj.category_id for obj in objs}
+            if update_conflicts and {'category', 'category_id'}.intersection(update_fields or ()):
+                # Updated rows may have left categories that are not in objs.
+                Category.objects.reconcile_product_counts()
+                TopProduct.objects.rebuild()
+                return objs
+            if ignore_conflicts or update_conflicts:
+                # Skipped or updated rows are not new products: recount.
+                Category.objects.filter(pk__in=category_ids).reconcile_product_counts()
+            else:
+                Category.objects.adjust_product_counts(Counter(obj.category_id for obj in objs))
+            TopProduct.objects.refresh(category_ids)
+        return objs
+
+    def update(self, **kwargs):
+        if not RANKING_FIELDS.intersection(kwargs):
+            rows = super().update(**kwargs)
+            invalidate_catalog()
+            return rows
+
+        with transaction.atomic(using=self.db):
+            invalidate_catalog()
+            old_counts = dict(
+                self.order_by().values('category_id').annotate(total=Count('id'))
+                .values_list('category_id', 'total')
+            )
+            rows = super().update(**kwargs)
+            category_ids = set(old_counts)
+            new_category = kwargs.get('category', kwargs.get('category_id'))
+            if new_category is not None:
+                new_category = getattr(new_category, 'pk', new_category)
+                if not isinstance(new_category, int):
+                    # An expression: the new categories are unknown, start over.
+                    Category.objects.reconcile_product_counts()
+                    TopProduct.objects.rebuild()
+                    return rows
+                deltas = Counter({category_id: -total for category_id, total in old_counts.items()})
+                deltas[new_category] += rows
+                Category.objects.adjust_product_counts(deltas)
+                category_ids.add(new_category)
+            TopProduct.objects.refresh(category_ids)
+        return rows
+
+
 class Product(models.Model):
     name = models.CharField(max_length=200)
     category = models.ForeignKey(
-        Category, 
-        on_delete=models.CASCADE, 
+        Category,
+        on_delete=models.CASCADE,
         related_name='products'
     )
     price = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ['-price']
         indexes = [
             models.Index(fields=['category', '-price']),
             models.Index(fields=['-price']),
-            models.Index(fields=['id'])
+            models.Index(fields=['id']),
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} (${self.price})"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored category so a reassignment can move the
+        # category counters without re-reading the row.
+        if 'category_id' in instance.__dict__:
+            instance._loaded_category_id = instance.category_id
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Read models are maintained from post_save; keep them in the same
+        # transaction as the row itself.
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+        self._loaded_category_id = self.category_id
+
+
+class TopProductManager(models.Manager):
+
+    def refresh(self, category_ids):
+        """
+        Recompute the top-N entries of the given categories.
+
+        Each category costs one index-ordered LIMIT N read on
+        (category, -price) plus a write only when the ranking changed, so
+        the cost is independent of the catalog size.
+        """
+        changed = {}
+        for category_id in category_ids:
+            top = list(
+                Product.objects.filter(category_id=category_id)
+                .order_by('-price', 'id')
+                .values_list('pk', 'price')[:self.model.DEPTH]
+            )
+            current = sorted(
+                self.filter(category_id=category_id).values_list('product_id', 'price'),
+                key=lambda entry: (-entry[1], entry[0]),
+            )
+            if current != top:
+                changed[category_id] = top
+        if not changed:
+            return
+
+        # A product moved between two refreshed categories is still listed
+        # under its old one: clear every changed category before inserting.
+        with transaction.atomic(using=self.db):
+            self.filter(category_id__in=changed).delete()
+            self.bulk_create(
+                self.model(category_id=category_id, product_id=product_id, price=price)
+                for category_id, top in changed.items()
+                for product_id, price in top
+            )
+
+    def rebuild(self, batch_size=1000):
+        """Recompute the whole table with a single ranking pass over Product."""
+        top = ranked(
+            Product.objects.all(), self.model.DEPTH, order_by=[F('price').desc(), F('id').asc()]
+        ).values_list('pk', 'category_id', 'price')
+
+        with transaction.atomic():
+            self.all().delete()
+            entries = self.bulk_create(
+                (
+                    self.model(product_id=product_id, category_id=category_id, price=price)
+                    for product_id, category_id, price in top.iterator()
+                ),
+                batch_size=batch_size,
+            )
+        return len(entries)
+
+
+class TopProduct(models.Model):
+    """
+    Read model holding the DEPTH most expensive products of every category.
+
+    Kept current by the Product signals and queryset hooks; run the
+    `rebuild_top_products` command after writes that bypass them.
+    """
+    DEPTH = 10
+
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='top_products'
+    )
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='top_entry'
+    )
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    objects = TopProductManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', '-price']),
         ]
 
     def __str__(self):
-        return f"{self.name} (${self.price})"
\ No newline at end of file
+        return f"{self.product_id} in {self.category_id} (${self.price})"
+
+
+class CatalogVersion(models.Model):
+    """
+    The single row holding the version the response cache is keyed on (see
+    task1/cache.py). It lives in the database rather than in a cache so
+    that a write made by any process, or by a management command, is seen
+    by all of them.
+    """
+    SINGLETON_ID = 1
+
+    version = models.BigIntegerField()
+    # Unix timestamp of the last bump, served as Last-Modified.
+    modified = models.BigIntegerField()
+
+    def __str__(self):
+        return f"catalog v{self.version}"
@@ -1,5 +1,245 @@
-from rest_framework.pagination import PageNumberPagination
+import asyncio
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .search import search
 
 class DefaultPagination(PageNumberPagination):
   page_size_query_param = 'page_size'
-  page_size = 10
\ No newline at end of file
+  page_size = 10
+  max_page_size = 1000
+
+
+class AsyncDefaultPagination:
+  """
+  `DefaultPagination` for plain async Django views.
+
+  The count and the page are awaited together with asyncio.gather, so a
+  backend that can run them concurrently does; the response body has the
+  same shape as DefaultPagination's.
+  """
+  page_query_param = DefaultPagination.page_query_param
+  page_size_query_param = DefaultPagination.page_size_query_param
+  page_size = DefaultPagination.page_size
+  max_page_size = DefaultPagination.max_page_size
+
+  def get_page_size(self, request):
+    try:
+      page_size = int(request.GET[self.page_size_query_param])
+    except (KeyError, ValueError):
+      return self.page_size
+    return min(page_size, self.max_page_size) if page_size > 0 else self.page_size
+
+  def get_page_number(self, request):
+    try:
+      page_number = int(request.GET.get(self.page_query_param, 1))
+    except ValueError:
+      raise NotFound('Invalid page.')
+    if page_number < 1:
+      raise NotFound('Invalid page.')
+    return page_number
+
+  async def apaginate_queryset(self, queryset, request):
+    self.request = request
+    self.page_size = self.get_page_size(request)
+    self.page_number = self.get_page_number(request)
+    offset = (self.page_number - 1) * self.page_size
+
+    async def fetch_page():
+      return [row async for row in queryset[offset:offset + self.page_size]]
+
+    self.count, page = await asyncio.gather(queryset.acount(), fetch_page())
+    if not page and self.page_number > 1:
+      raise NotFound('Invalid page.')
+    return page
+
+  def get_link(self, page_number):
+    url = self.request.build_absolute_uri()
+    if page_number == 1:
+      return remove_query_param(url, self.page_query_param)
+    return replace_query_param(url, self.page_query_param, page_number)
+
+  def get_paginated_data(self, data):
+    has_next = self.page_number * self.page_size < self.count
+    return {
+      'count': self.count,
+      'next': self.get_link(self.page_number + 1) if has_next else None,
+      'previous': self.get_link(self.page_number - 1) if self.page_number > 1 else None,
+      'results': data,
+    }
+
+
+Cursor = namedtuple('Cursor', ['position', 'reverse'])
+
+
+class KeysetPagination(CursorPagination):
+  """
+  Keyset (seek) pagination over a composite ordering such as
+  ('-price', 'id') or ('category_id', '-price', 'id').
+
+  Instead of COUNT(*) + OFFSET every page is fetched with a range predicate
+  on the last row of the previous page, so page N costs the same as page 1
+  as long as the ordering is backed by an index. The ordering is taken from
+  the view's `keyset_orderings` for the current action and must end with a
+  unique column.
+  """
+  page_size_query_param = 'page_size'
+  page_size = 10
+  max_page_size = 1000
+  ordering = ('-price', 'id')
+
+  def paginate_queryset(self, queryset, request, view=None):
+    self.page_size = self.get_page_size(request)
+    if not self.page_size:
+      return None
+
+    self.base_url = request.build_absolute_uri()
+    self.ordering = self.get_ordering(request, queryset, view)
+    self.cursor = self.decode_cursor(request)
+
+    reverse = self.cursor.reverse if self.cursor else False
+    ordering = self._reverse_ordering(self.ordering) if reverse else self.ordering
+    queryset = queryset.order_by(*ordering)
+    if self.cursor is not None and self.cursor.position is not None:
+      position = self.clean_position(queryset.model, self.cursor.position)
+      queryset = queryset.filter(self._seek(ordering, position))
+
+    # Fetch one extra row to find out whether there is a following page.
+    return self._set_page(list(queryset[:self.page_size + 1]), reverse)
+
+  def _set_page(self, results, reverse):
+    has_more = len(results) > self.page_size
+    self.page = results[:self.page_size]
+
+    if reverse:
+      self.page.reverse()
+      self.has_next = True
+      self.has_previous = has_more
+    else:
+      self.has_next = has_more
+      self.has_previous = self.cursor is not None and self.cursor.position is not None
+
+    return self.page
+
+  def get_ordering(self, request, queryset, view):
+    orderings = getattr(view, 'keyset_orderings', None) or {}
+    return tuple(orderings.get(getattr(view, 'action', None), self.ordering))
+
+  def get_next_link(self):
+    if not self.has_next or not self.page:
+      return None
+    position = self._get_position_from_instance(self.page[-1], self.ordering)
+    return self.encode_cursor(Cursor(position=position, reverse=False))
+
+  def get_previous_link(self):
+    if not self.has_previous or not self.page:
+      return None
+    position = self._get_position_from_instance(self.page[0], self.ordering)
+    return self.encode_cursor(Cursor(position=position, reverse=True))
+
+  def decode_cursor(self, request):
+    encoded = request.query_params.get(self.cursor_query_param)
+    if encoded is None:
+      return None
+    if not encoded:
+      return Cursor(position=None, reverse=False)
+
+    try:
+      payload = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+      position = payload['p']
+      reverse = bool(payload.get('r', 0))
+    except (TypeError, ValueError, KeyError):
+      raise NotFound(self.invalid_cursor_message)
+
+    if not isinstance(position, list) or len(position) != len(self.ordering):
+      raise NotFound(self.invalid_cursor_message)
+    return Cursor(position=position, reverse=reverse)
+
+  def clean_position(self, model, position):
+    """
+    Convert the cursor's values with the model fields of the ordering, so a
+    tampered cursor is a 404 rather than an error in the query.
+    """
+    cleaned = []
+    for field, value in zip(self.ordering, position):
+      try:
+        value = model._meta.get_field(field.lstrip('-')).to_python(value)
+      except (ValidationError, TypeError, ValueError):
+        raise NotFound(self.invalid_cursor_message)
+      if value is None:
+        raise NotFound(self.invalid_cursor_message)
+      cleaned.append(value)
+    return cleaned
+
+  def encode_cursor(self, cursor):
+    payload = {'p': cursor.position}
+    if cursor.reverse:
+      payload['r'] = 1
+    encoded = urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('ascii'))
+    return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+  def _get_position_from_instance(self, instance, ordering):
+    position = []
+    for field in ordering:
+      name = field.lstrip('-')
+      value = instance[name] if isinstance(instance, dict) else getattr(instance, name)
+      # Floats (search ranks) round-trip through JSON exactly.
+      position.append(value if isinstance(value, (int, float)) else str(value))
+    return position
+
+  @staticmethod
+  def _reverse_ordering(ordering):
+    return tuple(field[1:] if field.startswith('-') else '-' + field for field in ordering)
+
+  @staticmethod
+  def _seek(ordering, position):
+    """
+    Build `(k1, k2, ...) > (v1, v2, ...)` in the direction of `ordering`.
+
+    The expanded OR form is prefixed with an inclusive bound on the leading
+    column so SQLite can turn it into an index range scan.
+    """
+    condition = None
+    for field, value in reversed(list(zip(ordering, position))):
+      name = field.lstrip('-')
+      lookup = 'lt' if field.startswith('-') else 'gt'
+      strict = Q(**{f'{name}__{lookup}': value})
+      condition = strict if condition is None else strict | (Q(**{name: value}) & condition)
+
+    leading = ordering[0].lstrip('-')
+    lookup = 'lte' if ordering[0].startswith('-') else 'gte'
+    return Q(**{f'{leading}__{lookup}': position[0]}) & condition
+
+
+class SearchPagination(KeysetPagination):
+  """
+  Keyset pagination over full-text search hits, best rank first with the
+  product id as tie-breaker (see `task1.search`).
+  """
+  ordering = ('rank', 'id')
+
+  def clean_position(self, model, position):
+    # Hits are not model rows: a bm25 rank and a rowid go to raw SQL.
+    rank, pk = position
+    if not isinstance(rank, float) or type(pk) is not int:
+      raise NotFound(self.invalid_cursor_message)
+    return [rank, pk]
+
+  def paginate_search(self, expression, request, using='default'):
+    self.page_size = self.get_page_size(request)
+    self.base_url = request.build_absolute_uri()
+    self.cursor = self.decode_cursor(request)
+
+    reverse = self.cursor.reverse if self.cursor else False
+    after = self.cursor.position if self.cursor else None
+    if after is not None:
+      after = self.clean_position(None, after)
+    hits = search(expression, self.page_size + 1, after=after, reverse=reverse, using=using)
+    return self._set_page(hits, reverse)
@@ -0,0 +1,93 @@
+import csv
+import json
+import uuid
+from itertools import chain
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .fragments import EncodedRows
+
+
+class StreamingRenderer(BaseRenderer):
+    """
+    Renderer for row streams. `stream()` turns an iterator of row dicts
+    into encoded chunks for a StreamingHttpResponse; `render()` only covers
+    ordinary responses such as validation errors.
+    """
+    charset = 'utf-8'
+    rows_per_chunk = 500
+
+    def stream(self, rows, fields):
+        raise NotImplementedError
+
+    def chunked(self, lines):
+        buffer = []
+        for line in lines:
+            buffer.append(line)
+            if len(buffer) >= self.rows_per_chunk:
+                yield ''.join(buffer).encode(self.charset)
+                buffer = []
+        if buffer:
+            yield ''.join(buffer).encode(self.charset)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        fields = list(rows[0]) if rows and isinstance(rows[0], dict) else ['detail']
+        rows = [row if isinstance(row, dict) else {'detail': row} for row in rows]
+        return b''.join(self.stream(iter(rows), fields))
+
+
+class NDJSONRenderer(StreamingRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def stream(self, rows, fields):
+        # Same encoding options as rest_framework's JSONRenderer.
+        dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+        return self.chunked(dumps(row) + '\n' for row in rows)
+
+
+class CSVRenderer(StreamingRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    class Echo:
+        def write(self, value):
+            return value
+
+    def stream(self, rows, fields):
+        writer = csv.DictWriter(self.Echo(), fieldnames=fields, extrasaction='ignore')
+        lines = (writer.writerow(row) for row in rows)
+        return self.chunked(chain([writer.writeheader()], lines))
+
+
+class FragmentJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that splices `EncodedRows` in as their pre-encoded bytes,
+    at the top level or as a value of a top-level dict (a page's
+    `results`), instead of encoding them again. Indented output, as the
+    browsable API asks for, decodes them and renders as usual.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        indented = self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        if isinstance(data, EncodedRows):
+            return super().render(list(data), accepted_media_type, renderer_context) if indented else data.render()
+        encoded = {}
+        if isinstance(data, dict):
+            encoded = {key: value for key, value in data.items() if isinstance(value, EncodedRows)}
+        if not encoded:
+            return super().render(data, accepted_media_type, renderer_context)
+        if indented:
+            data = {key: list(value) if key in encoded else value for key, value in data.items()}
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Encode the rest around placeholders, then put the fragments in.
+        markers = {key: f'fragments-{uuid.uuid4().hex}' for key in encoded}
+        data = {key: markers.get(key, value) for key, value in data.items()}
+        content = super().render(data, accepted_media_type, renderer_context)
+        for key, marker in markers.items():
+            content = content.replace(f'"{marker}"'.encode(), encoded[key].render(), 1)
+        return content
@@ -0,0 +1,123 @@
+"""
+Full-text product search on an SQLite FTS5 index.
+
+`task1_product_search` holds one row per product (rowid = product id) with
+the product name and its category's description. Triggers on the product
+and category tables keep it in sync with every write, including
+`bulk_create`, `update()` and raw SQL, so the index never depends on
+Django signals. Results are ranked with bm25, name matches weighing ten
+times as much as description matches.
+"""
+import re
+from collections import namedtuple
+
+from django.db import connections
+
+Hit = namedtuple('Hit', ['id', 'rank'])
+
+TABLE = 'task1_product_search'
+# bm25 weights of (name, category_description).
+RANK = 'bm25(10.0, 1.0)'
+
+CREATE_STATEMENTS = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(name, category_description)",
+    f"INSERT INTO {TABLE}({TABLE}, rank) VALUES ('rank', '{RANK}')",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_product_insert AFTER INSERT ON task1_product BEGIN
+        INSERT INTO {TABLE}(rowid, name, category_description)
+        SELECT new.id, new.name, description FROM task1_category WHERE id = new.category_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_product_update
+    AFTER UPDATE OF name, category_id ON task1_product BEGIN
+        UPDATE {TABLE} SET
+            name = new.name,
+            category_description = (SELECT description FROM task1_category WHERE id = new.category_id)
+        WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_product_delete AFTER DELETE ON task1_product BEGIN
+        DELETE FROM {TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLE}_category_update
+    AFTER UPDATE OF description ON task1_category BEGIN
+        UPDATE {TABLE} SET category_description = new.description
+        WHERE rowid IN (SELECT id FROM task1_product WHERE category_id = new.id);
+    END
+    """,
+]
+
+TOKEN = re.compile(r'\w+\*?')
+
+
+def is_supported(using='default'):
+    return connections[using].vendor == 'sqlite'
+
+
+def create_search_index(using='default'):
+    """Create the FTS5 table and its triggers unless they already exist."""
+    with connections[using].cursor() as cursor:
+        for statement in CREATE_STATEMENTS:
+            cursor.execute(statement)
+
+
+def create_search_index_after_migrate(sender, using='default', **kwargs):
+    if is_supported(using):
+        create_search_index(using)
+
+
+def rebuild_search_index(using='default'):
+    """Repopulate the index from the product table and return its size."""
+    create_search_index(using)
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+        cursor.execute(
+            f"""
+            INSERT INTO {TABLE}(rowid, name, category_description)
+            SELECT product.id, product.name, category.description
+            FROM task1_product AS product
+            JOIN task1_category AS category ON category.id = product.category_id
+            """
+        )
+        # Merge the b-trees written by the bulk insert into one.
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT count(*) FROM {TABLE}")
+        return cursor.fetchone()[0]
+
+
+def match_expression(query):
+    """
+    Turn user input into an FTS5 query matching every word of it.
+
+    Words are quoted so FTS5 operators and punctuation in the input are
+    never interpreted; a trailing `*` keeps its meaning as a prefix query
+    (`sho*` matches "shoe" and "shorts"). Returns None without any word.
+    """
+    terms = [
+        f'"{token[:-1]}"*' if token.endswith('*') else f'"{token}"'
+        for token in TOKEN.findall(query)
+    ]
+    return ' '.join(terms) or None
+
+
+def search(expression, limit, after=None, reverse=False, using='default'):
+    """
+    Return up to `limit` `Hit(id, rank)`s for `expression`, best
+    first, seeking past the (rank, id) position `after`. With `reverse`
+    the hits before `after` are returned, closest first.
+    """
+    comparison, direction = ('<', 'DESC') if reverse else ('>', 'ASC')
+    sql = f"SELECT rowid, rank FROM {TABLE} WHERE {TABLE} MATCH %s"
+    params = [expression]
+    if after is not None:
+        sql += f" AND (rank, rowid) {comparison} (%s, %s)"
+        params.extend(after)
+    sql += f" ORDER BY rank {direction}, rowid {direction} LIMIT %s"
+    params.append(limit)
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        return [Hit(*row) for row in cursor.fetchall()]
@@ -1,5 +1,13 @@
 # serializers.py
-from rest_framework import serializers
+import datetime
+import decimal
+
+from django.utils import timezone
+from django.utils.functional import cached_property
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from paymob.timing import TimedListSerializer, TimedSerializerMixin, measure
+from .fragments import EncodedRows, encode_json, get_fragment_cache
 from .models import Product, Category
 
 
@@ -9,12 +17,13 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = ['id', 'name', 'description']
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     category = CategorySerializer()
-    category_product_count = serializers.IntegerField(read_only=True)
+    category_product_count = serializers.IntegerField(source='category.product_count', read_only=True)
     
     class Meta:
         model = Product
+        list_serializer_class = TimedListSerializer
         fields = [
             'id', 
             'name', 
@@ -26,5 +35,153 @@ class ProductSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation['category'] = representation['category']['name']
-        return representation
\ No newline at end of file
+        # Left out by a sparse fieldset (`?fields=`).
+        if 'category' in representation:
+            representation['category'] = representation['category']['name']
+        return representation
+
+class ProductRowFormatter:
+    """
+    Read-only fast path rendering products exactly like `ProductSerializer`.
+
+    Rows are fetched with `values_list(..., 'category__name')` and turned into
+    dicts by a formatter compiled from the serializer's own fields, so no
+    `Product` instances or nested `CategorySerializer`s are built per row.
+    Only price and created_at need a conversion; for the common settings
+    (string decimals, ISO-8601 datetimes) those are specialised once per call
+    instead of re-reading settings and the active timezone on every value.
+    """
+    # (output key, values_list lookup) in the serializer's field order.
+    columns = (
+        ('id', 'id'),
+        ('name', 'name'),
+        ('category', 'category__name'),
+        ('price', 'price'),
+        ('created_at', 'created_at'),
+        ('category_product_count', 'category__product_count'),
+    )
+    # Always fetched for keyset cursors, rendered only when selected.
+    hidden_lookups = ('id', 'price', 'category_id')
+
+    def __init__(self, serializer_class=ProductSerializer, keys=None):
+        self.serializer_class = serializer_class
+        if keys is not None:
+            self.columns = tuple(column for column in self.columns if column[0] in keys)
+        self._selections = {}
+
+    def select(self, keys):
+        """
+        A formatter rendering only `keys` (all of them when None): columns
+        that are not rendered are not fetched, nor their joins.
+        """
+        if keys is None:
+            return self
+        keys = tuple(keys)
+        if keys not in self._selections:
+            self._selections[keys] = type(self)(self.serializer_class, keys)
+        return self._selections[keys]
+
+    @property
+    def lookups(self):
+        return list(dict.fromkeys([lookup for _, lookup in self.columns] + list(self.hidden_lookups)))
+
+    @cached_property
+    def fields(self):
+        return self.serializer_class().fields
+
+    def values_list(self, queryset):
+        # Named rows keep attribute access for KeysetPagination.
+        return queryset.values_list(*self.lookups, named=True)
+
+    def converter(self, field):
+        if isinstance(field, serializers.DecimalField):
+            return self.decimal_converter(field)
+        if isinstance(field, serializers.DateTimeField):
+            return self.datetime_converter(field)
+        return None
+
+    @staticmethod
+    def decimal_converter(field):
+        coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        if not coerce_to_string or field.localize or field.decimal_places is None:
+            return field.to_representation
+        context = decimal.getcontext().copy()
+        if field.max_digits is not None:
+            context.prec = field.max_digits
+        exponent = decimal.Decimal('.1') ** field.decimal_places
+        rounding = field.rounding
+
+        def convert(value):
+            if not isinstance(value, decimal.Decimal):
+                return field.to_representation(value)
+            return '{:f}'.format(value.quantize(exponent, rounding=rounding, context=context))
+        return convert
+
+    @staticmethod
+    def datetime_converter(field):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+        if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+            return field.to_representation
+
+        def convert(value):
+            if not isinstance(value, datetime.datetime) or value.tzinfo is None:
+                return field.to_representation(value)
+            value = value.astimezone(field_timezone).isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return convert
+
+    def compile(self):
+        plan = [
+            (key, index, self.converter(self.fields[key]))
+            for index, (key, _) in enumerate(self.columns)
+        ]
+
+        def format_row(row):
+            data = {}
+            for key, index, convert in plan:
+                value = row[index]
+                data[key] = convert(value) if convert is not None and value is not None else value
+            return data
+
+        return format_row
+
+    @property
+    def keys(self):
+        return [key for key, _ in self.columns]
+
+    def iter_format(self, rows):
+        # Compiled per call: the active timezone may differ between requests.
+        format_row = self.compile()
+        for row in rows:
+            yield format_row(row)
+
+    def format(self, rows):
+        with measure('serialize'):
+            return list(self.iter_format(rows))
+
+    def encode(self, rows):
+        """
+        The rows as JSON fragments, rendered like `format()`'s dicts. Rows
+        encoded before and unchanged since come from the fragment cache
+        (see task1/fragments.py).
+        """
+        cache = get_fragment_cache()
+        with measure('serialize'):
+            if cache is None:
+                return EncodedRows([encode_json(data) for data in self.iter_format(rows)])
+            namespace = (self.serializer_class, tuple(self.keys), timezone.get_current_timezone_name())
+            keyed = [((namespace, row.id), row) for row in rows]
+            fragments = cache.get_many(keyed)
+            missing = [index for index, fragment in enumerate(fragments) if fragment is None]
+            if missing:
+                format_row = self.compile()
+                encoded = []
+                for index in missing:
+                    key, row = keyed[index]
+                    fragments[index] = encode_json(format_row(row))
+                    encoded.append((key, row, fragments[index]))
+                cache.set_many(encoded)
+            return EncodedRows(fragments)
@@ -0,0 +1,81 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .cache import invalidate_catalog
+from .fragments import discard_categories, discard_products
+from .models import RANKING_FIELDS, Category, Product, TopProduct
+
+
+def _category_fields_saved(update_fields):
+    return update_fields is None or bool({'category', 'category_id'}.intersection(update_fields))
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_category(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding or not _category_fields_saved(update_fields):
+        instance._previous_category_id = None
+        return
+    try:
+        instance._previous_category_id = instance._loaded_category_id
+    except AttributeError:
+        instance._previous_category_id = (
+            Product.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Product)
+def update_category_product_count_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        Category.objects.adjust_product_counts({instance.category_id: 1})
+        return
+    previous = getattr(instance, '_previous_category_id', None)
+    if previous is not None and previous != instance.category_id:
+        Category.objects.adjust_product_counts({previous: -1, instance.category_id: 1})
+
+
+@receiver(post_delete, sender=Product)
+def update_category_product_count_on_delete(sender, instance, **kwargs):
+    Category.objects.adjust_product_counts({instance.category_id: -1})
+
+
+@receiver(post_save, sender=Product)
+def refresh_top_products_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not RANKING_FIELDS.intersection(update_fields):
+        return
+
+    # The entry's category is the old one when the product was reassigned.
+    category_ids = {instance.category_id}
+    category_ids.update(
+        TopProduct.objects.filter(product_id=instance.pk).values_list('category_id', flat=True)
+    )
+    TopProduct.objects.refresh(category_ids)
+
+
+@receiver(post_delete, sender=Product)
+def refresh_top_products_on_delete(sender, instance, **kwargs):
+    TopProduct.objects.refresh({instance.category_id})
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_responses(sender, raw=False, **kwargs):
+    if not raw:
+        invalidate_catalog()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def discard_product_fragments(sender, instance, **kwargs):
+    discard_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def discard_category_fragments(sender, instance, **kwargs):
+    discard_categories([instance.pk])
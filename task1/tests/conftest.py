@@ -0,0 +1,10 @@
+import pytest
+from django.core.cache import caches
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # The database is rolled back between tests but the caches are not.
+    for cache in caches.all():
+        cache.clear()
+    yield
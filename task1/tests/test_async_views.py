@@ -0,0 +1,79 @@
+import json
+from decimal import Decimal
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework.test import APIClient
+from task1.factories import CategoryFactory, ProductFactory
+from task1.models import Product
+
+
+@pytest.fixture
+def catalog():
+    categories = CategoryFactory.create_batch(3)
+    return [
+        ProductFactory(category=category, price=Decimal('100.00') + i * Decimal('10.00'))
+        for category in categories
+        for i in range(12)
+    ]
+
+
+@pytest.mark.django_db
+class TestAsyncProductViews:
+
+    @pytest.mark.parametrize('name, query', [
+        ('list', {}),
+        ('list', {'page': 2, 'page_size': 7}),
+        ('list', {'min_price': '150', 'max_price': '200'}),
+        ('top-10-most-expensive', {'max_price': '150'}),
+        ('top-most-expensive-by-category', {}),
+        ('top-10-most-expensive', {'page': 3}),
+        ('products-with-category-counts', {'page_size': 50}),
+    ])
+    def test_matches_sync_endpoint(self, client, catalog, name, query):
+        expected = APIClient().get(reverse(f'product-{name}'), query).json()
+        expected_links = [expected.pop('next'), expected.pop('previous')]
+
+        response = client.get(reverse(f'async-product-{name}'), query)
+        assert response.status_code == 200
+        data = response.json()
+        links = [data.pop('next'), data.pop('previous')]
+        assert data == expected
+        assert [link and link.replace('/async', '') for link in links] == expected_links
+
+    def test_page_size_is_capped_like_the_sync_endpoint(self, client, db):
+        category = CategoryFactory()
+        Product.objects.bulk_create(
+            Product(name=f'Bulk {i}', category=category, price=Decimal('1.00')) for i in range(1001)
+        )
+        query = {'page_size': 5000}
+        expected = APIClient().get(reverse('product-list'), query).json()
+        data = client.get(reverse('async-product-list'), query).json()
+
+        assert len(data['results']) == len(expected['results']) == 1000
+        assert data['results'] == expected['results']
+
+    def test_detail(self, client, catalog):
+        product = catalog[0]
+        response = client.get(reverse('async-product-detail', args=[product.pk]))
+        assert response.json() == APIClient().get(reverse('product-detail', args=[product.pk])).json()
+
+    def test_missing_product_is_404(self, client, db):
+        response = client.get(reverse('async-product-detail', args=[999]))
+        assert response.status_code == 404
+        assert response.json() == {'detail': 'No Product matches the given query.'}
+
+    def test_invalid_page_is_404(self, client, catalog):
+        response = client.get(reverse('async-product-list'), {'page': 99})
+        assert response.status_code == 404
+        assert response.json() == {'detail': 'Invalid page.'}
+
+    def test_rejects_writes(self, client, db):
+        assert client.post(reverse('async-product-list')).status_code == 405
+
+    def test_served_by_async_client(self, catalog):
+        response = async_to_sync(AsyncClient().get)(reverse('async-product-list'))
+        assert response.status_code == 200
+        assert json.loads(response.content)['count'] == len(catalog)
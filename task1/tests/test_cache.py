@@ -0,0 +1,106 @@
+import pytest
+from decimal import Decimal
+from django.db.models import F
+from django.urls import reverse
+from task1.factories import CategoryFactory, ProductFactory
+from task1.models import CatalogVersion, Product
+
+ENDPOINTS = [
+    "product-list",
+    "product-top-most-expensive-by-category",
+    "product-top-10-most-expensive",
+    "product-products-with-category-counts",
+]
+
+
+@pytest.fixture
+def products():
+    category = CategoryFactory()
+    return ProductFactory.create_batch(12, category=category, price=Decimal("10.00"))
+
+
+@pytest.fixture(params=['locmem', 'filebased'])
+def cache_backend(request, settings, tmp_path):
+    if request.param == 'filebased':
+        settings.CACHES = {
+            'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': str(tmp_path),
+            }
+        }
+    return request.param
+
+
+@pytest.mark.django_db
+class TestCatalogResponseCache:
+
+    @pytest.mark.parametrize("endpoint", ENDPOINTS)
+    def test_repeated_request_is_served_from_cache(
+        self, api_client, products, cache_backend, endpoint, django_assert_num_queries
+    ):
+        url = reverse(endpoint)
+        first = api_client.get(url)
+        assert first.status_code == 200
+        assert first['ETag']
+        assert first['Last-Modified']
+
+        # Only the catalog version is read.
+        with django_assert_num_queries(1):
+            second = api_client.get(url)
+        assert second.data == first.data
+        assert second['ETag'] == first['ETag']
+
+    def test_if_none_match_returns_304(self, api_client, products, cache_backend):
+        url = reverse("product-list")
+        etag = api_client.get(url)['ETag']
+
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        assert response['ETag'] == etag
+        assert not response.content
+
+    def test_query_string_is_part_of_the_key(self, api_client, products, cache_backend):
+        url = reverse("product-list")
+        page_1 = api_client.get(url, {'page_size': 5})
+        page_2 = api_client.get(url, {'page_size': 5, 'page': 2})
+        assert page_1['ETag'] != page_2['ETag']
+        assert page_1.data['results'] != page_2.data['results']
+
+    def test_product_write_invalidates(self, api_client, products, cache_backend):
+        url = reverse("product-list")
+        first = api_client.get(url)
+
+        product = Product.objects.get(pk=products[0].pk)
+        product.name = "Renamed product"
+        product.save()
+
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        assert response.status_code == 200
+        assert response['ETag'] != first['ETag']
+        assert "Renamed product" in [p['name'] for p in response.data['results']]
+
+    def test_writes_of_other_processes_invalidate(self, api_client, products, cache_backend):
+        url = reverse("product-list")
+        etag = api_client.get(url)['ETag']
+
+        # Another worker or a management command bumps the shared row.
+        CatalogVersion.objects.update(version=F('version') + 1)
+
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response['ETag'] != etag
+
+    def test_bulk_update_and_category_write_invalidate(self, api_client, products, cache_backend):
+        url = reverse("product-top-10-most-expensive")
+        etag = api_client.get(url)['ETag']
+
+        Product.objects.all().update(price=Decimal("20.00"))
+        response = api_client.get(url)
+        assert response['ETag'] != etag
+        assert {p['price'] for p in response.data['results']} == {"20.00"}
+
+        category = products[0].category
+        category.name = "Renamed category"
+        category.save()
+        response = api_client.get(url)
+        assert {p['category'] for p in response.data['results']} == {"Renamed category"}
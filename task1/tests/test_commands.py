@@ -0,0 +1,174 @@
+import pytest
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from task1.models import Category, Product, TopProduct
+
+
+def generate(**options):
+    out = StringIO()
+    call_command('generate_data', stdout=out, **options)
+    return out.getvalue()
+
+
+@pytest.mark.django_db
+class TestGenerateData:
+
+    def test_defaults_create_a_small_catalog(self):
+        output = generate()
+        assert Category.objects.count() == 5
+        assert Product.objects.count() == 100
+        assert 'rows/s' in output
+
+    def test_read_models_are_consistent_after_bulk_load(self):
+        generate(categories=4, products=230, batch_size=50)
+        for category in Category.objects.all():
+            assert category.product_count == category.products.count()
+            assert TopProduct.objects.filter(category=category).count() == min(10, category.product_count)
+
+    @pytest.mark.parametrize("distribution", ['uniform', 'lognormal', 'pareto'])
+    def test_prices_stay_in_range(self, distribution):
+        generate(products=300, price_distribution=distribution, min_price=5, max_price=50)
+        prices = Product.objects.values_list('price', flat=True)
+        assert all(Decimal("5.00") <= price <= Decimal("50.00") for price in prices)
+
+    def test_seed_makes_catalogs_reproducible(self):
+        generate(products=120, seed=7, batch_size=40)
+        first = list(Product.objects.order_by('id').values_list('name', 'price'))
+        Product.objects.all().delete()
+
+        generate(products=120, seed=7, batch_size=40)
+        assert list(Product.objects.order_by('id').values_list('name', 'price')) == first
+
+    @pytest.mark.parametrize('returncode, error', [
+        (2, 'Locust exited with 2'), (0, 'wrote no statistics'),
+    ])
+    def test_failed_locust_runs_never_use_stale_stats(self, tmp_path, monkeypatch, returncode, error):
+        from task1.management.commands import loadtest
+        stale = tmp_path / 'loadtest_stats.csv'
+        stale.write_text(LOCUST_STATS)
+        monkeypatch.setattr(
+            loadtest.subprocess, 'run',
+            lambda command, **kwargs: loadtest.subprocess.CompletedProcess(command, returncode),
+        )
+        options = {
+            'output_dir': tmp_path, 'seed': 0, 'throughput': None, 'categories': None,
+            'locustfile': loadtest.LOCUSTFILES, 'users': 1, 'spawn_rate': 1, 'run_time': '1s',
+        }
+        with pytest.raises(CommandError, match=error):
+            loadtest.Command(stdout=StringIO()).run_locust(['locust'], 'http://127.0.0.1:1', options)
+        assert not stale.exists()
+
+    def test_rejects_invalid_options(self):
+        with pytest.raises(CommandError):
+            generate(min_price=10, max_price=1)
+
+
+@pytest.mark.django_db
+class TestBenchmarkTopN:
+
+    def test_reports_both_strategies_and_rolls_back(self):
+        out = StringIO()
+        call_command('benchmark_top_n', products=200, categories=[2, 100], repeat=1, stdout=out)
+        lines = out.getvalue().splitlines()
+        assert lines[0] == "200 products, n=10"
+        assert [line.split()[0] for line in lines[2:4]] == ['2', '100']
+        assert not Category.objects.exists()
+        assert not Product.objects.exists()
+
+    def test_refuses_to_run_over_an_existing_catalog(self):
+        Category.objects.create(name="Kept")
+        with pytest.raises(CommandError, match='empty'):
+            call_command('benchmark_top_n', products=200, categories=[2], repeat=1, stdout=StringIO())
+        assert list(Category.objects.values_list('name', flat=True)) == ["Kept"]
+
+
+class TestBenchmarkSqliteProfiles:
+
+    def test_reports_every_profile_and_connection_mode(self, django_db_blocker):
+        out = StringIO()
+        # The command only touches its own temporary databases.
+        with django_db_blocker.unblock():
+            call_command('benchmark_sqlite_profiles', products=200, readers=1, writers=1, seconds=0.2,
+                         stdout=out)
+        rows = [line.split()[:2] for line in out.getvalue().splitlines()[2:]]
+        assert rows == [
+            ['default', 'persistent'], ['default', 'per'], ['tuned', 'persistent'], ['tuned', 'per'],
+        ]
+
+
+LOCUST_STATS = """Type,Name,Request Count,Failure Count,Median Response Time,Average Response Time,Min Response Time,Max Response Time,Average Content Size,Requests/s,Failures/s,50%,66%,75%,80%,90%,95%,98%,99%,99.9%,99.99%,100%
+GET,product-list,200,0,12,14.2,3,90,2100,40.1,0.0,12,15,17,19,25,31,45,60,88,90,90
+POST,user-create,50,2,30,35.0,10,400,300,10.0,0.4,30,33,40,44,60,120,300,390,400,400,400
+GET,user-list,0,0,0,0.0,0,0,0,0.0,0.0,N/A,N/A,N/A,N/A,N/A,N/A,N/A,N/A,N/A,N/A,N/A
+,Aggregated,250,2,14,18.4,3,400,1740,50.1,0.4,14,17,20,23,33,60,150,300,400,400,400
+"""
+
+
+class TestLoadtest:
+
+    @pytest.fixture
+    def stats(self, tmp_path):
+        from task1.management.commands.loadtest import read_locust_stats
+        path = tmp_path / 'loadtest_stats.csv'
+        path.write_text(LOCUST_STATS)
+        return read_locust_stats(path)
+
+    def test_reads_locust_stats(self, stats):
+        assert set(stats) == {'product-list', 'user-create', 'user-list', 'Aggregated'}
+        assert stats['user-create'] == {
+            'requests': 50, 'failures': 2, 'failure_ratio': 0.04, 'rps': 10.0,
+            'p50_ms': 30.0, 'p90_ms': 60.0, 'p95_ms': 120.0, 'p99_ms': 390.0,
+        }
+        assert stats['user-list']['p95_ms'] is None
+
+    def test_reports_every_missed_slo(self, stats):
+        from task1.management.commands.loadtest import slo_violations
+        slos = {
+            'aggregate': {'p99_ms': 500, 'max_failure_ratio': 0.01, 'min_rps': 10},
+            'endpoints': {
+                'product-list': {'p50_ms': 20, 'p95_ms': 50, 'max_failure_ratio': 0},
+                'user-create': {'p95_ms': 100, 'max_failure_ratio': 0.01},
+                'user-list': {'p95_ms': 100},
+            },
+        }
+        assert slo_violations(stats, slos) == [
+            'user-create: p95_ms 120 > 100',
+            'user-create: failure ratio 4.00% > 1.00%',
+            'user-list: no requests were made',
+        ]
+
+    def test_met_slos_report_nothing(self, stats):
+        from task1.management.commands.loadtest import slo_violations
+        assert slo_violations(stats, {'aggregate': {'p95_ms': 60}, 'endpoints': {'product-list': {'p99_ms': 60}}}) == []
+
+    def test_unknown_slos_are_rejected(self, stats):
+        from task1.management.commands.loadtest import slo_violations
+        with pytest.raises(CommandError, match='p42_ms'):
+            slo_violations(stats, {'aggregate': {'p42_ms': 1}})
+
+    @pytest.mark.parametrize('returncode, error', [
+        (2, 'Locust exited with 2'), (0, 'wrote no statistics'),
+    ])
+    def test_failed_locust_runs_never_use_stale_stats(self, tmp_path, monkeypatch, returncode, error):
+        from task1.management.commands import loadtest
+        stale = tmp_path / 'loadtest_stats.csv'
+        stale.write_text(LOCUST_STATS)
+        monkeypatch.setattr(
+            loadtest.subprocess, 'run',
+            lambda command, **kwargs: loadtest.subprocess.CompletedProcess(command, returncode),
+        )
+        options = {
+            'output_dir': tmp_path, 'seed': 0, 'throughput': None, 'categories': None,
+            'locustfile': loadtest.LOCUSTFILES, 'users': 1, 'spawn_rate': 1, 'run_time': '1s',
+        }
+        with pytest.raises(CommandError, match=error):
+            loadtest.Command(stdout=StringIO()).run_locust(['locust'], 'http://127.0.0.1:1', options)
+        assert not stale.exists()
+
+    def test_rejects_invalid_options(self):
+        with pytest.raises(CommandError, match='must be positive'):
+            call_command('loadtest', users=0)
+        with pytest.raises(CommandError, match='does not exist'):
+            call_command('loadtest', slo='missing.json')
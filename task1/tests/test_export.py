@@ -0,0 +1,57 @@
+import csv
+import io
+import json
+import pytest
+from decimal import Decimal
+from django.urls import reverse
+from task1.factories import CategoryFactory, ProductFactory
+
+
+@pytest.fixture
+def catalog():
+    categories = CategoryFactory.create_batch(2)
+    for category in categories:
+        for i in range(5):
+            ProductFactory(category=category, price=Decimal("10.00") * (i + 1))
+    return categories
+
+
+def stream(response):
+    assert response.streaming
+    return b''.join(response.streaming_content).decode()
+
+
+@pytest.mark.django_db
+class TestProductExport:
+
+    def test_ndjson_streams_every_product(self, api_client, catalog):
+        response = api_client.get(reverse("product-export"))
+        assert response.status_code == 200
+        assert response['Content-Type'].startswith('application/x-ndjson')
+
+        rows = [json.loads(line) for line in stream(response).splitlines()]
+        assert len(rows) == 10
+        assert [row['id'] for row in rows] == sorted(row['id'] for row in rows)
+        assert set(rows[0]) == {'id', 'name', 'category', 'price', 'created_at', 'category_product_count'}
+
+    def test_csv_export(self, api_client, catalog):
+        response = api_client.get(reverse("product-export"), {'format': 'csv'})
+        assert response['Content-Type'].startswith('text/csv')
+        assert 'products.csv' in response['Content-Disposition']
+
+        rows = list(csv.DictReader(io.StringIO(stream(response))))
+        assert len(rows) == 10
+        assert rows[0]['category_product_count'] == '5'
+
+    def test_filters(self, api_client, catalog):
+        response = api_client.get(reverse("product-export"), {
+            'category': catalog[0].pk, 'min_price': '20', 'max_price': '40.00',
+        })
+        rows = [json.loads(line) for line in stream(response).splitlines()]
+        assert sorted(row['price'] for row in rows) == ['20.00', '30.00', '40.00']
+        assert {row['category'] for row in rows} == {catalog[0].name}
+
+    def test_invalid_filter_returns_400(self, api_client, catalog):
+        response = api_client.get(reverse("product-export"), {'min_price': '50', 'max_price': '10'})
+        assert response.status_code == 400
+        assert 'min_price' in json.loads(response.content.decode())
@@ -0,0 +1,154 @@
+import itertools
+import re
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from task1.factories import CategoryFactory, ProductFactory
+from task1.models import Product
+
+FILTERS = {
+    'category': None,
+    'min_price': '120.00',
+    'max_price': '180.00',
+    'created_after': None,
+    'created_before': None,
+}
+FILTERED_ENDPOINTS = [
+    'product-list',
+    'product-top-most-expensive-by-category',
+    'product-top-10-most-expensive',
+    'product-products-with-category-counts',
+    'product-export',
+]
+# The category table is small and walked on purpose by the per-category
+# top-N plan; the product tables must always be searched.
+TABLE_SCAN = re.compile(r'^SCAN task1_(product|topproduct)\b')
+
+
+@pytest.fixture
+def catalog():
+    now = timezone.now()
+    categories = CategoryFactory.create_batch(2)
+    for category in categories:
+        for i in range(15):
+            product = ProductFactory(category=category, price=Decimal("100.00") + i * Decimal("10.00"))
+            # created_at is auto_now_add, so it can only be backdated afterwards.
+            Product.objects.filter(pk=product.pk).update(created_at=now - timedelta(days=i))
+    return categories, now
+
+
+def results(response):
+    assert response.status_code == 200, response.data
+    return response.data['results']
+
+
+def full_scans(queries):
+    scans = []
+    with connection.cursor() as cursor:
+        for query in queries:
+            if not query['sql'].startswith('SELECT'):
+                continue
+            cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+            scans += [detail for *_, detail in cursor.fetchall() if TABLE_SCAN.match(detail)]
+    return scans
+
+
+@pytest.mark.django_db
+class TestProductFilters:
+
+    def test_category_and_price_range(self, api_client, catalog):
+        categories, _ = catalog
+        rows = results(api_client.get(reverse('product-list'), {
+            'category': categories[0].pk, 'min_price': '120', 'max_price': '150', 'page_size': 100,
+        }))
+        assert sorted(Decimal(row['price']) for row in rows) == [
+            Decimal('120.00'), Decimal('130.00'), Decimal('140.00'), Decimal('150.00')
+        ]
+        assert {row['category'] for row in rows} == {categories[0].name}
+
+    def test_open_ranges(self, api_client, catalog):
+        _, now = catalog
+        rows = results(api_client.get(reverse('product-list'), {'min_price': '230', 'page_size': 100}))
+        assert len(rows) == 4
+        rows = results(api_client.get(reverse('product-list'), {
+            'created_after': (now - timedelta(days=2, hours=1)).isoformat(), 'page_size': 100,
+        }))
+        assert len(rows) == 6
+
+    def test_created_range(self, api_client, catalog):
+        _, now = catalog
+        rows = results(api_client.get(reverse('product-list'), {
+            'created_after': (now - timedelta(days=5, hours=1)).isoformat(),
+            'created_before': (now - timedelta(days=3, hours=1)).isoformat(),
+            'page_size': 100,
+        }))
+        assert sorted(Decimal(row['price']) for row in rows) == [Decimal('140.00')] * 2 + [Decimal('150.00')] * 2
+
+    @pytest.mark.parametrize('params', [
+        {'category': 'shoes'},
+        {'min_price': 'cheap'},
+        {'min_price': '20', 'max_price': '10'},
+        {'created_after': 'yesterday'},
+        {'created_after': '2025-02-01T00:00', 'created_before': '2025-01-01T00:00'},
+    ])
+    def test_invalid_filters_are_rejected(self, api_client, catalog, params):
+        for endpoint in FILTERED_ENDPOINTS[:-1]:
+            assert api_client.get(reverse(endpoint), params).status_code == 400
+
+    def test_top_n_ranks_within_the_filtered_products(self, api_client, catalog):
+        categories, _ = catalog
+        rows = results(api_client.get(reverse('product-top-most-expensive-by-category'), {
+            'max_price': '150', 'page_size': 100,
+        }))
+        # The six cheapest products of each category, none of which is in
+        # the unfiltered top 10.
+        assert len(rows) == 12
+        assert max(Decimal(row['price']) for row in rows) == Decimal('150.00')
+
+    def test_top_n_with_only_a_category_uses_the_read_model(self, api_client, catalog):
+        categories, _ = catalog
+        with CaptureQueriesContext(connection) as queries:
+            rows = results(api_client.get(reverse('product-top-10-most-expensive'), {
+                'category': categories[1].pk, 'page_size': 100,
+            }))
+        assert [row['price'] for row in rows] == [f'{240 - 10 * i}.00' for i in range(10)]
+        assert any('task1_topproduct' in query['sql'] for query in queries)
+        assert not any('ROW_NUMBER' in query['sql'] for query in queries)
+
+    def test_top_n_and_list_are_filtered_consistently(self, api_client, catalog):
+        params = {'min_price': '200', 'page_size': 100}
+        listed = {row['id'] for row in results(api_client.get(reverse('product-list'), params))}
+        top = {row['id'] for row in results(api_client.get(reverse('product-top-10-most-expensive'), params))}
+        assert listed == top == set(Product.objects.filter(price__gte=200).values_list('id', flat=True))
+
+
+@pytest.mark.django_db
+class TestFilterQueryPlans:
+    """Every filter combination is answered through an index, never a full scan."""
+
+    @pytest.mark.parametrize('endpoint', FILTERED_ENDPOINTS)
+    @pytest.mark.parametrize('cursor', [False, True])
+    def test_no_full_table_scan(self, api_client, catalog, endpoint, cursor):
+        categories, now = catalog
+        values = dict(
+            FILTERS,
+            category=categories[0].pk,
+            created_after=(now - timedelta(days=7)).isoformat(),
+            created_before=(now - timedelta(days=1)).isoformat(),
+        )
+        for size in range(1, len(values) + 1):
+            for names in itertools.combinations(values, size):
+                params = {name: values[name] for name in names}
+                if cursor:
+                    params['cursor'] = ''
+                with CaptureQueriesContext(connection) as queries:
+                    response = api_client.get(reverse(endpoint), params)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                assert response.status_code == 200
+                assert full_scans(queries) == [], names
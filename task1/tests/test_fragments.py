@@ -0,0 +1,152 @@
+import pickle
+from collections import namedtuple
+
+import pytest
+from decimal import Decimal
+from django.core.cache import caches
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from task1.factories import CategoryFactory, ProductFactory
+from task1.fragments import ENTRY_OVERHEAD, EncodedRows, FragmentCache, get_fragment_cache
+from task1.models import Product
+from task1.renderers import FragmentJSONRenderer
+from task1.serializers import ProductRowFormatter, ProductSerializer
+
+
+@pytest.fixture(autouse=True)
+def fragment_cache():
+    cache = get_fragment_cache()
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+@pytest.fixture
+def products():
+    shoes = CategoryFactory(name='Shoes   "quoted"')
+    return [ProductFactory(name=f'Shoe {i}', category=shoes, price=Decimal(10 + i)) for i in range(3)]
+
+
+def product_list(api_client, **params):
+    return api_client.get(reverse('product-list'), params)
+
+
+def encode(queryset=None):
+    formatter = ProductRowFormatter()
+    return formatter.encode(formatter.values_list(queryset or Product.objects.order_by('id')))
+
+
+@pytest.mark.django_db
+class TestFragmentRendering:
+
+    def test_pages_are_byte_identical_to_the_json_renderer(self, api_client, products):
+        response = product_list(api_client)
+        queryset = Product.objects.select_related('category').order_by('id')
+        expected = JSONRenderer().render(ProductSerializer(queryset, many=True).data)
+
+        assert response.content.startswith(b'{"count":3,')
+        assert expected in response.content
+
+    def test_unchanged_rows_are_served_from_the_cache(self, fragment_cache, products):
+        first = encode()
+        hits = fragment_cache.stats['hits']
+        second = encode()
+
+        assert fragment_cache.stats['hits'] == hits + 3
+        assert second == first
+        assert [row['name'] for row in second] == ['Shoe 0', 'Shoe 1', 'Shoe 2']
+
+    def test_rows_changed_elsewhere_are_encoded_again(self, products):
+        encode()
+        # update() sends no signal, as with a write from another process.
+        Product.objects.filter(pk=products[0].pk).update(name='Boot')
+        assert encode()[0]['name'] == 'Boot'
+
+    def test_selections_and_timezones_are_cached_apart(self, products):
+        formatter = ProductRowFormatter().select(['id', 'created_at'])
+        rows = formatter.values_list(Product.objects.order_by('id'))
+        utc = formatter.encode(rows)[0]['created_at']
+        with timezone.override('Africa/Cairo'):
+            cairo = formatter.encode(rows)[0]
+
+        assert list(cairo) == ['id', 'created_at']
+        assert cairo['created_at'] != utc
+
+    def test_indented_output_renders_the_rows(self, api_client, products):
+        rows = encode()
+        indented = FragmentJSONRenderer().render({'results': rows}, 'application/json; indent=2')
+        assert indented == JSONRenderer().render({'results': list(rows)}, 'application/json; indent=2')
+        assert b'Shoe 0' in api_client.get(reverse('product-list'), HTTP_ACCEPT='text/html').content
+
+    def test_cached_responses_keep_their_fragments(self, products):
+        rows = encode()
+        restored = pickle.loads(pickle.dumps(rows))
+        assert isinstance(restored, EncodedRows)
+        assert restored.render() == rows.render()
+
+    def test_disabled_cache_renders_the_same(self, api_client, products, settings):
+        enabled = product_list(api_client).content
+        caches['default'].clear()
+        settings.TASK1_FRAGMENT_CACHE_BYTES = 0
+
+        assert get_fragment_cache() is None
+        assert product_list(api_client).content == enabled
+
+
+@pytest.mark.django_db
+class TestInvalidation:
+
+    def test_product_saves_and_deletes_evict_their_fragments(self, fragment_cache, products):
+        encode()
+        products[0].name = 'Boot'
+        products[0].save()
+        assert len(fragment_cache) == 2
+
+        products[1].delete()
+        assert len(fragment_cache) == 1
+
+    def test_category_saves_evict_its_products(self, fragment_cache, products):
+        encode()
+        ProductFactory(category=CategoryFactory(name='Hats'))
+        encode()
+        assert len(fragment_cache) == 4
+
+        category = products[0].category
+        category.name = 'Sneakers'
+        category.save()
+
+        assert len(fragment_cache) == 1
+        assert {row['category'] for row in encode()} == {'Sneakers', 'Hats'}
+
+
+def test_least_recently_used_fragments_are_evicted_over_the_budget():
+    cache = FragmentCache(max_bytes=3 * (ENTRY_OVERHEAD + 2))
+    cache.set_many([(key, key, b'{}') for key in 'abc'])
+    # Reading `a` makes `b` the least recently used.
+    cache.get_many([('a', 'a')])
+    cache.set_many([('d', 'd', b'{}')])
+
+    assert cache.get_many([(key, key) for key in 'abcd']) == [b'{}', None, b'{}', b'{}']
+    assert cache.size <= cache.max_bytes
+    assert cache.stats['evictions'] == 1
+
+
+def test_fragments_over_the_budget_are_not_stored():
+    cache = FragmentCache(max_bytes=ENTRY_OVERHEAD)
+    cache.set_many([('a', 'a', b'{"name":"too big"}')])
+    assert len(cache) == 0 and cache.size == 0
+
+
+def test_discards_only_touch_the_indexed_entries():
+    Row = namedtuple('Row', ['id', 'category_id'])
+    cache = FragmentCache(max_bytes=10 * (ENTRY_OVERHEAD + 2))
+    cache.set_many([(('ns', pk), Row(pk, pk % 2), b'{}') for pk in range(12)])
+    assert len(cache) == 10
+
+    cache.discard([('product', 5)])
+    cache.discard([('category', 0)])
+
+    assert sorted(key[-1] for key in cache._entries) == [3, 7, 9, 11]
+    # Evicted and discarded entries leave nothing behind in the index.
+    assert set(cache._tagged) == {('product', pk) for pk in (3, 7, 9, 11)} | {('category', 1)}
@@ -0,0 +1,216 @@
+import pytest
+from io import StringIO
+from decimal import Decimal
+from django.core.management import call_command
+from task1.factories import CategoryFactory, ProductFactory
+from task1.models import Category, Product, TopProduct
+
+
+def top_ids(category):
+    return list(
+        TopProduct.objects.filter(category=category)
+        .order_by('-price', 'product_id')
+        .values_list('product_id', flat=True)
+    )
+
+
+def expected_top_ids(category):
+    return list(
+        Product.objects.filter(category=category)
+        .order_by('-price', 'id')
+        .values_list('id', flat=True)[:TopProduct.DEPTH]
+    )
+
+
+@pytest.fixture
+def category():
+    category = CategoryFactory()
+    for i in range(15):
+        ProductFactory(category=category, price=Decimal("100.00") + i * Decimal("10.00"))
+    return category
+
+
+@pytest.mark.django_db
+class TestTopProductReadModel:
+
+    def test_insert_keeps_top_n(self, category):
+        assert len(top_ids(category)) == TopProduct.DEPTH
+        product = ProductFactory(category=category, price=Decimal("999.00"))
+        assert top_ids(category)[0] == product.pk
+        assert top_ids(category) == expected_top_ids(category)
+
+    def test_price_drop_promotes_next_product(self, category):
+        product = Product.objects.get(pk=top_ids(category)[0])
+        product.price = Decimal("1.00")
+        product.save()
+        assert product.pk not in top_ids(category)
+        assert top_ids(category) == expected_top_ids(category)
+
+    def test_delete_refills_category(self, category):
+        Product.objects.get(pk=top_ids(category)[0]).delete()
+        assert len(top_ids(category)) == TopProduct.DEPTH
+        assert top_ids(category) == expected_top_ids(category)
+
+    def test_category_reassignment_updates_both_categories(self, category):
+        other = CategoryFactory()
+        product = Product.objects.get(pk=top_ids(category)[0])
+        product.category = other
+        product.save()
+        assert top_ids(other) == [product.pk]
+        assert top_ids(category) == expected_top_ids(category)
+
+    def test_moving_a_top_product_into_an_older_category(self, category):
+        # A lower id: its entries are refreshed first.
+        older = Category.objects.create(id=category.pk - 1, name='Older', description='Older')
+        product = Product.objects.get(pk=top_ids(category)[0])
+
+        product.category = older
+        product.save()
+        assert top_ids(older) == [product.pk]
+        assert top_ids(category) == expected_top_ids(category)
+
+        moved = top_ids(category)[:2]
+        Product.objects.filter(pk__in=moved).update(category=older)
+        assert top_ids(older) == expected_top_ids(older)
+        assert set(moved) < set(top_ids(older))
+        assert top_ids(category) == expected_top_ids(category)
+
+    def test_bulk_create_and_update(self, category):
+        Product.objects.bulk_create([
+            Product(name=f"Bulk {i}", category=category, price=Decimal("500.00") + i)
+            for i in range(3)
+        ])
+        assert top_ids(category) == expected_top_ids(category)
+
+        Product.objects.filter(price__gte=Decimal("500.00")).update(price=Decimal("5.00"))
+        assert top_ids(category) == expected_top_ids(category)
+
+    def test_rebuild_command_repairs_the_table(self, category):
+        TopProduct.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_top_products', stdout=out)
+        assert '10 entries' in out.getvalue()
+        assert top_ids(category) == expected_top_ids(category)
+
+
+def product_count(category):
+    return Category.objects.values_list('product_count', flat=True).get(pk=category.pk)
+
+
+@pytest.mark.django_db
+class TestCategoryProductCount:
+
+    def test_create_and_delete(self, category):
+        assert product_count(category) == 15
+        ProductFactory(category=category)
+        assert product_count(category) == 16
+        Product.objects.filter(category=category)[0].delete()
+        assert product_count(category) == 15
+
+    def test_reassignment_moves_the_count(self, category):
+        other = CategoryFactory()
+        product = Product.objects.filter(category=category).first()
+        product.category = other
+        product.save()
+        assert product_count(category) == 14
+        assert product_count(other) == 1
+
+        product.name = "Renamed"
+        product.save()
+        assert product_count(other) == 1
+
+    def test_saving_a_stale_category_keeps_the_count(self, category):
+        stale = Category.objects.get(pk=category.pk)
+        ProductFactory(category=category)
+        stale.description = "Edited"
+        stale.save()
+        assert product_count(category) == 16
+        assert Category.objects.get(pk=category.pk).description == "Edited"
+
+        stale.product_count = 0
+        stale.save(update_fields=['name', 'product_count'])
+        assert product_count(category) == 16
+
+    def test_bulk_operations(self, category):
+        other = CategoryFactory()
+        Product.objects.bulk_create([
+            Product(name=f"Bulk {i}", category=other, price=Decimal("1.00")) for i in range(4)
+        ])
+        assert product_count(other) == 4
+
+        Product.objects.filter(category=category, price__lt=Decimal("150.00")).update(category=other)
+        assert product_count(category) == 10
+        assert product_count(other) == 9
+
+        Product.objects.filter(category=other).delete()
+        assert product_count(other) == 0
+
+    def test_bulk_create_conflicts_are_not_counted(self, category):
+        other = CategoryFactory()
+        existing = Product.objects.filter(category=category).first()
+        duplicate = Product(pk=existing.pk, name="Dup", category=other, price=Decimal("1.00"))
+        Product.objects.bulk_create([duplicate, Product(name="New", category=other, price=Decimal("1.00"))],
+                                    ignore_conflicts=True)
+        assert product_count(other) == 1
+
+        Product.objects.bulk_create([duplicate], update_conflicts=True,
+                                    update_fields=['category'], unique_fields=['id'])
+        assert product_count(category) == 14
+        assert product_count(other) == 2
+        assert not TopProduct.objects.filter(category=category, product_id=existing.pk).exists()
+
+    def test_reconcile_command_repairs_drift(self, category):
+        Category.objects.filter(pk=category.pk).update(product_count=3)
+        out = StringIO()
+        call_command('reconcile_category_counts', stdout=out)
+        assert 'Repaired 1 categories' in out.getvalue()
+        assert product_count(category) == 15
+
+
+@pytest.fixture
+def catalog():
+    categories = CategoryFactory.create_batch(3)
+    for index, category in enumerate(categories):
+        for i in range(12 + index):
+            ProductFactory(category=category, price=Decimal("100.00") + (i % 7) * Decimal("10.00"))
+    return categories
+
+
+def expected_top(n, **filters):
+    ids = []
+    for category in Category.objects.all():
+        ids += (
+            Product.objects.filter(category=category, **filters)
+            .order_by('-price', 'id').values_list('id', flat=True)[:n]
+        )
+    return sorted(ids)
+
+
+def top(n=None, strategy=None, **filters):
+    return sorted(
+        Product.objects.top_per_category(n=n, strategy=strategy, **filters).values_list('id', flat=True)
+    )
+
+
+@pytest.mark.django_db
+class TestTopPerCategoryStrategies:
+
+    @pytest.mark.parametrize("strategy", [None, 'window', 'per_category'])
+    @pytest.mark.parametrize("n", [1, 3, 10, 13])
+    def test_strategies_agree(self, catalog, strategy, n):
+        assert top(n, strategy) == expected_top(n)
+        assert top(n, strategy, category_id=catalog[1].pk) == expected_top(n, category_id=catalog[1].pk)
+        assert top(n, strategy, price__lte=Decimal("130.00")) == expected_top(n, price__lte=Decimal("130.00"))
+
+    def test_auto_prefers_per_category_lookups_for_few_categories(self, catalog, settings):
+        settings.TASK1_TOP_N_LOOKUP_COST = 1
+        assert Product.objects.top_n_strategy(3, {}) == 'per_category'
+        # 3 categories x 20 lookups cost more than ranking 39 products.
+        assert Product.objects.top_n_strategy(20, {}) == 'window'
+
+    def test_auto_ranks_created_at_filters_with_a_window(self, catalog):
+        assert Product.objects.top_n_strategy(1, {'created_at__gte': catalog[0].products.first().created_at}) == 'window'
+
+    def test_strategy_setting_overrides_auto(self, catalog, settings):
+        settings.TASK1_TOP_N_STRATEGY = 'window'
+        assert Product.objects.top_n_strategy(1, {}) == 'window'
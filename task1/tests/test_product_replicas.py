@@ -0,0 +1,59 @@
+import pytest
+from django.db.models import QuerySet
+from django.urls import reverse
+from rest_framework.test import APIClient
+from task1.models import CatalogVersion, Category, Product
+
+DATABASES = ['default', 'replica_1', 'replica_2']
+
+
+@pytest.fixture
+def replicas(settings):
+    settings.DATABASE_REPLICAS = ['replica_1', 'replica_2']
+    settings.DATABASE_REPLICA_POLICY = 'least_loaded'
+    for alias in DATABASES:
+        category = Category.objects.using(alias).create(name=alias)
+        # A plain QuerySet, the read models are not needed here.
+        QuerySet(model=Product, using=alias).bulk_create([
+            Product(name=f'{alias} product', category=category, price=10),
+            Product(name=f'{alias} {alias}', category=category, price=20),
+        ])
+    return settings
+
+
+@pytest.mark.django_db(databases=DATABASES)
+class TestProductReplicaReads:
+
+    def test_list_and_detail_are_read_from_a_replica(self, replicas):
+        client = APIClient()
+        rows = client.get(reverse('product-list')).data['results']
+        assert [row['name'] for row in rows] == ['replica_1 product', 'replica_1 replica_1']
+
+        product = Product.objects.using('replica_1').first()
+        detail = client.get(reverse('product-detail', args=[product.pk]))
+        assert detail.data['category'] == 'replica_1'
+
+    def test_search_is_read_from_a_replica(self, replicas):
+        rows = APIClient().get(reverse('product-search'), {'q': 'replica_1'}).data['results']
+        assert [row['name'] for row in rows] == ['replica_1 replica_1', 'replica_1 product']
+
+    def test_lagging_replicas_cache_under_their_own_version(self, replicas):
+        for alias in DATABASES:
+            CatalogVersion.objects.using(alias).update_or_create(
+                pk=CatalogVersion.SINGLETON_ID, defaults={'version': 1, 'modified': 0},
+            )
+        client = APIClient()
+        assert client.get(reverse('product-list')).data['count'] == 2
+
+        # Written on the primary, not yet on the replicas.
+        Product.objects.create(name='new', category=Category.objects.get(name='default'), price=30)
+        lagging = client.get(reverse('product-list'))
+        assert lagging.data['count'] == 2
+
+        # The replica catches up, version included.
+        category = Category.objects.using('replica_1').get()
+        QuerySet(model=Product, using='replica_1').bulk_create([Product(name='new', category=category, price=30)])
+        CatalogVersion.objects.using('replica_1').update(version=2)
+        caught_up = client.get(reverse('product-list'))
+        assert caught_up.data['count'] == 3
+        assert caught_up['ETag'] != lagging['ETag']
@@ -0,0 +1,36 @@
+import pytest
+from decimal import Decimal
+from datetime import datetime, timezone
+from django.utils import timezone as django_timezone
+from rest_framework.renderers import JSONRenderer
+from task1.factories import CategoryFactory, ProductFactory
+from task1.models import Product
+from task1.serializers import ProductRowFormatter, ProductSerializer
+
+
+@pytest.mark.django_db
+class TestProductRowFormatter:
+
+    @pytest.mark.parametrize("active_timezone", ['UTC', 'Africa/Cairo'])
+    def test_output_is_byte_identical_to_product_serializer(self, active_timezone):
+        category = CategoryFactory(name="Café   \"quoted\"")
+        ProductFactory(category=category, price=Decimal("0.10"))
+        ProductFactory(category=category, price=Decimal("12345678.90"))
+        ProductFactory(category=category, price=Decimal("7"))
+        Product.objects.filter(pk=Product.objects.first().pk).update(
+            created_at=datetime(2024, 2, 29, 23, 59, 59, tzinfo=timezone.utc)
+        )
+        queryset = Product.objects.select_related('category').order_by('id')
+
+        formatter = ProductRowFormatter()
+        with django_timezone.override(active_timezone):
+            fast = formatter.format(formatter.values_list(queryset))
+            slow = ProductSerializer(queryset, many=True).data
+
+        renderer = JSONRenderer()
+        assert renderer.render(fast) == renderer.render(slow)
+
+    def test_rows_expose_keyset_columns(self):
+        product = ProductFactory()
+        row = ProductRowFormatter().values_list(Product.objects.all()).get()
+        assert (row.price, row.id, row.category_id) == (product.price, product.pk, product.category_id)
@@ -0,0 +1,144 @@
+import json
+from base64 import urlsafe_b64encode
+
+import pytest
+from decimal import Decimal
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from task1.factories import CategoryFactory, ProductFactory
+from task1.models import Product
+from task1.search import TABLE, match_expression
+
+
+@pytest.fixture
+def catalog():
+    shoes = CategoryFactory(name='Shoes', description='Footwear for running and hiking')
+    shirts = CategoryFactory(name='Shirts', description='Cotton tops')
+    ProductFactory(name='Trail running shoe', category=shoes, price=Decimal('90.00'))
+    ProductFactory(name='Leather boot', category=shoes, price=Decimal('150.00'))
+    ProductFactory(name='Running shirt', category=shirts, price=Decimal('30.00'))
+    ProductFactory(name='Linen shirt', category=shirts, price=Decimal('40.00'))
+    return shoes, shirts
+
+
+def search(api_client, q, **params):
+    response = api_client.get(reverse('product-search'), {'q': q, **params})
+    assert response.status_code == 200, response.data
+    return response.data
+
+
+def names(data):
+    return [row['name'] for row in data['results']]
+
+
+def indexed_rows():
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT rowid, name, category_description FROM {TABLE} ORDER BY rowid')
+        return cursor.fetchall()
+
+
+@pytest.mark.django_db
+class TestProductSearch:
+
+    def test_name_matches_rank_above_description_matches(self, api_client, catalog):
+        # "Leather boot" only matches through its category description.
+        assert names(search(api_client, 'running')) == [
+            'Running shirt', 'Trail running shoe', 'Leather boot'
+        ]
+
+    def test_every_word_must_match(self, api_client, catalog):
+        assert names(search(api_client, 'running shirt')) == ['Running shirt']
+
+    def test_prefix_query(self, api_client, catalog):
+        assert sorted(names(search(api_client, 'shi*'))) == ['Linen shirt', 'Running shirt']
+        assert names(search(api_client, 'shi')) == []
+
+    def test_results_are_rendered_like_the_list(self, api_client, catalog):
+        row = search(api_client, 'boot')['results'][0]
+        assert row['category'] == 'Shoes'
+        assert row['category_product_count'] == 2
+
+    def test_fts_syntax_in_the_query_is_not_interpreted(self, api_client, catalog):
+        assert names(search(api_client, 'boot OR "NEAR(')) == []
+
+    @pytest.mark.parametrize('q', ['', '***', '"()'])
+    def test_query_without_words_is_rejected(self, api_client, catalog, q):
+        response = api_client.get(reverse('product-search'), {'q': q})
+        assert response.status_code == 400
+        assert 'q' in response.data
+
+    def test_keyset_pages_cover_every_hit_once(self, api_client, db):
+        category = CategoryFactory(description='Widgets')
+        for i in range(25):
+            ProductFactory(name=f'Widget {"deluxe " * (i % 4)}{i}', category=category)
+        first = search(api_client, 'widget', page_size=10)
+        expected = names(search(api_client, 'widget', page_size=100))
+        assert len(expected) == 25
+
+        seen, data = [], first
+        while True:
+            seen += names(data)
+            if not data['next']:
+                break
+            data = api_client.get(data['next']).data
+        assert seen == expected
+
+        previous = api_client.get(data['previous']).data
+        assert names(previous) == expected[10:20]
+
+    def test_invalid_cursor_is_404(self, api_client, catalog):
+        response = api_client.get(reverse('product-search'), {'q': 'boot', 'cursor': 'nope'})
+        assert response.status_code == 404
+
+    @pytest.mark.parametrize('position', [[{'x': 1}, 1], ['-1.5', 1], [-1.5, '1'], [-1.5, True], [None, None]])
+    def test_tampered_cursor_values_are_404(self, api_client, catalog, position):
+        cursor = urlsafe_b64encode(json.dumps({'p': position}).encode()).decode()
+        response = api_client.get(reverse('product-search'), {'q': 'boot', 'cursor': cursor})
+        assert response.status_code == 404
+
+
+@pytest.mark.django_db
+class TestSearchIndexSync:
+
+    def test_index_follows_product_and_category_writes(self, catalog):
+        shoes, shirts = catalog
+        product = Product.objects.get(name='Leather boot')
+        product.name = 'Suede boot'
+        product.save()
+        assert (product.pk, 'Suede boot', shoes.description) in indexed_rows()
+
+        product.category = shirts
+        product.save()
+        assert (product.pk, 'Suede boot', shirts.description) in indexed_rows()
+
+        shirts.description = 'Tops and boots'
+        shirts.save()
+        assert (product.pk, 'Suede boot', 'Tops and boots') in indexed_rows()
+
+        product.delete()
+        assert product.pk not in [row[0] for row in indexed_rows()]
+
+    def test_bulk_writes_are_indexed(self, catalog):
+        shoes, _ = catalog
+        Product.objects.bulk_create([Product(name='Canvas sneaker', category=shoes, price=1)])
+        Product.objects.filter(name='Canvas sneaker').update(name='Canvas trainer')
+        assert 'Canvas trainer' in [row[1] for row in indexed_rows()]
+
+    def test_rebuild_command(self, catalog, capsys):
+        expected = indexed_rows()
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+        call_command('rebuild_search_index')
+        assert indexed_rows() == expected
+        assert 'Rebuilt search index: 4 products' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('shoe', '"shoe"'),
+    ('Running  shoe*', '"Running" "shoe"*'),
+    ('a-b', '"a" "b"'),
+    (' * ', None),
+])
+def test_match_expression(query, expected):
+    assert match_expression(query) == expected
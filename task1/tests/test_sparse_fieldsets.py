@@ -0,0 +1,79 @@
+import pytest
+from decimal import Decimal
+from django.urls import reverse
+from task1.factories import CategoryFactory, ProductFactory
+from task1.serializers import ProductRowFormatter
+
+ALL_FIELDS = ['id', 'name', 'category', 'price', 'created_at', 'category_product_count']
+
+
+@pytest.fixture
+def products():
+    shoes = CategoryFactory(name='Shoes')
+    return [ProductFactory(name=f'Shoe {i}', category=shoes, price=Decimal(10 + i)) for i in range(3)]
+
+
+def get(api_client, name, *args, **params):
+    return api_client.get(reverse(name, args=args), params)
+
+
+@pytest.mark.django_db
+class TestProductSparseFieldsets:
+
+    def test_fields_trim_the_list_and_its_query(self, api_client, products, django_assert_num_queries):
+        # The catalog version, the count and the page.
+        with django_assert_num_queries(3) as captured:
+            response = get(api_client, 'product-list', fields='id,name,price')
+
+        assert response.status_code == 200
+        assert [list(row) for row in response.data['results']] == [['id', 'name', 'price']] * 3
+        page = captured.captured_queries[-1]['sql']
+        assert 'task1_category' not in page and '"created_at"' not in page
+
+    def test_exclude_drops_fields_and_keeps_the_order(self, api_client, products):
+        response = get(api_client, 'product-list', exclude='created_at,category_product_count')
+        assert list(response.data['results'][0]) == ['id', 'name', 'category', 'price']
+        assert response.data['results'][0]['category'] == 'Shoes'
+
+    def test_detail_uses_the_serializer_path(self, api_client, products, django_assert_num_queries):
+        with django_assert_num_queries(1) as captured:
+            response = get(api_client, 'product-detail', products[0].pk, fields='name,category')
+
+        assert response.data == {'name': 'Shoe 0', 'category': 'Shoes'}
+        assert 'task1_category' in captured.captured_queries[0]['sql']
+
+    def test_keyset_pages_work_without_their_ordering_fields(self, api_client, products):
+        first = get(api_client, 'product-list', cursor='', page_size=2, fields='name').data
+        second = api_client.get(first['next']).data
+
+        assert [row['name'] for row in [*first['results'], *second['results']]] == ['Shoe 2', 'Shoe 1', 'Shoe 0']
+
+    def test_actions_and_export_accept_fields(self, api_client, products):
+        top = get(api_client, 'product-top-10-most-expensive', fields='name')
+        assert [row for row in top.data['results']] == [{'name': f'Shoe {i}'} for i in (2, 1, 0)]
+
+        export = get(api_client, 'product-export', format='csv', fields='id,price')
+        lines = b''.join(export.streaming_content).decode().splitlines()
+        assert lines[0] == 'id,price'
+        assert len(lines) == 4
+
+    def test_responses_are_cached_per_selection(self, api_client, products):
+        full = get(api_client, 'product-list')
+        sparse = get(api_client, 'product-list', fields='id')
+        assert list(full.data['results'][0]) == ALL_FIELDS
+        assert list(sparse.data['results'][0]) == ['id']
+
+    @pytest.mark.parametrize('params', [
+        {'fields': 'id,secret'}, {'exclude': 'nope'}, {'exclude': ','.join(ALL_FIELDS)},
+    ])
+    def test_unknown_or_empty_selections_are_rejected(self, api_client, products, params):
+        response = get(api_client, 'product-list', **params)
+        assert response.status_code == 400
+
+
+def test_row_formatter_selection_fetches_only_what_is_rendered():
+    formatter = ProductRowFormatter().select(['name'])
+    assert formatter.keys == ['name']
+    # Keyset cursors read id, price and category_id.
+    assert formatter.lookups == ['name', 'id', 'price', 'category_id']
+    assert ProductRowFormatter().select(None).keys == ALL_FIELDS
@@ -0,0 +1,36 @@
+import pytest
+from django.db import connection
+from paymob.sqlite import SQLITE_PROFILES, sqlite_options
+
+
+def pragma(name):
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA {name}')
+        return cursor.fetchone()[0]
+
+
+@pytest.mark.django_db
+def test_connections_run_the_tuned_profile():
+    assert connection.settings_dict['OPTIONS'] == sqlite_options('tuned')
+    assert pragma('busy_timeout') == 5000
+    assert pragma('cache_size') == -64 * 1024
+    assert pragma('synchronous') == 1  # NORMAL
+    assert pragma('temp_store') == 2  # MEMORY
+    assert connection.transaction_mode == 'IMMEDIATE'
+
+
+def test_options_accept_overrides():
+    options = sqlite_options('tuned', mmap_size=0)
+    assert 'PRAGMA mmap_size = 0' in options['init_command'].split(';')
+    assert options['transaction_mode'] == 'IMMEDIATE'
+    assert sqlite_options('default') == {'init_command': ''}
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError):
+        sqlite_options('fast')
+
+
+def test_every_tuned_pragma_is_applied_once():
+    commands = sqlite_options('tuned')['init_command'].split(';')
+    assert len(commands) == len(SQLITE_PROFILES['tuned'])
@@ -1,3 +1,6 @@
+import json
+from base64 import urlsafe_b64encode
+
 import pytest
 from django.urls import reverse
 from rest_framework import status
@@ -64,6 +67,27 @@ class TestProductViewSet:
         prices = [Decimal(p['price']) for p in response.data['results']]
         assert prices == sorted(prices, reverse=True)
 
+    @pytest.mark.parametrize("n", [1, 4, 12])
+    @pytest.mark.parametrize("endpoint", [
+        "product-top-most-expensive-by-category",
+        "product-top-10-most-expensive",
+    ])
+    def test_top_n_is_configurable(self, api_client, create_products, endpoint, n):
+        response = api_client.get(reverse(endpoint), {'n': n, 'page_size': 100})
+        assert response.status_code == 200
+        per_category = {}
+        for product in response.data['results']:
+            per_category.setdefault(product['category'], []).append(Decimal(product['price']))
+        assert len(per_category) == 3
+        for prices in per_category.values():
+            assert prices == [Decimal("240.00") - i * Decimal("10.00") for i in range(n)]
+
+    @pytest.mark.parametrize("n", ['0', '101', 'ten'])
+    def test_invalid_top_n_returns_400(self, api_client, create_products, n):
+        response = api_client.get(reverse("product-top-10-most-expensive"), {'n': n})
+        assert response.status_code == 400
+        assert 'n' in response.data
+
     def test_category_count_field_included(self, api_client, create_products):
         url = reverse("product-products-with-category-counts")
         response = api_client.get(url)
@@ -87,3 +111,82 @@ class TestProductViewSet:
             assert next_response.status_code == 200
             assert len(next_response.data['results']) > 0
 
+
+def _walk_keyset_pages(api_client, url, page_size=7):
+    response = api_client.get(url, {'cursor': '', 'page_size': page_size})
+    assert response.status_code == 200
+    pages = [response.data]
+    while response.data['next']:
+        response = api_client.get(response.data['next'])
+        assert response.status_code == 200
+        pages.append(response.data)
+    return pages
+
+
+@pytest.mark.django_db
+class TestKeysetPagination:
+
+    def test_default_pagination_is_page_number(self, api_client, create_products):
+        response = api_client.get(reverse("product-list"))
+        assert 'count' in response.data
+
+    def test_list_walks_every_product_once_by_price(self, api_client, create_products):
+        pages = _walk_keyset_pages(api_client, reverse("product-list"))
+        rows = [product for page in pages for product in page['results']]
+
+        assert 'count' not in pages[0]
+        assert len(rows) == len(create_products)
+        assert len({product['id'] for product in rows}) == len(create_products)
+        keys = [(-Decimal(product['price']), product['id']) for product in rows]
+        assert keys == sorted(keys)
+
+    def test_previous_link_returns_the_same_page(self, api_client, create_products):
+        pages = _walk_keyset_pages(api_client, reverse("product-list"))
+        assert pages[0]['previous'] is None
+
+        response = api_client.get(pages[2]['previous'])
+        assert [p['id'] for p in response.data['results']] == [p['id'] for p in pages[1]['results']]
+
+    def test_top_10_most_expensive_pages_by_category(self, api_client, create_products):
+        pages = _walk_keyset_pages(api_client, reverse("product-top-10-most-expensive"))
+        rows = [product for page in pages for product in page['results']]
+
+        assert len(rows) == 30
+        for page in pages:
+            for product in page['results']:
+                assert Decimal(product['price']) >= Decimal("150.00")
+
+    def test_top_10_most_expensive_pages_in_one_order(self, api_client):
+        # Category names sort opposite to their ids.
+        for name in ['Zeta', 'Alpha']:
+            ProductFactory.create_batch(3, category=CategoryFactory(name=name))
+        url = reverse("product-top-10-most-expensive")
+        by_page = [p['id'] for p in api_client.get(url, {'page_size': 4}).data['results']]
+        by_cursor = [p['id'] for p in api_client.get(url, {'cursor': '', 'page_size': 4}).data['results']]
+
+        assert by_cursor == by_page
+        assert [p['category'] for p in api_client.get(url).data['results']] == ['Zeta'] * 3 + ['Alpha'] * 3
+
+    def test_category_counts_are_not_affected_by_the_cursor(self, api_client, create_products):
+        pages = _walk_keyset_pages(api_client, reverse("product-products-with-category-counts"))
+        rows = [product for page in pages for product in page['results']]
+
+        assert len(rows) == len(create_products)
+        assert all(product['category_product_count'] == 15 for product in rows)
+
+    def test_invalid_cursor_returns_404(self, api_client, create_products):
+        response = api_client.get(reverse("product-list"), {'cursor': 'not-a-cursor'})
+        assert response.status_code == 404
+
+    @pytest.mark.parametrize("position", [
+        ['abc', 1], [{'x': 1}, 1], ['10.00', 'zz'], [None, None], [[1], 1],
+    ])
+    def test_tampered_cursor_values_return_404(self, api_client, create_products, position):
+        cursor = urlsafe_b64encode(json.dumps({'p': position}).encode()).decode()
+        response = api_client.get(reverse("product-list"), {'cursor': cursor})
+        assert response.status_code == 404
+
+    def test_tampered_category_cursor_returns_404(self, api_client, create_products):
+        cursor = urlsafe_b64encode(json.dumps({'p': ['x', '150.00', 1]}).encode()).decode()
+        response = api_client.get(reverse("product-top-10-most-expensive"), {'cursor': cursor})
+        assert response.status_code == 404
@@ -0,0 +1,47 @@
+import random
+from collections import Counter
+
+import pytest
+from locustfiles.sampling import PAGE_SIZES, Zipf, page_number, page_size
+
+
+def test_zipf_favours_low_ranks_with_a_long_tail():
+    rng = random.Random(0)
+    zipf = Zipf(1000, s=1.1)
+    draws = Counter(zipf.sample(rng) for _ in range(20000))
+
+    assert set(draws) <= set(range(1, 1001))
+    assert draws[1] > draws[2] > draws[10] > draws[100]
+    # P(1) = 1 / H(1000, 1.1), about 0.2.
+    assert 0.17 < draws[1] / 20000 < 0.23
+    assert sum(count for rank, count in draws.items() if rank > 100) > 1000
+
+
+def test_zipf_is_reproducible_and_rejects_empty_ranges():
+    assert [Zipf(50).sample(random.Random(1)) for _ in range(3)] == [Zipf(50).sample(random.Random(1))] * 3
+    with pytest.raises(ValueError):
+        Zipf(0)
+
+
+def test_page_sizes_follow_their_weights():
+    rng = random.Random(0)
+    sizes = Counter(page_size(rng) for _ in range(10000))
+    assert set(sizes) == {size for size, _ in PAGE_SIZES}
+    assert sizes[10] > sizes[20] > sizes[100]
+
+
+def test_deep_pages_reach_the_end_of_the_listing():
+    def share_past_page_1000(deep_ratio):
+        rng = random.Random(0)
+        pages = [page_number(rng, count=100000, size=10, deep_ratio=deep_ratio) for _ in range(5000)]
+        assert all(1 <= page <= 10000 for page in pages)
+        return sum(page > 1000 for page in pages) / len(pages), pages
+
+    shallow, _ = share_past_page_1000(0)
+    deep, pages = share_past_page_1000(0.2)
+
+    # A fifth of the draws are uniform, 90% of which land past page 1000.
+    assert 0.14 < deep - 0.8 * shallow < 0.22
+    assert max(pages) > 9000
+    assert Counter(pages).most_common(1)[0][0] == 1
+
@@ -1,12 +1,25 @@
 # urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from task1 import async_views
 from task1.views import ProductViewSet
 
 router = DefaultRouter()
 router.register(r'products', ProductViewSet, basename='product')
 
+async_urlpatterns = [
+    path('products/', async_views.product_list, name='async-product-list'),
+    path('products/<int:pk>/', async_views.product_detail, name='async-product-detail'),
+    path('products/top_most_expensive_by_category/', async_views.top_most_expensive_by_category,
+         name='async-product-top-most-expensive-by-category'),
+    path('products/top_10_most_expensive/', async_views.top_10_most_expensive,
+         name='async-product-top-10-most-expensive'),
+    path('products/products_with_category_counts/', async_views.products_with_category_counts,
+         name='async-product-products-with-category-counts'),
+]
+
 urlpatterns = [
     path('api/v1/task1/', include(router.urls)),
+    path('api/v1/task1/async/', include(async_urlpatterns)),
    
 ]
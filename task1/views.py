@@ -2,35 +2,105 @@ from django.shortcuts import render
 
 # Create your views here.
 # views.py
-from django.db.models import F, Count, Window
-from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets,generics
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from .models import Product ,Category
-from .serializers import CategorySerializer, ProductSerializer
-from .pagination import DefaultPagination
+from .serializers import CategorySerializer, ProductRowFormatter, ProductSerializer
+from paymob.query_plan import QueryPlanMixin
+from paymob.routers import ReplicaReadMixin
+from rest_framework.exceptions import APIException
+from .pagination import DefaultPagination, KeysetPagination, SearchPagination
+from .cache import cache_catalog_response
+from .filters import ProductFilterBackend, ProductSearchSerializer, get_top_n
+from .search import is_supported as search_is_supported
+from .renderers import CSVRenderer, FragmentJSONRenderer, NDJSONRenderer
 
 
+class SearchUnavailable(APIException):
+    status_code = 501
+    default_detail = 'Full-text search is only available on SQLite.'
+    default_code = 'search_unavailable'
 
 
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductViewSet(QueryPlanMixin, ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
 
-    queryset = Product.objects.select_related('category').all().order_by('id')
+    # Joined and narrowed to ProductSerializer's columns by QueryPlanMixin;
+    # querysets built by actions go through plan_queryset().
+    queryset = Product.objects.order_by('id')
     serializer_class = ProductSerializer
+    filter_backends = [ProductFilterBackend]
     pagination_class = DefaultPagination
+    keyset_pagination_class = KeysetPagination
+    # Keyset orderings per action, each one backed by an index on Product.
+    keyset_orderings = {
+        'list': ('-price', 'id'),
+        'products_with_category_counts': ('-price', 'id'),
+        'top_10_most_expensive': ('category_id', '-price', 'id'),
+    }
+    # values_list() fast path used by every read action except retrieve;
+    # its rows are rendered from cached JSON fragments (task1/fragments.py).
+    row_formatter = ProductRowFormatter()
+    renderer_classes = [FragmentJSONRenderer, BrowsableAPIRenderer]
+    export_chunk_size = 2000
+
+    @property
+    def paginator(self):
+        """
+        Page-number pagination by default; keyset pagination when the client
+        passes a `cursor` query parameter (an empty one starts at page 1).
+        """
+        if not hasattr(self, '_paginator') and self.uses_keyset_pagination():
+            self._paginator = self.keyset_pagination_class()
+        return super().paginator
+
+    def uses_keyset_pagination(self):
+        return (
+            self.action in self.keyset_orderings
+            and self.keyset_pagination_class.cursor_query_param in self.request.query_params
+        )
+
+    def get_filters(self):
+        """The validated filter query parameters as ORM lookups."""
+        return ProductFilterBackend().get_filters(self.request)
 
+    def get_row_formatter(self):
+        """The values_list() fast path, for the fields asked for with `?fields=` / `?exclude=`."""
+        return self.row_formatter.select(self.selected_fields())
+
+    def row_response(self, queryset):
+        """
+        Paginate and render `queryset` through the values_list() fast path;
+        the output is identical to `ProductSerializer`.
+        """
+        formatter = self.get_row_formatter()
+        rows = formatter.values_list(queryset)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(formatter.encode(page))
+        return Response(formatter.encode(rows))
+
+    @cache_catalog_response
+    def list(self, request, *args, **kwargs):
+        return self.row_response(self.filter_queryset(self.get_queryset()))
 
     @action(detail=False, methods=['get'], url_path='top_most_expensive_by_category')
+    @cache_catalog_response
     def top_most_expensive_by_category(self, request):
         """
         Retrieves the top 10 most expensive products per category.
         and Annotate each product with the total number of products in its category. 
 
-        This method uses Django's ORM to annotate each product with its row number
-        within its category, ordered by price in descending order. It also annotates
-        each product with the total count of products in its category. Only the top
-        10 products by price are selected per category.
+        `?n=` changes the number of products per category (default 10, at
+        most `TASK1_TOP_N_MAX`). The ranking is read from the precomputed
+        `TopProduct` table when it can answer the request, which is
+        maintained on product writes, so the cost is proportional to the
+        n x categories rows returned instead of the size of the catalog;
+        otherwise `ProductQuerySet.top_per_category` picks the cheaper of a
+        window ranking and per-category LIMIT lookups. The total count of
+        products in each category comes from `Category.product_count`.
 
         The results are paginated, and the response includes serialized data of the
         products with their respective categories and product count annotations.
@@ -40,46 +110,24 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
             expensive products for each category.
         """
 
-        products = Product.objects.annotate(
-            row_number=Window(
-                expression=RowNumber(),
-                partition_by=[F('category')],
-                order_by=F('price').desc()
-            ),
-            category_product_count=Window(
-                expression=Count('id'),
-                partition_by=[F('category')]
-            )
-        ).filter(row_number__lte=10).select_related('category')
-        page = self.paginate_queryset(products)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        products = self.plan_queryset(
+            Product.objects.top_per_category(n=get_top_n(request), **self.get_filters())
+        )
+        return self.row_response(products)
     
     @action(detail=False, methods=['get'], url_path='top_10_most_expensive')
+    @cache_catalog_response
     def top_10_most_expensive(self, request):
-        products = (Product.objects.select_related('category').annotate(
-            row_number=Window(
-                expression=RowNumber(),
-                partition_by=[F('category')],
-                order_by=F('price').desc()
-            )
-        ).filter(row_number__lte=10)
-        .order_by('category__name', '-price')
-        )
-
-        page = self.paginate_queryset(products)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-
-
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        # Membership comes from the TopProduct read model, so pagination
+        # filters on this query never change which rows make the top 10.
+        # Pages come in the keyset ordering whether or not `?cursor=` is used.
+        products = self.plan_queryset(
+            Product.objects.top_per_category(n=get_top_n(request), **self.get_filters())
+        ).order_by(*self.keyset_orderings['top_10_most_expensive'])
+
+        return self.row_response(products)
     @action(detail=False, methods=['get'], url_path='products_with_category_counts')
+    @cache_catalog_response
     def products_with_category_counts(self, request):
         """
         Retrieves all products annotated with the total number of products in their category.
@@ -91,21 +139,62 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
         and we can also get this query from category by using
         Category.objects.annotate(category_product_count=Count('products')).all
         select_related('products')
+
+        The count is the denormalized `Category.product_count`, maintained on
+        every product write, so serving it costs no aggregation at all.
         Returns:
             A paginated response containing serialized data of all products with their
             respective category and product count annotations.
         """
-        products = Product.objects.annotate(
-            category_product_count=Window(
-                expression=Count('id'),
-                partition_by=[F('category')],
-                )
-        ).select_related('category')
-        page = self.paginate_queryset(products)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        products = self.filter_queryset(self.plan_queryset(Product.objects.all()))
+        return self.row_response(products)
 
+    @action(detail=False, methods=['get'])
+    @cache_catalog_response
+    def search(self, request):
+        """
+        Full-text search over product names and category descriptions.
+
+        `?q=` matches products containing every word, best bm25 rank first;
+        end a word with `*` for a prefix match. Pages are keyset-paginated
+        on (rank, id): follow the `next` / `previous` links.
+        """
+        if not search_is_supported():
+            raise SearchUnavailable()
+        serializer = ProductSearchSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        products = Product.objects.all()
+        formatter = self.get_row_formatter()
+        paginator = SearchPagination()
+        # Search the index of the database the products are read from.
+        hits = paginator.paginate_search(serializer.validated_data['q'], request, using=products.db)
+        rows = {
+            row.id: row for row in
+            formatter.values_list(products.filter(pk__in=[hit.id for hit in hits]).order_by())
+        }
+        # A product deleted since the hit was read is simply skipped.
+        page = [rows[hit.id] for hit in hits if hit.id in rows]
+        return paginator.get_paginated_response(formatter.encode(page))
+
+    @action(detail=False, methods=['get'], renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        """
+        Streams the whole catalog, optionally filtered like `list`, as
+        NDJSON (default) or CSV
+        (`?format=csv` or `Accept: text/csv`).
 
+        Rows are read with a chunked `QuerySet.iterator()` in primary key
+        order and written as they arrive, so memory use does not depend on
+        the size of the catalog and there is no count or offset query.
+        """
+        products = Product.objects.filter(**self.get_filters()).order_by('id')
+        formatter = self.get_row_formatter()
+        rows = formatter.values_list(products).iterator(chunk_size=self.export_chunk_size)
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(formatter.iter_format(rows), formatter.keys),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
+        )
+        response['Content-Disposition'] = f'attachment; filename="products.{renderer.format}"'
+        return response